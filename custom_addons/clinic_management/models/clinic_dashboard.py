@@ -1,6 +1,6 @@
 from odoo import models, fields, api
-from datetime import timedelta
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL
 
 
 class ClinicDashboard(models.TransientModel):
@@ -49,47 +49,146 @@ class ClinicDashboard(models.TransientModel):
             if rec.from_date and rec.to_date and rec.from_date > rec.to_date:
                 raise ValidationError("From Date cannot be later than To Date.")
 
+    _COUNTER_FIELDS = (
+        'total_patients', 'today_registered_patients', 'total_therapies',
+        'total_followups', 'total_enrollment', 'total_daily_followups',
+    )
+    _PERIOD_COUNTER_FIELDS = _COUNTER_FIELDS[1:]
+
     @api.depends('clinic_id', 'from_date', 'to_date')
     def _compute_dashboard_counts(self):
+        empty = dict.fromkeys(self._COUNTER_FIELDS, 0)
+
+        # One aggregate round trip per date range, whatever the number of dashboards
+        by_range = {}
         for rec in self:
             if not (rec.clinic_id and rec.from_date and rec.to_date):
-                rec.update({
-                    'total_patients': 0,
-                    'today_registered_patients': 0,
-                    'total_therapies': 0,
-                    'total_followups': 0,
-                    'total_enrollment': 0,
-                    'total_daily_followups': 0,
-                })
+                rec.update(empty)
                 continue
+            by_range.setdefault((rec.from_date, rec.to_date), []).append(rec)
+
+        for (from_date, to_date), recs in by_range.items():
+            counts = self._get_dashboard_counts([r.clinic_id.id for r in recs], from_date, to_date)
+            for rec in recs:
+                rec.update(counts.get(rec.clinic_id.id, empty))
+
+    @api.model
+    def _get_dashboard_counts(self, clinic_ids, from_date, to_date):
+        """Returns {clinic_id: {counter: value}} for all six dashboard counters of
+        one or many clinics, in two grouped aggregates whatever the number of clinics.
+
+        Access model: the counters are aggregates of whole clinics. They are returned for
+        the clinics the user can read (clinic record rules) and count every active record
+        of those clinics; clinics the user cannot read are left out. _get_period_counts()
+        and its overrides only ever receive clinics already checked here."""
+        clinic_ids = self.env['clinic.clinic'].browse(clinic_ids)._filter_access_rules('read').ids
+        if not clinic_ids:
+            return {}
+        patient_counts = {
+            clinic.id: count for clinic, count in self.env['clinic.patient'].sudo()._read_group(
+                [('clinic_id', 'in', clinic_ids)], ['clinic_id'], ['__count'])
+        }
+        period_counts = self._get_period_counts(clinic_ids, from_date, to_date)
+        empty = dict.fromkeys(self._PERIOD_COUNTER_FIELDS, 0)
+        return {
+            clinic_id: dict(period_counts.get(clinic_id, empty), total_patients=patient_counts.get(clinic_id, 0))
+            for clinic_id in clinic_ids
+        }
+
+    @api.model
+    def _get_period_counts(self, clinic_ids, from_date, to_date):
+        """Returns {clinic_id: {counter: value}} for the five counters of the date range
+        in a single grouped SQL aggregate of the transactional tables. ``clinic_ids`` are
+        access-checked by _get_dashboard_counts()."""
+        if not clinic_ids:
+            return {}
+        for model in ('clinic.patient', 'patient.session', 'patient.followup', 'patient.assessment',
+                      'patient.enrollment', 'patient.daily_followup'):
+            self.env[model].flush_model()
+
+        self.env.cr.execute(SQL("""
+            WITH clinics AS (
+                SELECT UNNEST(%(clinic_ids)s::int[]) AS clinic_id
+            ),
+            patients AS (
+                SELECT p.clinic_id, COUNT(*) AS cnt
+                FROM clinic_patient p
+                WHERE p.active AND p.enroll_date BETWEEN %(from_date)s AND %(to_date)s
+                  AND p.clinic_id = ANY(%(clinic_ids)s)
+                GROUP BY p.clinic_id
+            ),
+            therapies AS (
+                SELECT COALESCE(s.therapy_clinic_id, p.clinic_id) AS clinic_id, COUNT(*) AS cnt
+                FROM patient_session s
+                JOIN clinic_patient p ON p.id = s.patient_id
+                WHERE s.active AND s.session_date BETWEEN %(from_date)s AND %(to_date)s
+                  AND COALESCE(s.therapy_clinic_id, p.clinic_id) = ANY(%(clinic_ids)s)
+                GROUP BY 1
+            ),
+            followups AS (
+                SELECT p.clinic_id, COUNT(*) AS cnt
+                FROM (
+                    SELECT patient_id FROM patient_followup
+                    WHERE active AND weekly_followup_date BETWEEN %(from_date)s AND %(to_date)s
+                    UNION ALL
+                    SELECT patient_id FROM patient_assessment
+                    WHERE active AND assessment_date BETWEEN %(from_date)s AND %(to_date)s
+                ) f
+                JOIN clinic_patient p ON p.id = f.patient_id
+                WHERE p.clinic_id = ANY(%(clinic_ids)s)
+                GROUP BY p.clinic_id
+            ),
+            enrollments AS (
+                SELECT p.clinic_id, COUNT(*) AS cnt
+                FROM patient_enrollment e
+                JOIN clinic_patient p ON p.id = e.patient_id
+                WHERE e.active AND e.enrollment_date BETWEEN %(from_date)s AND %(to_date)s
+                  AND p.clinic_id = ANY(%(clinic_ids)s)
+                GROUP BY p.clinic_id
+            ),
+            daily_followups AS (
+                SELECT p.clinic_id, COUNT(*) AS cnt
+                FROM patient_daily_followup d
+                JOIN clinic_patient p ON p.id = d.patient_id
+                WHERE d.active AND d.followup_date BETWEEN %(from_date)s AND %(to_date)s
+                  AND p.clinic_id = ANY(%(clinic_ids)s)
+                GROUP BY p.clinic_id
+            )
+            SELECT c.clinic_id,
+                   COALESCE(pt.cnt, 0),
+                   COALESCE(th.cnt, 0),
+                   COALESCE(fu.cnt, 0),
+                   COALESCE(en.cnt, 0),
+                   COALESCE(df.cnt, 0)
+            FROM clinics c
+            LEFT JOIN patients        pt ON pt.clinic_id = c.clinic_id
+            LEFT JOIN therapies       th ON th.clinic_id = c.clinic_id
+            LEFT JOIN followups       fu ON fu.clinic_id = c.clinic_id
+            LEFT JOIN enrollments     en ON en.clinic_id = c.clinic_id
+            LEFT JOIN daily_followups df ON df.clinic_id = c.clinic_id
+            """,
+            clinic_ids=list(clinic_ids),
+            from_date=from_date,
+            to_date=to_date,
+        ))
+        return {row[0]: dict(zip(self._PERIOD_COUNTER_FIELDS, row[1:])) for row in self.env.cr.fetchall()}
 
-            rec.total_patients = self.env['clinic.patient'].search_count(
-                [('clinic_id', '=', rec.clinic_id.id), ('active', '=', True)])
-
-            rec.today_registered_patients = self.env['clinic.patient'].search_count(
-                [('clinic_id', '=', rec.clinic_id.id), ('enroll_date', '>=', rec.from_date),
-                 ('enroll_date', '<=', rec.to_date), ('active', '=', True)])
-
-            rec.total_therapies = self.env['patient.session'].search_count([
-                '|', ('therapy_clinic_id', '=', rec.clinic_id.id),
-                '&', ('therapy_clinic_id', '=', False), ('patient_id.clinic_id', '=', rec.clinic_id.id),
-                ('session_date', '>=', rec.from_date), ('session_date', '<=', rec.to_date), ('active', '=', True)])
-
-            f_count = self.env['patient.followup'].search_count([
-                ('patient_id.clinic_id', '=', rec.clinic_id.id), ('weekly_followup_date', '>=', rec.from_date),
-                ('weekly_followup_date', '<=', rec.to_date), ('active', '=', True)])
-            a_count = self.env['patient.assessment'].search_count([
-                ('patient_id.clinic_id', '=', rec.clinic_id.id), ('assessment_date', '>=', rec.from_date),
-                ('assessment_date', '<=', rec.to_date), ('active', '=', True)])
-            rec.total_followups = f_count + a_count
-
-            rec.total_enrollment = self.env['patient.enrollment'].search_count([
-                ('patient_id.clinic_id', '=', rec.clinic_id.id), ('enrollment_date', '>=', rec.from_date),
-                ('enrollment_date', '<=', rec.to_date), ('active', '=', True)])
-
-            rec.total_daily_followups = self.env['patient.daily_followup'].search_count([
-                ('patient_id.clinic_id', '=', rec.clinic_id.id), ('followup_date', '>=', rec.from_date),
-                ('followup_date', '<=', rec.to_date), ('active', '=', True)])
+    @api.model
+    def get_region_dashboard_counts(self, from_date, to_date, region_id=None, clinic_ids=None):
+        """Multi-clinic overview for regional managers: the counters of every clinic in
+        the region (or in clinic_ids) with the same single aggregate round trip."""
+        domain = []
+        if region_id:
+            domain.append(('region_id', '=', int(region_id)))
+        if clinic_ids:
+            domain.append(('id', 'in', [int(c) for c in clinic_ids]))
+        clinics = self.env['clinic.clinic'].search_read(domain, ['id', 'name'], order='name')
+        counts = self._get_dashboard_counts([c['id'] for c in clinics], from_date, to_date)
+        empty = dict.fromkeys(self._COUNTER_FIELDS, 0)
+        return [
+            dict(counts.get(c['id'], empty), clinic_id=c['id'], clinic_name=c['name'])
+            for c in clinics
+        ]
 
     # --------------------------------------------------
     # SMART BUTTON ACTIONS
@@ -11,7 +11,7 @@ class EngatiWebhookController(http.Controller):
     def engati_delivery_status(self, **kw):
         """
         Receives webhook payloads from Engati to update notification status.
-        Uses lightweight raw SQL persistence to bypass mail.thread overhead.
+        Receipts are only buffered here and applied to the notification outbox by a cron.
         """
         try:
             expected_token = request.env['ir.config_parameter'].sudo().get_param('engati.webhook_token')
@@ -36,34 +36,31 @@ class EngatiWebhookController(http.Controller):
 
             # Map based on payload structure
             app_id = payload.get('attribute_appointment_id')
+            notification_key = payload.get('attribute_notification_key')
             
             # If deeply nested depending on Engati event schema
+            attrs = payload.get('attributes', {})
             if not app_id:
-                attrs = payload.get('attributes', {})
                 app_id = attrs.get('attribute_appointment_id')
+            if not notification_key:
+                notification_key = attrs.get('attribute_notification_key')
                 
             engati_status = payload.get('status', '').lower()
             if not engati_status and 'event' in payload:
                 engati_status = payload.get('event', '').lower()
 
-            if not app_id:
+            if not app_id and not notification_key:
                 return request.make_response(json.dumps({'status': 'error', 'message': 'Missing attribute_appointment_id'}), headers=[('Content-Type', 'application/json')])
 
-            odoo_status = 'pending'
+            outbox_state = False
             if engati_status in ['delivered', 'read', 'success', 'sent', 'message_delivered']:
-                odoo_status = 'wa_delivered'
+                outbox_state = 'delivered'
             elif engati_status in ['failed', 'undelivered', 'error', 'message_failed']:
-                odoo_status = 'failed'
-            else:
-                odoo_status = 'queued'
+                outbox_state = 'failed'
 
-            if odoo_status in ['wa_delivered', 'failed']:
-                # Lightweight Persistence Optimization: direct SQL update
-                request.env.cr.execute(
-                    "UPDATE clinic_schedule_appointment SET notification_status = %s WHERE id = %s",
-                    (odoo_status, int(app_id))
-                )
-                request.env['clinic.schedule.appointment'].invalidate_model(['notification_status'])
+            if outbox_state:
+                # Buffered: one INSERT here, applied to the outbox in bulk by the receipt cron
+                request.env['clinic.notification.receipt'].sudo()._ingest(notification_key, app_id, outbox_state)
 
             return request.make_response(json.dumps({'status': 'success'}), headers=[('Content-Type', 'application/json')])
 
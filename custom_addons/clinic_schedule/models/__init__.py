@@ -1,2 +1,5 @@
 from . import clinic_schedule
-from . import patient_session
\ No newline at end of file
+from . import patient_session
+from . import clinic_schedule_change
+from . import clinic_notification_outbox
+from . import therapist_ledger
\ No newline at end of file
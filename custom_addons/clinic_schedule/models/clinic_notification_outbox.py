@@ -0,0 +1,372 @@
+import json
+import logging
+import time as _time
+from collections import defaultdict
+from datetime import timedelta
+from odoo import models, fields, api
+from odoo.tools.sql import column_exists
+from .engati_dispatcher import EngatiDispatcher
+
+_logger = logging.getLogger(__name__)
+
+# Engati dispatch: batch size, concurrent sends, retries with exponential backoff
+# (60s, 120s, 240s... capped) and the time one cron run may spend draining the outbox.
+NOTIFY_BATCH_SIZE = 500
+NOTIFY_MAX_WORKERS = 16
+NOTIFY_DEFAULT_RATE = 50  # requests per second per endpoint, overridable by engati.rate_limit
+NOTIFY_MAX_ATTEMPTS = 5
+NOTIFY_BACKOFF_SECONDS = 60
+NOTIFY_MAX_BACKOFF_SECONDS = 3600
+NOTIFY_RUN_BUDGET_SECONDS = 90
+# Delivery receipts applied per transaction by the receipt cron
+RECEIPT_BATCH_SIZE = 5000
+
+# Outbox state -> clinic.schedule.appointment.notification_status (no row: 'pending')
+OUTBOX_TO_APPOINTMENT_STATUS = {
+    'pending': 'queued',
+    'sent': 'wa_delivered',
+    'delivered': 'wa_delivered',
+    'failed': 'failed',
+}
+# Outbox states only move up this rank: a late receipt never downgrades a row
+OUTBOX_STATE_RANK = {'pending': 0, 'sent': 1, 'failed': 2, 'delivered': 3}
+
+
+class ClinicNotificationOutbox(models.Model):
+    _name = 'clinic.notification.outbox'
+    _description = 'Appointment Notification Outbox'
+    _order = 'id desc'
+    _rec_name = 'idempotency_key'
+
+    appointment_id = fields.Many2one('clinic.schedule.appointment', string='Appointment', required=True,
+                                     readonly=True, index=True, ondelete='cascade')
+    idempotency_key = fields.Char(string='Idempotency Key', required=True, readonly=True, copy=False)
+    trigger_type = fields.Selection([
+        ('booking_confirmation', 'Booking Confirmation'),
+        ('manual_test', 'Manual Test'),
+    ], string='Trigger', required=True, readonly=True, default='booking_confirmation')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, readonly=True, default='pending')
+    phone = fields.Char(string='Phone', readonly=True)
+    payload = fields.Json(string='Payload Snapshot', readonly=True)
+    attempts = fields.Integer(string='Attempts', readonly=True, default=0)
+    next_attempt = fields.Datetime(string='Next Attempt', readonly=True)
+    last_error = fields.Char(string='Last Error', readonly=True)
+    sent_at = fields.Datetime(string='Sent At', readonly=True)
+    delivered_at = fields.Datetime(string='Delivery Confirmed At', readonly=True)
+
+    _sql_constraints = [
+        ('unique_idempotency_key', 'unique(idempotency_key)', 'A notification can only be queued once!')
+    ]
+
+    def init(self):
+        # The dispatcher only ever scans the due pending rows
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS
+                clinic_notification_outbox_pending_idx
+            ON clinic_notification_outbox (next_attempt, id)
+            WHERE state = 'pending'
+        """)
+        # Carry over the statuses stored on the appointments before the outbox existed
+        if column_exists(self.env.cr, 'clinic_schedule_appointment', 'notification_status'):
+            self.env.cr.execute("""
+                INSERT INTO clinic_notification_outbox (
+                    appointment_id, idempotency_key, trigger_type, state, attempts,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT a.id, 'legacy:' || a.id, 'booking_confirmation',
+                       CASE a.notification_status WHEN 'queued' THEN 'pending'
+                                                  WHEN 'failed' THEN 'failed'
+                                                  ELSE 'sent' END,
+                       0, a.write_uid, NOW() AT TIME ZONE 'UTC', a.write_uid, NOW() AT TIME ZONE 'UTC'
+                FROM clinic_schedule_appointment a
+                WHERE a.notification_status IN ('queued', 'wa_delivered', 'sms_delivered', 'failed')
+                  AND NOT EXISTS (SELECT 1 FROM clinic_notification_outbox o WHERE o.appointment_id = a.id)
+            """)
+
+    # -------------------------------
+    # Enqueue
+    # -------------------------------
+    @api.model
+    def _enqueue(self, appointments, trigger_type='booking_confirmation', key_suffix=''):
+        """Queues one notification per appointment with a snapshot of its payload.
+
+        The idempotency key covers what the message says (slot and therapist), so queuing the
+        same booking twice is a no-op, while a failed one is re-armed. Returns the pending rows."""
+        appointments = appointments.filtered('patient_id')
+        if not appointments:
+            return self.browse()
+        keys, phones, payloads = [], [], []
+        for app in appointments:
+            phone, payload = app._prepare_engati_payload()
+            key = app._get_notification_key(trigger_type) + key_suffix
+            payload['attribute_notification_key'] = key
+            keys.append(key)
+            phones.append(phone)
+            payloads.append(json.dumps(payload))
+
+        self.env.cr.execute("""
+            INSERT INTO clinic_notification_outbox AS o (
+                appointment_id, idempotency_key, trigger_type, state, phone, payload, attempts,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT r.appointment_id, r.key, %(trigger_type)s, 'pending', r.phone, r.payload::jsonb, 0,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+            FROM UNNEST(%(appointment_ids)s::int[], %(keys)s::varchar[], %(phones)s::varchar[], %(payloads)s::text[])
+                 AS r(appointment_id, key, phone, payload)
+            ON CONFLICT (idempotency_key) DO UPDATE
+                SET state = 'pending', attempts = 0, next_attempt = NULL, last_error = NULL,
+                    payload = EXCLUDED.payload, phone = EXCLUDED.phone,
+                    write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+                WHERE o.state = 'failed'
+            RETURNING o.id
+        """, {
+            'trigger_type': trigger_type,
+            'uid': self.env.uid,
+            'appointment_ids': appointments.ids,
+            'keys': keys,
+            'phones': phones,
+            'payloads': payloads,
+        })
+        queued = self.browse([row[0] for row in self.env.cr.fetchall()])
+        self.invalidate_model()
+        queued._notify_board()
+        return queued
+
+    # -------------------------------
+    # Dispatch
+    # -------------------------------
+    @api.model
+    def _cron_dispatch(self):
+        """Drains the due pending notifications for up to NOTIFY_RUN_BUDGET_SECONDS.
+
+        Each batch is claimed with SKIP LOCKED (rows an immediate send is handling are left
+        alone), sent concurrently by the EngatiDispatcher (pooled connections, per-endpoint
+        rate limit), persisted with one UPDATE and committed, which releases the claim.
+        Retryable failures stay pending with an exponential backoff until NOTIFY_MAX_ATTEMPTS."""
+        config = self.env['clinic.schedule.appointment']._get_engati_config()
+        if not config:
+            _logger.warning("Engati notification outbox not consumed: Engati System Parameters missing.")
+            return True
+
+        dispatcher = self._get_dispatcher()
+        deadline = _time.monotonic() + NOTIFY_RUN_BUDGET_SECONDS
+        try:
+            while _time.monotonic() < deadline:
+                self.flush_model(['state', 'next_attempt'])
+                self.env.cr.execute("""
+                    SELECT id FROM clinic_notification_outbox
+                    WHERE state = 'pending' AND (next_attempt IS NULL OR next_attempt <= %s)
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (fields.Datetime.now(), NOTIFY_BATCH_SIZE))
+                batch = self.browse([row[0] for row in self.env.cr.fetchall()])
+                if not batch:
+                    break
+                batch._dispatch(config, dispatcher)
+                self.env.cr.commit()
+                _logger.info("Engati outbox: %s notifications processed", len(batch))
+        finally:
+            dispatcher.close()
+        return True
+
+    @api.model
+    def _get_dispatcher(self):
+        rate = float(self.env['ir.config_parameter'].sudo().get_param('engati.rate_limit', NOTIFY_DEFAULT_RATE))
+        return EngatiDispatcher(max_workers=NOTIFY_MAX_WORKERS, rate=rate)
+
+    def _claim(self):
+        """Locks the still pending rows of this recordset until commit, skipping the ones
+        another transaction is sending. Returns the claimed rows, the only ones to dispatch."""
+        if not self:
+            return self
+        self.flush_recordset(['state'])
+        self.env.cr.execute("""
+            SELECT id FROM clinic_notification_outbox
+            WHERE id = ANY(%s) AND state = 'pending'
+            FOR UPDATE SKIP LOCKED
+        """, (self.ids,))
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _dispatch(self, config, dispatcher):
+        """Sends the payload snapshots of these rows and stores the results."""
+        jobs, results = {}, {}
+        for row in self:
+            if not row.payload:
+                # Rows carried over from the appointment statuses have no snapshot yet
+                row_phone, payload = row.appointment_id._prepare_engati_payload()
+                payload['attribute_notification_key'] = row.idempotency_key
+                row.write({'phone': row_phone, 'payload': payload})
+            if not row.phone:
+                results[row.id] = (False, False, 'No phone number for the patient.')
+                continue
+            jobs[row.id] = (config['url'], row.payload, config['headers'])
+        results.update(dispatcher.dispatch(jobs))
+        self._store_results(results)
+
+    def _store_results(self, results):
+        """Persists {outbox_id: (ok, retryable, error)} dispatch results with one UPDATE.
+        Only rows still pending are updated, so a delivery receipt is never downgraded."""
+        now = fields.Datetime.now()
+        ids, states, attempts, next_attempts, errors = [], [], [], [], []
+        for row in self:
+            ok, retryable, error = results[row.id]
+            attempt = row.attempts + 1
+            next_attempt = None
+            if ok:
+                state = 'sent'
+            elif retryable and attempt < NOTIFY_MAX_ATTEMPTS:
+                state = 'pending'
+                next_attempt = now + timedelta(
+                    seconds=min(NOTIFY_MAX_BACKOFF_SECONDS, NOTIFY_BACKOFF_SECONDS * 2 ** (attempt - 1)))
+            else:
+                state = 'failed'
+                _logger.error("ENGATI NOTIFICATION FAILURE (%s): %s", row.idempotency_key, error)
+            ids.append(row.id)
+            states.append(state)
+            attempts.append(attempt)
+            next_attempts.append(next_attempt)
+            errors.append((error or '')[:500] or None)
+
+        self.env.cr.execute("""
+            UPDATE clinic_notification_outbox o
+            SET state = r.state,
+                attempts = r.attempts,
+                next_attempt = r.next_attempt,
+                last_error = r.error,
+                sent_at = CASE WHEN r.state = 'sent' THEN %s ELSE o.sent_at END,
+                write_date = NOW() AT TIME ZONE 'UTC'
+            FROM UNNEST(%s::int[], %s::varchar[], %s::int[], %s::timestamp[], %s::varchar[])
+                 AS r(id, state, attempts, next_attempt, error)
+            WHERE o.id = r.id AND o.state = 'pending'
+        """, (now, ids, states, attempts, next_attempts, errors))
+        self.invalidate_recordset()
+        self._notify_board()
+
+    # -------------------------------
+    # Delivery receipts
+    # -------------------------------
+    @api.model
+    def _apply_delivery_statuses(self, receipts):
+        """Applies Engati delivery receipts, a list of (notification_key, appointment_id, state)
+        in arrival order, with one UPDATE per state. A row only moves up OUTBOX_STATE_RANK, so a
+        late failed or sent never overwrites delivered, whatever the order receipts arrive in;
+        receipts without a key target the latest row of their appointment. Returns the updated rows."""
+        def merge(states, target, state):
+            if OUTBOX_STATE_RANK[state] >= OUTBOX_STATE_RANK[states.get(target, state)]:
+                states[target] = state
+
+        by_key, by_appointment = {}, {}
+        for key, appointment_id, state in receipts:
+            if key:
+                merge(by_key, key, state)
+            elif appointment_id:
+                merge(by_appointment, appointment_id, state)
+        if by_appointment:
+            self.env.cr.execute("""
+                SELECT DISTINCT ON (appointment_id) appointment_id, idempotency_key
+                FROM clinic_notification_outbox
+                WHERE appointment_id = ANY(%s)
+                ORDER BY appointment_id, id DESC
+            """, (list(by_appointment),))
+            for appointment_id, key in self.env.cr.fetchall():
+                merge(by_key, key, by_appointment[appointment_id])
+
+        keys_by_state = defaultdict(list)
+        for key, state in by_key.items():
+            keys_by_state[state].append(key)
+        ranked_states = sorted(OUTBOX_STATE_RANK, key=OUTBOX_STATE_RANK.get)
+        updated_ids = []
+        for state, keys in keys_by_state.items():
+            self.env.cr.execute("""
+                UPDATE clinic_notification_outbox
+                SET state = %s,
+                    delivered_at = CASE WHEN %s = 'delivered' THEN NOW() AT TIME ZONE 'UTC' ELSE delivered_at END,
+                    write_date = NOW() AT TIME ZONE 'UTC'
+                WHERE idempotency_key = ANY(%s)
+                  AND array_position(%s::varchar[], state::varchar) < %s
+                RETURNING id
+            """, (state, state, keys, ranked_states, OUTBOX_STATE_RANK[state] + 1))
+            updated_ids += [row[0] for row in self.env.cr.fetchall()]
+        updated = self.browse(updated_ids)
+        self.invalidate_model(['state', 'delivered_at', 'write_date'])
+        updated._notify_board()
+        return updated
+
+    @api.model
+    def _get_latest_states(self, appointment_ids):
+        """Returns {appointment_id: state of its latest outbox row}."""
+        if not appointment_ids:
+            return {}
+        self.flush_model(['appointment_id', 'state'])
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (appointment_id) appointment_id, state
+            FROM clinic_notification_outbox
+            WHERE appointment_id = ANY(%s)
+            ORDER BY appointment_id, id DESC
+        """, (list(appointment_ids),))
+        return dict(self.env.cr.fetchall())
+
+    def _notify_board(self):
+        """Feeds the schedule board change feed: the notification badge of the cells changed."""
+        appointments = self.mapped('appointment_id')
+        appointments.invalidate_recordset(['notification_status'])
+        self.env['clinic.schedule.change'].sudo()._record_changes(appointments._get_board_change_entries())
+
+
+class ClinicNotificationReceipt(models.Model):
+    """Staging buffer of the Engati delivery webhook.
+
+    A callback is a single INSERT here, without any lock on the outbox; the receipts are
+    applied in bulk by _cron_apply_receipts and deleted once applied."""
+    _name = 'clinic.notification.receipt'
+    _description = 'Engati Delivery Receipt'
+    _order = 'id'
+    _log_access = False
+
+    notification_key = fields.Char(string='Idempotency Key', readonly=True)
+    appointment_ref = fields.Integer(string='Appointment ID', readonly=True)
+    state = fields.Selection([
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, readonly=True)
+    received_at = fields.Datetime(string='Received At', readonly=True)
+
+    @api.model
+    def _ingest(self, notification_key, appointment_ref, state):
+        """Buffers one delivery receipt with a plain INSERT (the webhook hot path)."""
+        self.env.cr.execute("""
+            INSERT INTO clinic_notification_receipt (notification_key, appointment_ref, state, received_at)
+            VALUES (%s, %s, %s, NOW() AT TIME ZONE 'UTC')
+        """, (notification_key or None, int(appointment_ref) if appointment_ref else None, state))
+
+    @api.model
+    def _cron_apply_receipts(self):
+        """Applies the buffered receipts to the outbox, RECEIPT_BATCH_SIZE at a time.
+
+        Rows are claimed with SKIP LOCKED so overlapping runs never block each other."""
+        Outbox = self.env['clinic.notification.outbox'].sudo()
+        while True:
+            self.env.cr.execute("""
+                SELECT id, notification_key, appointment_ref, state
+                FROM clinic_notification_receipt
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (RECEIPT_BATCH_SIZE,))
+            rows = self.env.cr.fetchall()
+            if not rows:
+                break
+            Outbox._apply_delivery_statuses([(key, ref, state) for _id, key, ref, state in rows])
+            self.env.cr.execute("DELETE FROM clinic_notification_receipt WHERE id = ANY(%s)",
+                                ([row[0] for row in rows],))
+            self.env.cr.commit()
+            _logger.info("Engati receipts: %s delivery statuses applied", len(rows))
+            if len(rows) < RECEIPT_BATCH_SIZE:
+                break
+        return True
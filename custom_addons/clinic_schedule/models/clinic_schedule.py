@@ -1,15 +1,35 @@
 import base64
+import hashlib
 import io
+import itertools
+import time as _time
 import csv
-import requests
 import logging
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
 from datetime import timedelta, datetime, time
+import psycopg2
 import pytz
+from collections import defaultdict
+from odoo.tools import SQL
+from odoo.tools.lru import LRU
+from .therapist_occupancy import TherapistOccupancy, TRANSIT_BUFFER
+from .clinic_notification_outbox import OUTBOX_TO_APPOINTMENT_STATUS
+from .therapist_ledger import LEDGER_FIELDS
 
 _logger = logging.getLogger(__name__)
 
+# Panels served by clinic.schedule.appointment.get_board_state()
+BOARD_PANELS = ('matrix', 'roster', 'ledger', 'smart_view')
+
+# Roster CSV rows parsed, created and written per batch
+IMPORT_CHUNK_SIZE = 1000
+
+# Per-date therapist availability snapshots of this worker, keyed by (db, date, tz, db revision)
+AVAILABILITY_CACHE = LRU(64)
+ABSENT_ACTIONS = ('no_show', 'wo', 'leave')
+
+
 class ClinicScheduleState(models.Model):
     _name = 'clinic.schedule.state'
     _description = 'User Schedule Memory State'
@@ -145,6 +165,47 @@ class ClinicTherapistDailyState(models.Model):
          'A therapist can only have one state overlay per day!')
     ]
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['clinic.schedule.change'].sudo()._record_changes(records._get_board_change_entries())
+        return records
+
+    def write(self, vals):
+        entries = self._get_board_change_entries()
+        res = super().write(vals)
+        self.env['clinic.schedule.change'].sudo()._record_changes(entries | self._get_board_change_entries())
+        return res
+
+    def unlink(self):
+        self.env['clinic.schedule.change'].sudo()._record_changes(self._get_board_change_entries())
+        return super().unlink()
+
+    def _get_board_change_entries(self):
+        """Change feed entries of the overlays: every board the therapist shows up on that
+        day, i.e. their allowed branches and the clinics they have sessions at."""
+        entries = set()
+        if not self:
+            return entries
+        self.env['clinic.schedule.appointment'].flush_model(['therapist_id', 'clinic_id', 'start_datetime'])
+        records = self.sudo()
+        self.env.cr.execute("""
+            SELECT DISTINCT a.therapist_id, k.target_date, a.clinic_id
+            FROM UNNEST(%s::int[], %s::date[]) AS k(therapist_id, target_date)
+            JOIN clinic_schedule_appointment a
+              ON a.therapist_id = k.therapist_id
+             AND a.start_datetime >= k.target_date AND a.start_datetime < k.target_date + 1
+        """, ([rec.therapist_id.id for rec in records], [rec.target_date for rec in records]))
+        session_clinics = defaultdict(set)
+        for therapist_id, target_date, clinic_id in self.env.cr.fetchall():
+            session_clinics[(therapist_id, target_date)].add(clinic_id)
+        for rec in records:
+            clinic_ids = session_clinics[(rec.therapist_id.id, rec.target_date)] | set(
+                rec.therapist_id.allowed_branch_ids.ids)
+            for clinic_id in clinic_ids:
+                entries.add((clinic_id, rec.target_date, 'daily_state', rec.id, rec.therapist_id.id))
+        return entries
+
 
 class ClinicScheduleAppointment(models.Model):
     _name = 'clinic.schedule.appointment'
@@ -176,7 +237,9 @@ class ClinicScheduleAppointment(models.Model):
         ('wa_delivered', 'WA Delivered'),
         ('sms_delivered', 'SMS Delivered'),
         ('failed', 'Failed')
-    ], string='Notification Status', default='pending', tracking=True)
+    ], string='Notification Status', compute='_compute_notification_status')
+    notification_outbox_ids = fields.One2many('clinic.notification.outbox', 'appointment_id',
+                                              string='Notifications', readonly=True)
     patient_id = fields.Many2one('clinic.patient', string='Patient Name', tracking=True)
     start_datetime = fields.Datetime(string='Start Time', required=True, default=lambda self: self._ist_date(),
                                      tracking=True, index=True)
@@ -186,6 +249,68 @@ class ClinicScheduleAppointment(models.Model):
 
     is_live_in_progress = fields.Boolean(compute='_compute_live_status', store=False)
 
+    # Race-free double-booking guard: concurrent bookings of a therapist are serialized by the
+    # gist index itself, whatever pre-checks the callers did (or skipped).
+    _sql_constraints = [
+        ('therapist_no_overlap',
+         "EXCLUDE USING gist (therapist_id WITH =, tsrange(start_datetime, end_datetime) WITH &&) "
+         "WHERE (therapist_id IS NOT NULL AND slot_type = 'patient' AND attendance_state != 'no_show')",
+         'Operational Conflict: this therapist is already booked for an overlapping patient session!'),
+    ]
+
+    def _auto_init(self):
+        # therapist_id equality inside a gist index needs btree_gist (a trusted extension since PostgreSQL 13)
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        except psycopg2.Error as err:
+            _logger.error("btree_gist unavailable, constraint %s_therapist_no_overlap cannot be created and "
+                          "therapist double-booking is only checked in Python: %s", self._table, err)
+        else:
+            self._report_therapist_overlaps()
+        return super()._auto_init()
+
+    def _report_therapist_overlaps(self):
+        """Logs the appointments that keep the therapist_no_overlap constraint from being
+        created (overlapping bookings of a therapist, or ranges ending before they start), so
+        they can be cleaned up before the next upgrade adds it."""
+        cr = self.env.cr
+        if (not tools.sql.table_exists(cr, self._table)
+                or not tools.sql.column_exists(cr, self._table, 'attendance_state')
+                or tools.sql.constraint_definition(cr, self._table, f'{self._table}_therapist_no_overlap')):
+            return
+        booked = "{0}.therapist_id IS NOT NULL AND {0}.slot_type = 'patient' AND {0}.attendance_state != 'no_show'"
+        cr.execute(SQL("""
+            SELECT id FROM %(table)s a
+            WHERE %(booked)s AND a.end_datetime < a.start_datetime
+            ORDER BY id
+        """, table=SQL.identifier(self._table), booked=SQL(booked.format('a'))))
+        inverted = [row[0] for row in cr.fetchall()]
+        cr.execute(SQL("""
+            SELECT a.therapist_id, a.id, b.id
+            FROM %(table)s a
+            JOIN %(table)s b ON b.therapist_id = a.therapist_id AND b.id > a.id
+            WHERE %(booked_a)s AND %(booked_b)s
+              AND a.start_datetime < COALESCE(b.end_datetime, 'infinity')
+              AND b.start_datetime < COALESCE(a.end_datetime, 'infinity')
+              AND a.start_datetime < COALESCE(a.end_datetime, 'infinity')
+              AND b.start_datetime < COALESCE(b.end_datetime, 'infinity')
+            ORDER BY a.therapist_id, a.id, b.id
+        """, table=SQL.identifier(self._table), booked_a=SQL(booked.format('a')), booked_b=SQL(booked.format('b'))))
+        overlaps = cr.fetchall()
+        if inverted:
+            _logger.error("Constraint %s_therapist_no_overlap cannot be created, appointments ending before "
+                          "they start: %s", self._table, inverted)
+        if overlaps:
+            _logger.error("Constraint %s_therapist_no_overlap cannot be created, %s overlapping bookings "
+                          "(therapist, appointment, appointment): %s", self._table, len(overlaps), overlaps)
+
+    def _compute_notification_status(self):
+        # Delivery tracking lives in the outbox: the latest row of each appointment wins
+        states = self.env['clinic.notification.outbox'].sudo()._get_latest_states(self.ids)
+        for rec in self:
+            rec.notification_status = OUTBOX_TO_APPOINTMENT_STATUS.get(states.get(rec.id), 'pending')
+
     @api.depends('start_datetime', 'end_datetime', 'attendance_state')
     def _compute_live_status(self):
         now_utc = datetime.utcnow()
@@ -229,11 +354,15 @@ class ClinicScheduleAppointment(models.Model):
             ('start_datetime', '>=', t_start),
             ('start_datetime', '<=', t_end)
         ])
-        today_patient_ids = today_sessions.mapped('patient_id.id')
+        today_patient_ids = set(today_sessions.mapped('patient_id.id'))
 
-        # 3. Pre-fetch today's absent staff
+        # 3. Pre-fetch today's absent / late staff
         daily_states = self.env['clinic.therapist.daily.state'].search([('target_date', '=', target_date)])
-        absent_staff_ids = [s.therapist_id.id for s in daily_states if s.action_type in ['no_show', 'wo', 'leave']]
+        absent_staff_ids = {s.therapist_id.id for s in daily_states if s.action_type in ['no_show', 'wo', 'leave']}
+        late_staff_hours = {s.therapist_id.id: s.expected_hour for s in daily_states if s.action_type == 'late'}
+
+        # 4. Today's occupancy of yesterday's therapists, loaded once and resolved in memory
+        occupancy = self._get_therapist_occupancy(yesterday_sessions.therapist_id.ids, t_start, t_end)
 
         carried_count, unassigned_count = 0, 0
         new_apps_vals = []
@@ -258,16 +387,18 @@ class ClinicScheduleAppointment(models.Model):
                 elif target_therapist_id in absent_staff_ids:
                     target_therapist_id = False
                     is_unassigned = True
-                else:
-                    overlap = self.search([
-                        ('therapist_id', '=', target_therapist_id),
-                        ('start_datetime', '<', new_end),
-                        ('end_datetime', '>', new_start),
-                        ('attendance_state', '!=', 'no_show')
-                    ], limit=1)
-                    if overlap:
-                        target_therapist_id = False
-                        is_unassigned = True
+                elif target_therapist_id in late_staff_hours and pytz.utc.localize(new_start).astimezone(
+                        local_tz).hour < late_staff_hours[target_therapist_id]:
+                    target_therapist_id = False
+                    is_unassigned = True
+                elif occupancy.find_overlap(target_therapist_id, new_start, new_end) or \
+                        occupancy.find_transit_conflict(target_therapist_id, new_start, new_end, clinic_id):
+                    target_therapist_id = False
+                    is_unassigned = True
+
+            if target_therapist_id:
+                # Later carried sessions must not be stacked on this one either
+                occupancy.add(target_therapist_id, new_start, new_end, clinic_id)
 
             new_apps_vals.append({
                 'clinic_id': clinic_id,
@@ -436,10 +567,9 @@ class ClinicScheduleAppointment(models.Model):
             ('start_datetime', '>=', start_day)
         ])
         unassigned_count = len(apps)
-        apps.write({'therapist_id': False})
-
-        for app in apps:
-            app.message_post(body="System Auto-Unassigned: Therapist was removed from the matrix board.")
+        apps.with_context(mail_notrack=True).write({'therapist_id': False})
+        self._post_audit_messages(
+            {app_id: "System Auto-Unassigned: Therapist was removed from the matrix board." for app_id in apps.ids})
 
         therapist = self.env['clinic.therapist'].browse(int(therapist_id))
         therapist.write({'allowed_branch_ids': [(3, int(clinic_id))]})
@@ -467,14 +597,56 @@ class ClinicScheduleAppointment(models.Model):
         apps = self.search(domain)
         target_t = self.env['clinic.therapist'].browse(int(target_therapist_id))
 
-        count = len(apps)
-        apps.write({'therapist_id': target_t.id})
+        target_state = self.env['clinic.therapist.daily.state'].search([
+            ('therapist_id', '=', target_t.id), ('target_date', '=', target_date)], limit=1)
+        if target_state.action_type in ['no_show', 'wo', 'leave']:
+            return {'status': 'warning', 'message': f'{target_t.name} is marked absent for this day.'}
 
+        # Resolve the target's conflicts in memory, then move every free session in one write
+        local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
+        occupancy = self._get_therapist_occupancy([target_t.id], start_day, end_day)
+        movable_ids = []
         for app in apps:
-            app.message_post(body=f"System Mass-Reassigned: Moved session to {target_t.name}.")
-
+            if target_state.action_type == 'late' and pytz.utc.localize(app.start_datetime).astimezone(
+                    local_tz).hour < target_state.expected_hour:
+                continue
+            if occupancy.find_overlap(target_t.id, app.start_datetime, app.end_datetime) or \
+                    occupancy.find_transit_conflict(target_t.id, app.start_datetime, app.end_datetime,
+                                                    app.clinic_id.id):
+                continue
+            occupancy.add(target_t.id, app.start_datetime, app.end_datetime, app.clinic_id.id, app.id)
+            movable_ids.append(app.id)
+
+        movable = self.browse(movable_ids)
+        count = len(movable)
+        # The audit note below replaces the per-record field tracking of this bulk move
+        movable.with_context(mail_notrack=True).write({'therapist_id': target_t.id})
+        self._post_audit_messages(
+            {app_id: f"System Mass-Reassigned: Moved session to {target_t.name}." for app_id in movable_ids})
+
+        skipped = len(apps) - count
+        if skipped:
+            return {'status': 'warning',
+                    'message': f'Moved {count} sessions to {target_t.name}. {skipped} kept in place (therapist busy, in transit or not arrived yet).'}
         return {'status': 'success', 'message': f'Successfully moved {count} sessions to {target_t.name}.'}
 
+    @api.model
+    def _get_therapist_occupancy(self, therapist_ids, start, end):
+        """TherapistOccupancy of the therapists' non no-show sessions around [start, end],
+        widened by the transit buffer so neighbour lookups stay exact. One query."""
+        occupancy = TherapistOccupancy()
+        if not therapist_ids:
+            return occupancy
+        rows = self.sudo().search_read([
+            ('therapist_id', 'in', list(therapist_ids)),
+            ('attendance_state', '!=', 'no_show'),
+            ('start_datetime', '<', end + TRANSIT_BUFFER),
+            ('end_datetime', '>', start - TRANSIT_BUFFER),
+        ], ['therapist_id', 'clinic_id', 'start_datetime', 'end_datetime'], load=None)
+        for row in rows:
+            occupancy.add(row['therapist_id'], row['start_datetime'], row['end_datetime'], row['clinic_id'], row['id'])
+        return occupancy
+
     # @api.model
     # def action_substitute_floater(self, placeholder_id, real_therapist_id):
     #     """ Accepts the request, moves patients to the real floater, and hides the placeholder """
@@ -505,43 +677,22 @@ class ClinicScheduleAppointment(models.Model):
             return False
 
         clinic_id = int(clinic_id)
-        target_date_obj = fields.Date.from_string(target_date)
-
-        # Proper UTC time boundary conversion for accurate DB querying
-        local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
-        start_of_day_local = local_tz.localize(datetime.combine(target_date_obj, time.min))
-        end_of_day_local = local_tz.localize(datetime.combine(target_date_obj, time.max))
-
-        start_day_utc = start_of_day_local.astimezone(pytz.utc).replace(tzinfo=None)
-        end_day_utc = end_of_day_local.astimezone(pytz.utc).replace(tzinfo=None)
-
-        # 1. Identify Absent Therapists
-        daily_states = self.env['clinic.therapist.daily.state'].search([('target_date', '=', target_date)])
-        absent_staff_ids = [s.therapist_id.id for s in daily_states if s.action_type in ['no_show', 'wo', 'leave']]
-
-        # 2. Get Active Standard Staff (Exclude buffers and pending floater placeholders)
-        working_therapists = self.env['clinic.therapist'].search([
-            ('active', '=', True),
-            ('is_buffer', '=', False),
-            ('is_floater_request', '=', False),
-            ('allowed_branch_ids', 'in', clinic_id)
-        ]).filtered(lambda t: t.id not in absent_staff_ids)
-
-        # 3. Enforce the >= 6 Capacity Threshold
-        for t in working_therapists:
-            slot_count = self.search_count([
-                ('clinic_id', '=', clinic_id),
-                ('therapist_id', '=', t.id),
-                ('slot_type', '=', 'patient'),
-                ('attendance_state', '!=', 'no_show'),
-                ('start_datetime', '>=', start_day_utc),
-                ('start_datetime', '<=', end_day_utc)
-            ])
-
+        snapshot = self._get_availability_snapshot(target_date)
+
+        # Active standard staff of the clinic who are not absent (no buffers or pending floater placeholders)
+        for t in snapshot['therapists'].values():
+            if t['is_buffer'] or t['is_floater_request'] or clinic_id not in t['allowed_clinic_ids']:
+                continue
+            availability = snapshot['availability'].get(t['id'], {})
+            if availability.get('absent'):
+                continue
+
+            # Enforce the >= 6 Capacity Threshold
+            slot_count = availability.get('patient_slots', {}).get(clinic_id, 0)
             if slot_count < 6:
                 raise ValidationError(_(
                     "Capacity threshold not met: All working therapists must have at least 6 assigned therapies before requesting a floater.\n\n"
-                    f"Staff Member '{t.name}' currently only has {slot_count} therapies assigned."
+                    f"Staff Member '{t['name']}' currently only has {slot_count} therapies assigned."
                 ))
 
         # 4. If validation passes, route to the Wizard
@@ -601,45 +752,101 @@ class ClinicScheduleAppointment(models.Model):
                 if rec.attendance_state == 'completed':
                     raise ValidationError(_("Record Locked: This session is 'Completed'. No further modifications are permitted."))
 
+        self._post_audit_messages(self._get_write_audit_bodies(vals))
+        entries = self._get_board_change_entries()
+        ledger_keys = self._get_ledger_keys() if LEDGER_FIELDS & set(vals) else None
+        res = super().write(vals)
+        self.env['clinic.schedule.change'].sudo()._record_changes(entries | self._get_board_change_entries())
+        if ledger_keys is not None:
+            self.env['clinic.therapist.ledger'].sudo()._refresh(ledger_keys | self._get_ledger_keys())
+        return res
+
+    def _get_write_audit_bodies(self, vals):
+        """Audit Log bodies of a write, as {appointment_id: html}. The new values are resolved
+        once per call; the old ones come from the (prefetched) records."""
+        attendance_labels = dict(self._fields['attendance_state'].selection)
+        if 'therapist_id' in vals:
+            new_t_obj = self.env['clinic.therapist'].browse(vals['therapist_id']) if vals.get('therapist_id') else False
+            new_t = new_t_obj.name if new_t_obj else 'Unassigned'
+        if 'attendance_state' in vals:
+            new_st = attendance_labels.get(vals['attendance_state'], vals['attendance_state'])
+        if 'start_datetime' in vals:
+            new_dt_obj = fields.Datetime.from_string(vals['start_datetime'])
+            new_time = fields.Datetime.context_timestamp(self, new_dt_obj).strftime(
+                '%d %b %Y, %I:%M %p') if new_dt_obj else 'None'
+        if 'clinic_id' in vals:
+            new_c_obj = self.env['clinic.clinic'].browse(vals['clinic_id']) if vals.get('clinic_id') else False
+            new_c = new_c_obj.name if new_c_obj else 'None'
+
+        bodies = {}
         for rec in self:
             audit_entries = []
             if 'therapist_id' in vals:
                 old_t = rec.therapist_id.name if rec.therapist_id else 'Unassigned'
-                new_t_obj = self.env['clinic.therapist'].browse(vals['therapist_id']) if vals.get(
-                    'therapist_id') else False
-                new_t = new_t_obj.name if new_t_obj else 'Unassigned'
                 if old_t != new_t:
                     audit_entries.append(_("Therapist changed: <b>%s</b> ➔ <b>%s</b>") % (old_t, new_t))
             if 'attendance_state' in vals:
-                old_st = dict(self._fields['attendance_state'].selection).get(rec.attendance_state,
-                                                                              rec.attendance_state)
-                new_st = dict(self._fields['attendance_state'].selection).get(vals['attendance_state'],
-                                                                              vals['attendance_state'])
+                old_st = attendance_labels.get(rec.attendance_state, rec.attendance_state)
                 if old_st != new_st:
                     audit_entries.append(_("Session Status changed: <b>%s</b> ➔ <b>%s</b>") % (old_st, new_st))
             if 'start_datetime' in vals:
                 old_time = fields.Datetime.context_timestamp(self, rec.start_datetime).strftime(
                     '%d %b %Y, %I:%M %p') if rec.start_datetime else 'None'
-                new_dt_obj = fields.Datetime.from_string(vals['start_datetime'])
-                new_time = fields.Datetime.context_timestamp(self, new_dt_obj).strftime(
-                    '%d %b %Y, %I:%M %p') if new_dt_obj else 'None'
                 audit_entries.append(_("Schedule Time changed: <b>%s</b> ➔ <b>%s</b>") % (old_time, new_time))
             if 'clinic_id' in vals:
                 old_c = rec.clinic_id.name if rec.clinic_id else 'None'
-                new_c_obj = self.env['clinic.clinic'].browse(vals['clinic_id']) if vals.get('clinic_id') else False
-                new_c = new_c_obj.name if new_c_obj else 'None'
                 audit_entries.append(_("Clinic Branch changed: <b>%s</b> ➔ <b>%s</b>") % (old_c, new_c))
 
             if audit_entries:
-                rec.message_post(body=_("<b>Audit Log (%s):</b><br/>%s") % (
+                bodies[rec.id] = _("<b>Audit Log (%s):</b><br/>%s") % (
                     self.env.user.name, "<br/>".join(audit_entries)
-                ))
-        return super().write(vals)
+                )
+        return bodies
+
+    def _post_audit_messages(self, bodies):
+        """Logs {appointment_id: html} notes in the chatter with one batched mail.message
+        create, instead of one message_post (and its follower/tracking queries) per record."""
+        if not bodies:
+            return
+        author_id = self.env.user.partner_id.id
+        subtype_id = self.env['ir.model.data']._xmlid_to_res_id('mail.mt_note')
+        self.env['mail.message'].sudo().create([{
+            'model': self._name,
+            'res_id': res_id,
+            'body': body,
+            'message_type': 'notification',
+            'subtype_id': subtype_id,
+            'author_id': author_id,
+        } for res_id, body in bodies.items()])
+
+    def unlink(self):
+        self.env['clinic.schedule.change'].sudo()._record_changes(self._get_board_change_entries())
+        ledger_keys = self._get_ledger_keys()
+        res = super().unlink()
+        self.env['clinic.therapist.ledger'].sudo()._refresh(ledger_keys)
+        return res
+
+    def _get_ledger_keys(self):
+        """(therapist_id, date) pairs of the therapist ledger rows these appointments count in."""
+        return {(app.therapist_id.id, app.start_datetime.date()) for app in self.sudo()
+                if app.therapist_id and app.start_datetime}
+
+    def _get_board_change_entries(self):
+        """Change feed entries of the appointments: their own clinic board and the boards of
+        the therapist's allowed branches, where they show up as a cross-clinic slot."""
+        entries = set()
+        for app in self.sudo():
+            if not app.start_datetime:
+                continue
+            clinic_ids = {app.clinic_id.id} | set(app.therapist_id.allowed_branch_ids.ids)
+            for clinic_id in clinic_ids:
+                entries.add((clinic_id, app.start_datetime.date(), 'appointment', app.id, app.therapist_id.id))
+        return entries
 
     def action_send_test_notification(self):
         """ Manual button trigger for sandbox testing """
         for rec in self:
-            rec._send_slot_notification(trigger_type='booking_confirmation')
+            rec._send_slot_notification(trigger_type='manual_test')
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
@@ -651,12 +858,50 @@ class ClinicScheduleAppointment(models.Model):
             }
         }
 
-    def _send_slot_notification(self, trigger_type='booking_confirmation', session=None):
-        """ Centralized Decoupled Notification Wrapper with Mock Fallback Logic """
+    def _send_slot_notification(self, trigger_type='booking_confirmation'):
+        """ Sends one notification right away through the outbox, outside of the dispatch cron """
         self.ensure_one()
         if not self.patient_id:
             return False
 
+        Outbox = self.env['clinic.notification.outbox'].sudo()
+        config = self._get_engati_config()
+        if not config:
+            self.message_post(body="Notification Failed: Engati System Parameters missing.")
+            return False
+
+        # Manual sends get a key of their own so they never collide with the booking confirmation
+        key_suffix = f":{fields.Datetime.now():%Y%m%d%H%M%S}" if trigger_type == 'manual_test' else ''
+        row = Outbox._enqueue(self, trigger_type=trigger_type, key_suffix=key_suffix)
+        if not row:
+            self.message_post(body="Notification already sent for this slot.")
+            return False
+        row = row._claim()
+        if not row:
+            self.message_post(body="Notification is already being sent for this slot.")
+            return False
+
+        dispatcher = Outbox._get_dispatcher()
+        try:
+            row._dispatch(config, dispatcher)
+        finally:
+            dispatcher.close()
+        if row.state == 'sent':
+            _logger.info("ENGATI SUCCESS: %s", row.phone)
+            self.message_post(body=f"<b>Engati Delivered:</b> Notification sent to {row.phone}.")
+            return True
+        self.message_post(body=f"<b>Notification Delivery Failure.</b><br/><i>Reason: {row.last_error}</i>")
+        return False
+
+    def _get_notification_key(self, trigger_type):
+        """Idempotency key of a notification: one message per appointment, trigger, slot and therapist."""
+        self.ensure_one()
+        start = self.start_datetime.strftime('%Y%m%d%H%M') if self.start_datetime else ''
+        return f"{self.id}:{trigger_type}:{start}:{self.therapist_id.id or 0}"
+
+    @api.model
+    def _get_engati_config(self):
+        """Engati flow endpoint and headers from the system parameters, or False if incomplete."""
         params = self.env['ir.config_parameter'].sudo()
         engati_customer_id = params.get_param('engati.customer_id')
         engati_bot_key = params.get_param('engati.bot_key')
@@ -664,9 +909,18 @@ class ClinicScheduleAppointment(models.Model):
         engati_api_key = params.get_param('engati.api_key')
 
         if not all([engati_customer_id, engati_bot_key, engati_flow_key, engati_api_key]):
-            self.message_post(body="Notification Failed: Engati System Parameters missing.")
             return False
+        return {
+            'url': f"https://api.engati.ai/bot-api/v3.0/customer/{engati_customer_id}/bot/{engati_bot_key}/flow/{engati_flow_key}",
+            'headers': {
+                "Authorization": f"Basic {engati_api_key}",
+                "Content-Type": "application/json"
+            },
+        }
 
+    def _prepare_engati_payload(self):
+        """Returns (patient_phone, payload) of the slot notification of one appointment."""
+        self.ensure_one()
         raw_phone = getattr(self.patient_id, 'mobile', '') or getattr(self.patient_id, 'phone', '')
         patient_phone = str(raw_phone).replace(" ", "").replace("-", "").strip()
         if len(patient_phone) == 10 and patient_phone.isdigit():
@@ -686,44 +940,17 @@ class ClinicScheduleAppointment(models.Model):
         therapist_name = self.therapist_id.name if self.therapist_id else "Pending Assignment"
         visit_type_label = dict(self._fields['visit_type'].selection).get(self.visit_type, 'Session')
 
-        url = f"https://api.engati.ai/bot-api/v3.0/customer/{engati_customer_id}/bot/{engati_bot_key}/flow/{engati_flow_key}"
-
-        if not session:
-            session = requests.Session()
-
-        try:
-            engati_payload = {
-                "user.channel": "whatsapp",
-                "user.phone_no": patient_phone,
-                "attribute_appointment_id": str(self.id),
-                "attribute_patient_name": patient_name,
-                "attribute_clinic_name": clinic_name,
-                "attribute_slot_date": slot_date,
-                "attribute_slot_time": slot_time,
-                "attribute_therapist_name": therapist_name,
-                "attribute_visit_type": visit_type_label
-            }
-            headers = {
-                "Authorization": f"Basic {engati_api_key}",
-                "Content-Type": "application/json"
-            }
-            resp_engati = session.post(
-                url,
-                json=engati_payload,
-                headers=headers,
-                timeout=5
-            )
-            resp_engati.raise_for_status()
-            _logger.info("ENGATI SUCCESS: %s", patient_phone)
-            self.message_post(body=f"<b>Engati Delivered:</b> Notification sent to {patient_phone}.")
-            self.write({'notification_status': 'wa_delivered'})
-            return True
-        except requests.exceptions.RequestException as err:
-            err_msg = err.response.text if err.response is not None else str(err)
-            _logger.error("ENGATI NOTIFICATION FAILURE: %s", err_msg)
-            self.message_post(body=f"<b>Notification Delivery Failure.</b><br/><i>Reason: {err_msg}</i>")
-            self.write({'notification_status': 'failed'})
-            return False
+        return patient_phone, {
+            "user.channel": "whatsapp",
+            "user.phone_no": patient_phone,
+            "attribute_appointment_id": str(self.id),
+            "attribute_patient_name": patient_name,
+            "attribute_clinic_name": clinic_name,
+            "attribute_slot_date": slot_date,
+            "attribute_slot_time": slot_time,
+            "attribute_therapist_name": therapist_name,
+            "attribute_visit_type": visit_type_label
+        }
 
     @api.depends('start_datetime')
     def _compute_end_datetime(self):
@@ -841,16 +1068,18 @@ class ClinicScheduleAppointment(models.Model):
     @api.constrains('start_datetime', 'therapist_id')
     def _check_therapist_availability(self):
         """Hard Lock: Prevents dragging patients onto absent/locked therapists."""
-        for record in self:
-            if not record.therapist_id or not record.start_datetime: continue
-            target_date = record.start_datetime.date()
-            local_time = pytz.utc.localize(record.start_datetime).astimezone(
-                pytz.timezone(self.env.user.tz or 'Asia/Kolkata'))
-
-            state = self.env['clinic.therapist.daily.state'].search([
-                ('therapist_id', '=', record.therapist_id.id),
-                ('target_date', '=', target_date)
-            ], limit=1)
+        records = self.filtered(lambda r: r.therapist_id and r.start_datetime)
+        if not records:
+            return
+        states = self.env['clinic.therapist.daily.state'].search([
+            ('therapist_id', 'in', records.therapist_id.ids),
+            ('target_date', 'in', list({r.start_datetime.date() for r in records})),
+        ])
+        state_map = {(s.therapist_id.id, s.target_date): s for s in states}
+        local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
+        for record in records:
+            local_time = pytz.utc.localize(record.start_datetime).astimezone(local_tz)
+            state = state_map.get((record.therapist_id.id, record.start_datetime.date()))
 
             if state:
                 if state.action_type in ['no_show', 'wo', 'leave']:
@@ -868,19 +1097,20 @@ class ClinicScheduleAppointment(models.Model):
 
     @api.constrains('start_datetime', 'end_datetime', 'therapist_id', 'clinic_id')
     def _check_therapist_overlap(self):
-        """Validates Overlaps AND enforces a 1-Hour Cross-Clinic Transit Buffer. Ignores No-Shows."""
-        for record in self:
-            if not record.therapist_id: continue
-
+        """Validates Overlaps AND enforces a 1-Hour Cross-Clinic Transit Buffer. Ignores No-Shows.
+        The occupancy of all the checked therapists is loaded once and resolved in memory."""
+        records = self.filtered(lambda r: r.therapist_id and r.start_datetime and r.end_datetime)
+        if not records:
+            return
+        occupancy = self._get_therapist_occupancy(records.therapist_id.ids, min(records.mapped('start_datetime')),
+                                                  max(records.mapped('end_datetime')))
+        local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
+        for record in records:
             # 1. Exact Booking Overlap Check (IGNORE NO SHOWS)
-            domain = [
-                ('therapist_id', '=', record.therapist_id.id), ('id', '!=', record.id),
-                ('start_datetime', '<', record.end_datetime), ('end_datetime', '>', record.start_datetime),
-                ('attendance_state', '!=', 'no_show')  # NEW: Let No-Shows be overlapped
-            ]
-            conflict = self.sudo().search(domain, limit=1)
-            if conflict:
-                local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
+            overlap = occupancy.find_overlap(record.therapist_id.id, record.start_datetime, record.end_datetime,
+                                             exclude_id=record.id)
+            if overlap:
+                conflict = self.sudo().browse(overlap[3])
                 s_time = pytz.utc.localize(conflict.start_datetime).astimezone(local_tz).strftime('%I:%M %p')
                 e_time = pytz.utc.localize(conflict.end_datetime).astimezone(local_tz).strftime('%I:%M %p')
                 target_name = conflict.patient_id.name if conflict.slot_type == 'patient' else conflict.slot_type
@@ -889,37 +1119,16 @@ class ClinicScheduleAppointment(models.Model):
                 ))
 
             # 2. Transit Buffer Check (Requires minimum 1-hour gap between different clinics)
-            if not record.clinic_id: continue
-
-            # Find the session immediately before this one (IGNORE NO SHOWS)
-            prev_app = self.sudo().search([
-                ('therapist_id', '=', record.therapist_id.id), ('id', '!=', record.id),
-                ('end_datetime', '<=', record.start_datetime),
-                ('attendance_state', '!=', 'no_show')
-            ], order='end_datetime desc', limit=1)
-
-            if prev_app and prev_app.clinic_id.id != record.clinic_id.id:
-                diff_hours = (record.start_datetime - prev_app.end_datetime).total_seconds() / 3600.0
-                if diff_hours < 1.0:
-                    raise ValidationError(
-                        _("Transit Buffer Violation: %s requires at least 1 hour to travel from %s to %s. The current gap is only %.1f hours.") % (
-                            record.therapist_id.name, prev_app.clinic_id.name, record.clinic_id.name, diff_hours
-                        ))
-
-            # Find the session immediately after this one (IGNORE NO SHOWS)
-            next_app = self.sudo().search([
-                ('therapist_id', '=', record.therapist_id.id), ('id', '!=', record.id),
-                ('start_datetime', '>=', record.end_datetime),
-                ('attendance_state', '!=', 'no_show')
-            ], order='start_datetime asc', limit=1)
-
-            if next_app and next_app.clinic_id.id != record.clinic_id.id:
-                diff_hours = (next_app.start_datetime - record.end_datetime).total_seconds() / 3600.0
-                if diff_hours < 1.0:
-                    raise ValidationError(
-                        _("Transit Buffer Violation: %s requires at least 1 hour to travel from %s to %s. The current gap is only %.1f hours.") % (
-                            record.therapist_id.name, record.clinic_id.name, next_app.clinic_id.name, diff_hours
-                        ))
+            transit = occupancy.find_transit_conflict(record.therapist_id.id, record.start_datetime,
+                                                      record.end_datetime, record.clinic_id.id, exclude_id=record.id)
+            if transit:
+                other_slot, gap, is_before = transit
+                other_clinic = self.env['clinic.clinic'].sudo().browse(other_slot[2])
+                from_clinic, to_clinic = (other_clinic, record.clinic_id) if is_before else (record.clinic_id, other_clinic)
+                raise ValidationError(
+                    _("Transit Buffer Violation: %s requires at least 1 hour to travel from %s to %s. The current gap is only %.1f hours.") % (
+                        record.therapist_id.name, from_clinic.name, to_clinic.name, gap.total_seconds() / 3600.0
+                    ))
 
     @api.constrains('patient_id', 'start_datetime', 'slot_type')
     def _check_daily_duplicate(self):
@@ -996,53 +1205,126 @@ class ClinicScheduleAppointment(models.Model):
 
         # Return the records immediately, omitting the auto_book_vals loop
         records = super().create(vals_list)
+        self.env['clinic.schedule.change'].sudo()._record_changes(records._get_board_change_entries())
+        self.env['clinic.therapist.ledger'].sudo()._refresh(records._get_ledger_keys())
         return records
 
     @api.model
     def get_allotable_therapists(self, clinic_id, target_date, displayed_therapist_ids=None):
-        domain = [('active', '=', True)]
-        if displayed_therapist_ids: domain.append(('id', 'not in', displayed_therapist_ids))
-        therapists = self.env['clinic.therapist'].search(domain)
-
-        target_date_obj = fields.Date.from_string(target_date)
-        start_day = datetime.combine(target_date_obj, time.min)
-        end_day = datetime.combine(target_date_obj, time.max)
-
-        appointments = self.sudo().search([
-            ('start_datetime', '>=', start_day), ('end_datetime', '<=', end_day), ('therapist_id', '!=', False)
-        ])
-
-        active_today_map = {}
-        for app in appointments:
-            t_id = app.therapist_id.id
-            if t_id not in active_today_map: active_today_map[t_id] = set()
-            active_today_map[t_id].add(app.clinic_id.name)
+        snapshot = self._get_availability_snapshot(target_date)
+        displayed_ids = set(displayed_therapist_ids or [])
 
         results = []
-        for t in therapists:
-            working_clinics = list(active_today_map.get(t.id, set()))
+        for t in snapshot['therapists'].values():
+            if t['id'] in displayed_ids:
+                continue
+            availability = snapshot['availability'].get(t['id'], {})
+            working_clinics = availability.get('clinic_names', [])
             is_working_elsewhere = len(working_clinics) > 0
 
-            # --- NEW DATA FOR MASTER DIRECTORY FILTERS ---
-            allowed_c_ids = t.allowed_branch_ids.ids
-            allowed_r_ids = t.allowed_branch_ids.mapped('region_id').ids
-            allowed_clinics_names = ", ".join(t.allowed_branch_ids.mapped('name'))
-
             results.append({
-                'id': t.id,
-                'name': t.name,
-                'designation': t.designation,
-                'gender': t.gender,
-                'vendor_id': t.vendor_id or 'N/A',
+                'id': t['id'],
+                'name': t['name'],
+                'designation': t['designation'],
+                'gender': t['gender'],
+                'vendor_id': t['vendor_id'] or 'N/A',
                 'is_working_elsewhere': is_working_elsewhere,
                 'working_clinics': ', '.join(working_clinics) if is_working_elsewhere else '',
-                'allowed_clinic_ids': allowed_c_ids,
-                'allowed_region_ids': allowed_r_ids,
-                'allowed_clinics_names': allowed_clinics_names,
+                'allowed_clinic_ids': t['allowed_clinic_ids'],
+                'allowed_region_ids': t['allowed_region_ids'],
+                'allowed_clinics_names': t['allowed_clinics_names'],
+                'busy_minutes': availability.get('busy_minutes', 0),
                 'status': 'busy' if is_working_elsewhere else 'available'
             })
         return results
 
+    @api.model
+    def _get_availability_snapshot(self, target_date):
+        """Availability of every active therapist on target_date (local day of the user):
+        absence, busy minutes, clinics worked at and patient sessions per clinic.
+
+        Snapshots are shared by the workers' requests through AVAILABILITY_CACHE. The key holds
+        the change feed signature of the day, moved by every appointment and daily-state write,
+        so a write invalidates the snapshot of its date. Treat the returned dict as read-only."""
+        target_date_obj = fields.Date.from_string(target_date)
+        tz_name = self.env.user.tz or 'Asia/Kolkata'
+        local_tz = pytz.timezone(tz_name)
+        start_day_utc = local_tz.localize(datetime.combine(target_date_obj, time.min)).astimezone(
+            pytz.utc).replace(tzinfo=None)
+        end_day_utc = local_tz.localize(datetime.combine(target_date_obj, time.max)).astimezone(
+            pytz.utc).replace(tzinfo=None)
+
+        # Revisions are keyed on the UTC date of the sessions: the local day spans up to two of them
+        signature = self._get_roster_signature(target_date_obj)
+        changes = self.env['clinic.schedule.change'].sudo()._get_day_signature(
+            start_day_utc.date(), end_day_utc.date())
+        key = (self.env.cr.dbname, target_date_obj, tz_name, signature, changes)
+        snapshot = AVAILABILITY_CACHE.get(key)
+        if snapshot is None:
+            snapshot = self._build_availability_snapshot(target_date_obj, start_day_utc, end_day_utc)
+            AVAILABILITY_CACHE[key] = snapshot
+        return snapshot
+
+    @api.model
+    def _build_availability_snapshot(self, target_date, start_day_utc, end_day_utc):
+        Therapist = self.env['clinic.therapist'].sudo()
+        clinics = {c['id']: c for c in self.env['clinic.clinic'].sudo().search_read([], ['id', 'name', 'region_id'])}
+        clinic_rank = {clinic_id: rank for rank, clinic_id in enumerate(clinics)}
+        therapists = Therapist.search_read(
+            [('active', '=', True)],
+            ['id', 'name', 'designation', 'gender', 'vendor_id', 'is_buffer', 'is_floater_request'])
+
+        branch_field = Therapist._fields['allowed_branch_ids']
+        self.env.cr.execute(SQL(
+            "SELECT %s, %s FROM %s WHERE %s = ANY(%s)",
+            SQL.identifier(branch_field.column1), SQL.identifier(branch_field.column2),
+            SQL.identifier(branch_field.relation), SQL.identifier(branch_field.column1),
+            [t['id'] for t in therapists],
+        ))
+        branch_index = defaultdict(list)
+        for therapist_id, clinic_id in self.env.cr.fetchall():
+            if clinic_id in clinics:
+                branch_index[therapist_id].append(clinic_id)
+
+        directory = {}
+        for t in therapists:
+            branch_ids = sorted(branch_index[t['id']], key=clinic_rank.get)
+            t['allowed_clinic_ids'] = branch_ids
+            t['allowed_region_ids'] = list(dict.fromkeys(
+                clinics[c]['region_id'][0] for c in branch_ids if clinics[c]['region_id']))
+            t['allowed_clinics_names'] = ", ".join(clinics[c]['name'] for c in branch_ids)
+            directory[t['id']] = t
+
+        availability = defaultdict(lambda: {'absent': False, 'busy_minutes': 0, 'clinic_ids': [],
+                                            'clinic_names': [], 'patient_slots': {}})
+        for state in self.env['clinic.therapist.daily.state'].sudo().search_read(
+                [('target_date', '=', target_date), ('action_type', 'in', ABSENT_ACTIONS)],
+                ['therapist_id'], load=None):
+            availability[state['therapist_id']]['absent'] = True
+
+        self.flush_model(['therapist_id', 'clinic_id', 'start_datetime', 'end_datetime', 'slot_type',
+                          'attendance_state'])
+        self.env.cr.execute("""
+            SELECT therapist_id, clinic_id,
+                   COUNT(*) FILTER (WHERE slot_type = 'patient' AND attendance_state != 'no_show'),
+                   COALESCE(SUM(EXTRACT(EPOCH FROM end_datetime - start_datetime) / 60)
+                            FILTER (WHERE attendance_state != 'no_show'), 0)
+            FROM clinic_schedule_appointment
+            WHERE therapist_id IS NOT NULL
+              AND start_datetime >= %s AND start_datetime <= %s
+            GROUP BY therapist_id, clinic_id
+        """, (start_day_utc, end_day_utc))
+        for therapist_id, clinic_id, patient_slots, busy_minutes in self.env.cr.fetchall():
+            entry = availability[therapist_id]
+            entry['busy_minutes'] += int(busy_minutes)
+            if clinic_id:
+                entry['clinic_ids'].append(clinic_id)
+                entry['patient_slots'][clinic_id] = patient_slots
+        for entry in availability.values():
+            entry['clinic_names'] = sorted(clinics[c]['name'] for c in entry['clinic_ids'] if c in clinics)
+
+        return {'therapists': directory, 'availability': dict(availability)}
+
     @api.model
     def apply_therapist_action(self, therapist_id, clinic_id, target_date, action, expected_arrival=10):
         """Applies Attendance Action and Auto-Unassigns Patients based on strict rules"""
@@ -1093,19 +1375,18 @@ class ClinicScheduleAppointment(models.Model):
 
         if action == 'late':
             # Unassign only sessions before the expected arrival
-            for app in appointments:
-                local_time = fields.Datetime.context_timestamp(self, app.start_datetime)
-                if local_time.hour < int(expected_arrival):
-                    app.write({'therapist_id': False})
-                    app.message_post(body=_(
-                        "<b>System Auto-Unassigned:</b> Therapist marked as arriving late (%s:00).") % expected_arrival)
-                    unassigned_count += 1
+            early_apps = appointments.filtered(
+                lambda a: fields.Datetime.context_timestamp(self, a.start_datetime).hour < int(expected_arrival))
+            unassigned_count = len(early_apps)
+            early_apps.with_context(mail_notrack=True).write({'therapist_id': False})
+            body = _("<b>System Auto-Unassigned:</b> Therapist marked as arriving late (%s:00).") % expected_arrival
+            self._post_audit_messages({app_id: body for app_id in early_apps.ids})
         elif action in ['no_show', 'wo', 'leave']:
             # Unassign all sessions for the day
             unassigned_count = len(appointments)
-            appointments.write({'therapist_id': False})
-            for app in appointments:
-                app.message_post(body=_("<b>System Auto-Unassigned:</b> Therapist marked as %s.") % lbl)
+            appointments.with_context(mail_notrack=True).write({'therapist_id': False})
+            body = _("<b>System Auto-Unassigned:</b> Therapist marked as %s.") % lbl
+            self._post_audit_messages({app_id: body for app_id in appointments.ids})
 
         msg = f"{therapist.name} updated to {lbl}."
         if unassigned_count > 0:
@@ -1113,9 +1394,251 @@ class ClinicScheduleAppointment(models.Model):
 
         return {'status': 'success', 'message': msg}
 
+    @api.model
+    def get_board_state(self, clinic_id, target_date, pulled_therapist_ids=None, panels=None, region_id=0,
+                        remember=False, version=None):
+        """Single round trip for the schedule board.
+
+        The day's appointments and therapist overlays are loaded once and shared by the
+        requested panels (see BOARD_PANELS). ``remember`` also stores the clinic/region as
+        the user's last operated one. When ``version`` (as returned by a previous call with
+        the same arguments) still matches, only {'version', 'revision', 'unchanged': True} is
+        returned. ``revision`` is the change feed position to pass to get_board_changes()."""
+        panels = [p for p in (panels or ['matrix']) if p in BOARD_PANELS]
+        clinic_id = int(clinic_id or 0)
+        # Read before the payload is built: a change landing in between is replayed, never lost
+        revision = self.env['clinic.schedule.change'].sudo()._get_position() if clinic_id and target_date else 0
+        board_version = self._get_board_version(clinic_id, target_date, pulled_therapist_ids, panels)
+
+        if remember:
+            self.save_last_operated_clinic(clinic_id, region_id)
+        if version and version == board_version:
+            return {'version': board_version, 'revision': revision, 'unchanged': True}
+
+        # Only the roster and the ledger span every clinic of the day
+        board_clinic_id = clinic_id if not {'roster', 'ledger'} & set(panels) else None
+        day = self._get_board_day(target_date, board_clinic_id) if target_date else None
+        result = {'version': board_version, 'revision': revision, 'unchanged': False}
+        if 'matrix' in panels:
+            result['matrix'] = self._build_matrix_data(clinic_id, target_date, pulled_therapist_ids, day=day)
+            if not clinic_id and result['matrix']['selected_clinic_id']:
+                # The board fell back on the first allowed clinic: remember it as the operated one.
+                # Its revision was not read beforehand, so the next delta sync falls back on a reload.
+                clinic_id = result['matrix']['selected_clinic_id']
+                self.save_last_operated_clinic(clinic_id, region_id)
+        if 'roster' in panels:
+            result['roster'] = self._build_roster_data(target_date, day=day)
+        if 'ledger' in panels:
+            result['ledger'] = self._build_attendance_ledger(target_date, day=day)
+        if 'smart_view' in panels:
+            result['smart_view'] = self._build_clinic_smart_view(clinic_id, target_date, day=day)
+        return result
+
+    @api.model
+    def get_board_changes(self, clinic_id, target_date, since_revision, therapist_ids=None):
+        """Delta of a matrix board since ``since_revision`` (as returned by get_board_state).
+
+        ``therapist_ids`` are the rows currently displayed. Returns the new ``revision``, the
+        re-rendered cells of the changed appointments ('appointments'), the ids to drop
+        ('removed_ids'), the re-rendered rows of the touched therapists ('therapists') and the
+        local KPIs. ``full_reload`` is set when the delta cannot be applied on the displayed
+        board (unknown revision, or a therapist row to add), in which case nothing else is sent."""
+        clinic_id = int(clinic_id)
+        since_revision = int(since_revision or 0)
+        Change = self.env['clinic.schedule.change'].sudo()
+        revision = Change._get_position()
+        if not since_revision or revision < since_revision:
+            return {'revision': revision, 'full_reload': True}
+
+        changes = Change._get_changes(clinic_id, target_date, since_revision)
+        result = {
+            'revision': revision, 'full_reload': False,
+            'appointments': [], 'removed_ids': [], 'therapists': [], 'kpis': {},
+        }
+        if not changes:
+            return result
+
+        displayed_ids = {int(t_id) for t_id in therapist_ids or []}
+        changed_app_ids = {res_id for __, res_model, res_id, __ in changes if res_model == 'appointment'}
+        overlay_t_ids = {t_id for __, res_model, __, t_id in changes if res_model == 'daily_state' and t_id}
+        touched_t_ids = {t_id for __, __, __, t_id in changes if t_id} & displayed_ids
+
+        target_date_obj = fields.Date.from_string(target_date)
+        start_day = datetime.combine(target_date_obj, time.min)
+        end_day = datetime.combine(target_date_obj, time.max)
+        window = [('start_datetime', '>=', start_day), ('end_datetime', '<=', end_day)]
+
+        # Every appointment of the touched therapists is needed for their row totals, and the
+        # whole row is re-rendered when their overlay changed (re-allotment flags).
+        day_apps = self.sudo().search(window + ['|', ('id', 'in', list(changed_app_ids)),
+                                                ('therapist_id', 'in', list(touched_t_ids | overlay_t_ids))],
+                                      order='start_datetime asc')
+        visible_ids = set(self._search([('id', 'in', day_apps.ids)]))
+
+        def on_board(app):
+            if app.clinic_id.id == clinic_id:
+                return app.id in visible_ids
+            return app.therapist_id.id in displayed_ids
+
+        board_apps = day_apps.filtered(on_board)
+        render_apps = board_apps.filtered(
+            lambda a: a.id in changed_app_ids or (a.therapist_id.id in overlay_t_ids))
+
+        for app in render_apps:
+            if app.clinic_id.id == clinic_id and (app.therapist_id.id or 0) not in displayed_ids:
+                # A new row (therapist or UNASSIGNED) would appear: only a full payload can place it
+                return {'revision': revision, 'full_reload': True}
+
+        state_map = {s.therapist_id.id: s for s in self.env['clinic.therapist.daily.state'].search([
+            ('target_date', '=', target_date), ('therapist_id', 'in', list(touched_t_ids | overlay_t_ids))])}
+
+        patient_ids = render_apps.filtered(lambda a: a.clinic_id.id == clinic_id).mapped('patient_id').ids
+        patient_data = self.env["clinic.patient"].sudo().search_read(
+            [("id", "in", patient_ids)], ["id", "name", "gender", "mrn", "remaining_sessions"]
+        ) if patient_ids else []
+        patient_map = {p["id"]: p for p in patient_data}
+        slot_dict = dict(self._fields["slot_type"].selection)
+        now_utc = datetime.utcnow()
+
+        result['appointments'] = [
+            self._format_board_appointment(app, clinic_id, patient_map, state_map, slot_dict, now_utc)
+            for app in render_apps
+        ]
+        result['removed_ids'] = sorted(changed_app_ids - set(render_apps.ids))
+
+        clinic = self.env['clinic.clinic'].sudo().browse(clinic_id)
+        for t in self.env['clinic.therapist'].sudo().browse(sorted(touched_t_ids | (overlay_t_ids & displayed_ids))):
+            t_apps = [a for a in board_apps if a.therapist_id.id == t.id]
+            result['therapists'].append(
+                self._format_board_therapist(t, clinic_id, clinic.region_id.id, state_map.get(t.id), t_apps))
+
+        counters = self._get_clinic_day_counters(clinic_id, start_day, end_day)
+        result['kpis'] = {
+            'total_scheduled': counters['allotted'],
+            'allotted_clinic_hv': counters['allotted'] - counters['self_visits'],
+            'self_scheduled': counters['self_visits'],
+            'outstanding': counters['yet_to_allot'],
+            'utilization': self._get_board_utilization(clinic_id, start_day, end_day, displayed_ids - {0}),
+        }
+        return result
+
+    @api.model
+    def _get_board_utilization(self, clinic_id, start_day, end_day, therapist_ids):
+        """Utilization KPI of a board from SQL: booked patient minutes of the non-buffer
+        therapists against 15 hours per displayed, non-buffer therapist who is not absent."""
+        therapists = self.env['clinic.therapist'].sudo().browse(list(therapist_ids)).filtered(
+            lambda t: not t.is_buffer)
+        absent_ids = set(self.env['clinic.therapist.daily.state'].sudo().search([
+            ('target_date', '=', start_day.date()), ('therapist_id', 'in', therapists.ids),
+            ('action_type', 'in', ['no_show', 'wo', 'leave'])]).mapped('therapist_id').ids)
+        total_capacity_mins = len(set(therapists.ids) - absent_ids) * 15 * 60
+        if not total_capacity_mins:
+            return 0
+
+        self.flush_model(['clinic_id', 'therapist_id', 'slot_type', 'start_datetime', 'end_datetime'])
+        self.env['clinic.therapist'].flush_model(['is_buffer'])
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(EXTRACT(EPOCH FROM (a.end_datetime - a.start_datetime)) / 60.0), 0)
+            FROM clinic_schedule_appointment a
+            JOIN clinic_therapist t ON t.id = a.therapist_id
+            WHERE a.clinic_id = %s AND a.slot_type = 'patient'
+              AND a.start_datetime >= %s AND a.end_datetime <= %s
+              AND NOT COALESCE(t.is_buffer, FALSE)
+        """, (clinic_id, start_day, end_day))
+        total_booked_mins = float(self.env.cr.fetchone()[0])
+        return round((total_booked_mins / total_capacity_mins) * 100)
+
+    @api.model
+    def _get_board_day(self, target_date, clinic_id=None):
+        """Loads what the board panels read for a day: its appointments as visible to the user
+        and the therapist overlays. With ``clinic_id`` only that clinic's appointments are
+        loaded (enough for the matrix and smart view panels), and the cross-clinic overlay is
+        fetched per therapist by _get_board_cross_clinic_apps(). Without it, every clinic's
+        appointments are loaded, also in sudo, as the roster and ledger panels need."""
+        target_date_obj = fields.Date.from_string(target_date)
+        start_day = datetime.combine(target_date_obj, time.min)
+        end_day = datetime.combine(target_date_obj, time.max)
+        domain = [('start_datetime', '>=', start_day), ('end_datetime', '<=', end_day)]
+
+        if clinic_id:
+            apps = self.search(domain + [('clinic_id', '=', clinic_id)], order='start_datetime asc')
+            apps_sudo = None
+        else:
+            apps_sudo = self.sudo().search(domain, order='start_datetime asc')
+            visible_ids = set(self._search(domain))
+            apps = self.browse([a.id for a in apps_sudo if a.id in visible_ids])
+        daily_states = self.env['clinic.therapist.daily.state'].search([('target_date', '=', target_date)])
+        return {
+            'date': target_date_obj,
+            'start': start_day,
+            'end': end_day,
+            'clinic_id': clinic_id,
+            'apps_sudo': apps_sudo,
+            'apps': apps,
+            'state_map': {s.therapist_id.id: s for s in daily_states},
+        }
+
+    @api.model
+    def _get_board_cross_clinic_apps(self, day, clinic_id, therapist_ids):
+        """Appointments (sudo) the given therapists have at other clinics than clinic_id that day."""
+        if not therapist_ids:
+            return self.sudo().browse()
+        if day['apps_sudo'] is not None:
+            return day['apps_sudo'].filtered(
+                lambda a: a.clinic_id.id != clinic_id and a.therapist_id.id in therapist_ids)
+        return self.sudo().search([
+            ('start_datetime', '>=', day['start']),
+            ('end_datetime', '<=', day['end']),
+            ('clinic_id', '!=', clinic_id),
+            ('therapist_id', 'in', list(therapist_ids)),
+        ], order='start_datetime asc')
+
+    @api.model
+    def _get_board_version(self, clinic_id, target_date, pulled_therapist_ids, panels):
+        """ETag of a board payload: a digest of the request and of the day's appointments,
+        overlays, active therapists and clinic patients (row count, last write, id sum).
+        On today's board it also rolls over every 5 minutes so live statuses are refreshed."""
+        self.flush_model()
+        self.env['clinic.therapist.daily.state'].flush_model()
+        self.env['clinic.therapist'].flush_model()
+        self.env['clinic.patient'].flush_model(['clinic_id', 'remaining_sessions', 'active'])
+
+        signature = []
+        if target_date:
+            target_date_obj = fields.Date.from_string(target_date)
+            self.env.cr.execute("""
+                SELECT
+                    (SELECT ROW(COUNT(*), MAX(write_date), SUM(id))
+                     FROM clinic_schedule_appointment
+                     WHERE start_datetime >= %(start)s AND end_datetime <= %(end)s)::text,
+                    (SELECT ROW(COUNT(*), MAX(write_date), SUM(id))
+                     FROM clinic_therapist_daily_state WHERE target_date = %(date)s)::text,
+                    (SELECT ROW(COUNT(*), MAX(write_date)) FROM clinic_therapist WHERE active)::text,
+                    (SELECT MAX(write_date) FROM clinic_patient WHERE clinic_id = %(clinic_id)s)::text,
+                    (SELECT ROW(COUNT(*), MAX(revision))
+                     FROM clinic_schedule_change WHERE target_date = %(date)s)::text
+            """, {
+                'start': datetime.combine(target_date_obj, time.min),
+                'end': datetime.combine(target_date_obj, time.max),
+                'date': target_date_obj,
+                'clinic_id': clinic_id,
+            })
+            signature = list(self.env.cr.fetchone())
+            if target_date_obj == self._ist_date():
+                signature.append(int(datetime.utcnow().timestamp() // 300))
+
+        key = repr((self.env.uid, clinic_id, target_date, sorted(pulled_therapist_ids or []), sorted(panels),
+                    signature))
+        return hashlib.md5(key.encode()).hexdigest()
+
     @api.model
     def get_matrix_data(self, clinic_id, target_date, pulled_therapist_ids=None):
         """Get matrix data for clinic scheduling dashboard"""
+        return self._build_matrix_data(clinic_id, target_date, pulled_therapist_ids)
+
+    @api.model
+    def _build_matrix_data(self, clinic_id, target_date, pulled_therapist_ids=None, day=None):
+        """Matrix panel of the board. ``day`` is the preloaded _get_board_day() of target_date."""
         user = self.env.user
         is_manager = user.has_group('clinic_schedule.group_clinic_schedule_manager')
 
@@ -1154,22 +1677,15 @@ class ClinicScheduleAppointment(models.Model):
             }
 
         clinic_id = int(clinic_id)
-        target_date_obj = fields.Date.from_string(target_date)
-        start_day = datetime.combine(target_date_obj, time(0, 0, 0))
-        end_day = datetime.combine(target_date_obj, time(23, 59, 59))
+        day = day or self._get_board_day(target_date, clinic_id)
+        start_day, end_day = day['start'], day['end']
 
         # ==========================================
         # 2. LOCAL APPOINTMENTS (Normal Security)
         # ==========================================
-        # ... (Keep existing appointments_raw query) ...
-        appointments_raw = self.search([
-            ("clinic_id", "=", clinic_id),
-            ("start_datetime", ">=", start_day),
-            ("end_datetime", "<=", end_day)
-        ], order="start_datetime asc")
+        appointments_raw = day['apps'].filtered(lambda a: a.clinic_id.id == clinic_id)
 
-        daily_states = self.env["clinic.therapist.daily.state"].search([("target_date", "=", target_date)])
-        state_map = {s.therapist_id.id: s for s in daily_states}
+        state_map = day['state_map']
 
         # FIX: Extract therapists who actively have sessions in the currently viewed day
         # Extract therapists who actively have sessions in the currently viewed day
@@ -1202,13 +1718,8 @@ class ClinicScheduleAppointment(models.Model):
         # ==========================================
         # 3. CROSS-CLINIC APPOINTMENTS (Sudo Bypass)
         # ==========================================
-        # We MUST sudo the search itself to bypass branch security rules and find the therapist's location
-        cross_clinic_apps = self.sudo().search([
-            ("clinic_id", "!=", clinic_id),
-            ("start_datetime", ">=", start_day),
-            ("end_datetime", "<=", end_day),
-            ("therapist_id", "in", assigned_therapists.ids)
-        ])
+        # Loaded with sudo to bypass branch security rules and find the therapist's location
+        cross_clinic_apps = self._get_board_cross_clinic_apps(day, clinic_id, set(assigned_therapists.ids))
 
         all_apps_to_render = (appointments_raw | cross_clinic_apps).sudo()
 
@@ -1225,36 +1736,8 @@ class ClinicScheduleAppointment(models.Model):
         clinic_region_id = next(
             (c['region_id'][0] for c in clinics_records if c['id'] == int(clinic_id) and c['region_id']), False)
         for t in assigned_therapists:
-            t_state = state_map.get(t.id)
-            is_absent = t_state and t_state.action_type in ['no_show', 'wo', 'leave']
-            sort_score = 5
-            if t.is_buffer and not is_absent:
-                sort_score = 2
-            elif is_absent:
-                sort_score = 6
-            elif t.designation in ['rs', 'fixed'] and int(clinic_id) in t.allowed_branch_ids.ids:
-                sort_score = 3
-            elif clinic_region_id and any(b.region_id.id == clinic_region_id for b in t.allowed_branch_ids):
-                sort_score = 4
-
-            t_apps = [a for a in all_apps_to_render if
-                      a.therapist_id.id == t.id and a.slot_type == 'patient' and a.attendance_state != 'no_show']
-            total_slots = len(t_apps)
-            if total_slots > 0:
-                first_app = min(t_apps, key=lambda a: a.start_datetime)
-                local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
-                start_dt = pytz.utc.localize(first_app.start_datetime).astimezone(local_tz)
-                end_dt = start_dt + timedelta(hours=9)
-                shift_timing = f"{start_dt.strftime('%I:%M %p')} - {end_dt.strftime('%I:%M %p')}"
-            else:
-                shift_timing = "Not Started"
-            g_tag = ' (M)' if t.gender == 'm' else (' (F)' if t.gender == 'f' else '')
-            therapists.append({
-                'id': t.id, 'name': f"{t.name}", 'designation': t.designation, 'vendor_id': t.vendor_id or 'N/A',
-                'gender_tag': g_tag, 'raw_gender': t.gender, 'is_buffer': t.is_buffer, 'is_absent': bool(is_absent),
-                'overlay_state': t_state.action_type if t_state else 'present', 'shift_timing': shift_timing,
-                'total_allotted_slots': total_slots, '_sort_score': sort_score
-            })
+            t_apps = [a for a in all_apps_to_render if a.therapist_id.id == t.id]
+            therapists.append(self._format_board_therapist(t, clinic_id, clinic_region_id, state_map.get(t.id), t_apps))
         therapists.sort(key=lambda x: (x["_sort_score"], x["name"]))
 
         patient_ids = all_apps_to_render.mapped("patient_id").ids
@@ -1270,90 +1753,16 @@ class ClinicScheduleAppointment(models.Model):
         now_utc = datetime.utcnow()
 
         for app in all_apps_to_render:
-            is_other_clinic = (app.clinic_id.id != clinic_id)
-            local_time = fields.Datetime.context_timestamp(self, app.start_datetime) if app.start_datetime else False
-            s_time_str = local_time.strftime("%I:%M %p") if local_time else ""
-            e_time_str = fields.Datetime.context_timestamp(self, app.end_datetime).strftime(
-                "%I:%M %p") if app.end_datetime else ""
-
-            if local_time:
-                snapped_minute = (local_time.minute // 10) * 10
-                slot_key = f"{local_time.hour:02d}:{snapped_minute:02d}"
-            else:
-                slot_key = "00:00"
-
-            if app.end_datetime and app.start_datetime:
-                duration_mins = round((app.end_datetime - app.start_datetime).total_seconds() / 60.0)
-            else:
-                duration_mins = 10
-            col_span = max(1, int(duration_mins) // 10)
-
-            # ==========================================
-            # 4. PAYLOAD SANITIZATION (Data Leak Prevention)
-            # ==========================================
-            p_gender, raw_p_gen, p_name, p_mrn = "", False, "", ""
-            p_info = None
-
-            # We ONLY map patient data if the user is authorized for this clinic.
-            # If it's a cross-clinic record, it stays completely blank.
-            if not is_other_clinic and app.patient_id and app.patient_id.id in patient_map:
-                p_info = patient_map[app.patient_id.id]
-                p_name = p_info.get("name") or ""
-                p_mrn = p_info.get("mrn") or ""
-                g_val = (p_info.get("gender") or "").lower()
-                if g_val in ["m", "f"]:
-                    p_gender = " (M)" if g_val == "m" else " (F)"
-                    raw_p_gen = g_val
-
-            display_state = app.attendance_state
-            if display_state == 'scheduled' and app.start_datetime and app.end_datetime:
-                if app.start_datetime <= now_utc <= app.end_datetime:
-                    display_state = 'in_progress'
-
-            requires_reallotment = False
-            if not is_other_clinic:
-                if app.therapist_id:
-                    t_state = state_map.get(app.therapist_id.id)
-                    if t_state:
-                        if t_state.action_type in ["no_show", "wo", "leave"]:
-                            requires_reallotment = True
-                        elif t_state.action_type == "late" and local_time and local_time.hour < t_state.expected_hour:
-                            requires_reallotment = True
-                elif not app.therapist_id:
-                    requires_reallotment = True
-
-            if not is_other_clinic and app.slot_type == "patient" and app.therapist_id:
+            if app.clinic_id.id == clinic_id and app.slot_type == "patient" and app.therapist_id:
                 if app.visit_type == "self":
                     scheduled_self += 1
                 else:
                     scheduled_clinic_hv += 1
-
-            formatted_appointments.append({
-                "id": app.id,
-                "therapist_id": app.therapist_id.id if app.therapist_id else 0,
-                "slot_type": app.slot_type,
-                "visit_type": app.visit_type,
-                "slot_label": slot_dict.get(app.slot_type, app.slot_type),
-                "patient_name": f"{p_name}{p_gender}" if p_name else "",
-                "patient_mrn": p_mrn,
-                "patient_raw_gender": raw_p_gen,
-                "slot_key": slot_key,
-                "col_span": col_span,
-                "remaining_sessions": p_info.get("remaining_sessions", 0) if p_info else 0,
-                "time_range": f"{s_time_str} - {e_time_str}" if s_time_str else "",
-                "attendance_state": display_state,
-                "requires_reallotment": requires_reallotment,
-                "notification_status": app.notification_status,
-                "is_other_clinic": is_other_clinic,
-                # Safe because we pulled the record with sudo, but we scrubbed the patient info above
-                "other_clinic_name": app.clinic_id.name if is_other_clinic else ""
-            })
+            formatted_appointments.append(
+                self._format_board_appointment(app, clinic_id, patient_map, state_map, slot_dict, now_utc))
 
         # Calculate KPIs (local clinic only)
-        scheduled_patient_ids = set(
-            app.patient_id.id for app in appointments_raw if app.slot_type == "patient" and app.therapist_id)
-        total_eligible_patients = set(self.env['clinic.patient'].search([('remaining_sessions', '>', 0)]).ids)
-        outstanding_count = len(total_eligible_patients - scheduled_patient_ids)
+        outstanding_count = self._get_clinic_day_counters(clinic_id, start_day, end_day)['yet_to_allot']
 
         # FIX: Separated Staffing Counts
         fixed_count = sum(1 for t in assigned_therapists if t.designation == 'fixed')
@@ -1392,8 +1801,164 @@ class ClinicScheduleAppointment(models.Model):
             }
         }
 
+    @api.model
+    def _format_board_therapist(self, t, clinic_id, clinic_region_id, t_state, t_apps):
+        """Matrix row of a therapist. ``t_apps`` are their rendered appointments of the day."""
+        is_absent = t_state and t_state.action_type in ['no_show', 'wo', 'leave']
+        sort_score = 5
+        if t.is_buffer and not is_absent:
+            sort_score = 2
+        elif is_absent:
+            sort_score = 6
+        elif t.designation in ['rs', 'fixed'] and int(clinic_id) in t.allowed_branch_ids.ids:
+            sort_score = 3
+        elif clinic_region_id and any(b.region_id.id == clinic_region_id for b in t.allowed_branch_ids):
+            sort_score = 4
+
+        t_apps = [a for a in t_apps if a.slot_type == 'patient' and a.attendance_state != 'no_show']
+        total_slots = len(t_apps)
+        if total_slots > 0:
+            first_app = min(t_apps, key=lambda a: a.start_datetime)
+            local_tz = pytz.timezone(self.env.user.tz or 'Asia/Kolkata')
+            start_dt = pytz.utc.localize(first_app.start_datetime).astimezone(local_tz)
+            end_dt = start_dt + timedelta(hours=9)
+            shift_timing = f"{start_dt.strftime('%I:%M %p')} - {end_dt.strftime('%I:%M %p')}"
+        else:
+            shift_timing = "Not Started"
+        g_tag = ' (M)' if t.gender == 'm' else (' (F)' if t.gender == 'f' else '')
+        return {
+            'id': t.id, 'name': f"{t.name}", 'designation': t.designation, 'vendor_id': t.vendor_id or 'N/A',
+            'gender_tag': g_tag, 'raw_gender': t.gender, 'is_buffer': t.is_buffer, 'is_absent': bool(is_absent),
+            'overlay_state': t_state.action_type if t_state else 'present', 'shift_timing': shift_timing,
+            'total_allotted_slots': total_slots, '_sort_score': sort_score
+        }
+
+    @api.model
+    def _format_board_appointment(self, app, clinic_id, patient_map, state_map, slot_dict, now_utc):
+        """Matrix cell of an appointment (sudo record), as seen from the board of clinic_id."""
+        is_other_clinic = (app.clinic_id.id != clinic_id)
+        local_time = fields.Datetime.context_timestamp(self, app.start_datetime) if app.start_datetime else False
+        s_time_str = local_time.strftime("%I:%M %p") if local_time else ""
+        e_time_str = fields.Datetime.context_timestamp(self, app.end_datetime).strftime(
+            "%I:%M %p") if app.end_datetime else ""
+
+        if local_time:
+            snapped_minute = (local_time.minute // 10) * 10
+            slot_key = f"{local_time.hour:02d}:{snapped_minute:02d}"
+        else:
+            slot_key = "00:00"
+
+        if app.end_datetime and app.start_datetime:
+            duration_mins = round((app.end_datetime - app.start_datetime).total_seconds() / 60.0)
+        else:
+            duration_mins = 10
+        col_span = max(1, int(duration_mins) // 10)
+
+        # ==========================================
+        # PAYLOAD SANITIZATION (Data Leak Prevention)
+        # ==========================================
+        p_gender, raw_p_gen, p_name, p_mrn = "", False, "", ""
+        p_info = None
+
+        # We ONLY map patient data if the user is authorized for this clinic.
+        # If it's a cross-clinic record, it stays completely blank.
+        if not is_other_clinic and app.patient_id and app.patient_id.id in patient_map:
+            p_info = patient_map[app.patient_id.id]
+            p_name = p_info.get("name") or ""
+            p_mrn = p_info.get("mrn") or ""
+            g_val = (p_info.get("gender") or "").lower()
+            if g_val in ["m", "f"]:
+                p_gender = " (M)" if g_val == "m" else " (F)"
+                raw_p_gen = g_val
+
+        display_state = app.attendance_state
+        if display_state == 'scheduled' and app.start_datetime and app.end_datetime:
+            if app.start_datetime <= now_utc <= app.end_datetime:
+                display_state = 'in_progress'
+
+        requires_reallotment = False
+        if not is_other_clinic:
+            if app.therapist_id:
+                t_state = state_map.get(app.therapist_id.id)
+                if t_state:
+                    if t_state.action_type in ["no_show", "wo", "leave"]:
+                        requires_reallotment = True
+                    elif t_state.action_type == "late" and local_time and local_time.hour < t_state.expected_hour:
+                        requires_reallotment = True
+            elif not app.therapist_id:
+                requires_reallotment = True
+
+        return {
+            "id": app.id,
+            "therapist_id": app.therapist_id.id if app.therapist_id else 0,
+            "slot_type": app.slot_type,
+            "visit_type": app.visit_type,
+            "slot_label": slot_dict.get(app.slot_type, app.slot_type),
+            "patient_name": f"{p_name}{p_gender}" if p_name else "",
+            "patient_mrn": p_mrn,
+            "patient_raw_gender": raw_p_gen,
+            "slot_key": slot_key,
+            "col_span": col_span,
+            "remaining_sessions": p_info.get("remaining_sessions", 0) if p_info else 0,
+            "time_range": f"{s_time_str} - {e_time_str}" if s_time_str else "",
+            "attendance_state": display_state,
+            "requires_reallotment": requires_reallotment,
+            "notification_status": app.notification_status,
+            "is_other_clinic": is_other_clinic,
+            # Safe because we pulled the record with sudo, but we scrubbed the patient info above
+            "other_clinic_name": app.clinic_id.name if is_other_clinic else ""
+        }
+
+    @api.model
+    def _get_clinic_day_counters(self, clinic_id, start_utc, end_utc):
+        """Returns the day's patient-slot counters for one clinic in a single query.
+        'yet_to_allot' is an anti-join of the clinic's patients with remaining sessions
+        against the allotted appointments, served by clinic_patient_allotable_clinic_idx."""
+        self.flush_model(['clinic_id', 'therapist_id', 'patient_id', 'slot_type', 'visit_type',
+                          'start_datetime', 'end_datetime'])
+        self.env['clinic.patient'].flush_model(['clinic_id', 'remaining_sessions', 'active'])
+        self.env.cr.execute("""
+            WITH day_apps AS (
+                SELECT therapist_id, patient_id, visit_type
+                FROM clinic_schedule_appointment
+                WHERE clinic_id = %(clinic_id)s
+                  AND slot_type = 'patient'
+                  AND start_datetime >= %(start)s
+                  AND end_datetime <= %(end)s
+            )
+            SELECT
+                COUNT(*) FILTER (WHERE therapist_id IS NOT NULL),
+                COUNT(*) FILTER (WHERE therapist_id IS NOT NULL AND visit_type = 'clinic'),
+                COUNT(*) FILTER (WHERE therapist_id IS NOT NULL AND visit_type = 'home'),
+                COUNT(*) FILTER (WHERE therapist_id IS NOT NULL AND visit_type = 'self'),
+                ARRAY(SELECT DISTINCT therapist_id FROM day_apps WHERE therapist_id IS NOT NULL),
+                (SELECT COUNT(*)
+                 FROM clinic_patient p
+                 WHERE p.clinic_id = %(clinic_id)s
+                   AND p.remaining_sessions > 0
+                   AND p.active
+                   AND NOT EXISTS (
+                       SELECT 1 FROM day_apps a
+                       WHERE a.patient_id = p.id AND a.therapist_id IS NOT NULL
+                   ))
+            FROM day_apps
+        """, {'clinic_id': int(clinic_id), 'start': start_utc, 'end': end_utc})
+        allotted, clinic_visits, home_visits, self_visits, booked_t_ids, yet_to_allot = self.env.cr.fetchone()
+        return {
+            'allotted': allotted,
+            'clinic_visits': clinic_visits,
+            'home_visits': home_visits,
+            'self_visits': self_visits,
+            'booked_therapist_ids': booked_t_ids or [],
+            'yet_to_allot': yet_to_allot,
+        }
+
     @api.model
     def get_clinic_smart_view(self, clinic_id, target_date):
+        return self._build_clinic_smart_view(clinic_id, target_date)
+
+    @api.model
+    def _build_clinic_smart_view(self, clinic_id, target_date, day=None):
         if not clinic_id or not target_date: return {}
         clinic_id = int(clinic_id)
 
@@ -1407,111 +1972,162 @@ class ClinicScheduleAppointment(models.Model):
         start_day_utc = start_of_day_local.astimezone(pytz.utc).replace(tzinfo=None)
         end_day_utc = end_of_day_local.astimezone(pytz.utc).replace(tzinfo=None)
 
-        # Apply UTC Boundaries to DB Query
-        patient_apps = self.search([
-            ('clinic_id', '=', clinic_id),
-            ('start_datetime', '>=', start_day_utc),
-            ('end_datetime', '<=', end_day_utc),
-            ('slot_type', '=', 'patient')
-        ])
+        # Apply UTC Boundaries to DB Query (single clinic-scoped round trip)
+        counters = self._get_clinic_day_counters(clinic_id, start_day_utc, end_day_utc)
 
-        daily_states = self.env['clinic.therapist.daily.state'].search([('target_date', '=', target_date)])
-        absent_staff_ids = [s.therapist_id.id for s in daily_states if s.action_type in ['no_show', 'wo', 'leave']]
         assigned_staff = self.env['clinic.therapist'].search(
             [('active', '=', True), '|', ('allowed_branch_ids', 'in', clinic_id), ('is_buffer', '=', True)])
 
+        # Only the overlays of this clinic's staff matter here
+        if day:
+            absent_staff_ids = {t_id for t_id, s in day['state_map'].items()
+                                if s.action_type in ['no_show', 'wo', 'leave']} & set(assigned_staff.ids)
+        else:
+            daily_states = self.env['clinic.therapist.daily.state'].search([
+                ('target_date', '=', target_date),
+                ('therapist_id', 'in', assigned_staff.ids),
+                ('action_type', 'in', ['no_show', 'wo', 'leave'])
+            ])
+            absent_staff_ids = set(daily_states.mapped('therapist_id').ids)
+
         active_capacity_staff = assigned_staff.filtered(lambda t: t.id not in absent_staff_ids and not t.is_buffer)
-        booked_t_ids = patient_apps.mapped('therapist_id.id')
+        booked_t_ids = set(counters['booked_therapist_ids'])
         free_staff = active_capacity_staff.filtered(lambda t: t.id not in booked_t_ids)
-        eligible_patient_ids = set(self.env['clinic.patient'].search([('remaining_sessions', '>', 0)]).ids)
-        unallotted_count = len(
-            eligible_patient_ids - set(patient_apps.filtered(lambda a: a.therapist_id).mapped('patient_id.id')))
 
         return {
-            'total_scheduled_today': len(patient_apps.filtered(lambda a: a.therapist_id)),
-            'clinic_visits_today': len(patient_apps.filtered(lambda a: a.visit_type == 'clinic' and a.therapist_id)),
-            'home_visits_today': len(patient_apps.filtered(lambda a: a.visit_type == 'home' and a.therapist_id)),
-            'self_visits_today': len(patient_apps.filtered(lambda a: a.visit_type == 'self' and a.therapist_id)),
-            'yet_to_allot': unallotted_count,
+            'total_scheduled_today': counters['allotted'],
+            'clinic_visits_today': counters['clinic_visits'],
+            'home_visits_today': counters['home_visits'],
+            'self_visits_today': counters['self_visits'],
+            'yet_to_allot': counters['yet_to_allot'],
             'free_staff': [{'name': t.name, 'designation': t.designation} for t in free_staff],
             'total_capacity': len(active_capacity_staff) * 15,
-            'booked_slots': len(patient_apps.filtered(lambda a: a.therapist_id))
+            'booked_slots': counters['allotted']
         }
 
     @api.model
     def get_roster_data(self, target_date=None):
+        return self._build_roster_data(target_date)
+
+    @api.model
+    def _build_roster_data(self, target_date=None, day=None):
+        """Roster panel of the board, served from a per-date cache keyed on a signature of the
+        therapists, branch assignments, clinics and the day's appointment revisions."""
+        return self._get_cached_roster_data(target_date or False, self._get_roster_signature(target_date), day=day)
+
+    @api.model
+    def _get_roster_signature(self, target_date):
+        Therapist = self.env['clinic.therapist']
+        Therapist.flush_model()
+        self.env['clinic.clinic'].flush_model()
+        branch_field = Therapist._fields['allowed_branch_ids']
+        self.env.cr.execute(SQL(
+            """
+            SELECT
+                (SELECT ROW(COUNT(*), MAX(write_date)) FROM clinic_therapist)::text,
+                (SELECT ROW(COUNT(*), MAX(write_date)) FROM clinic_clinic)::text,
+                (SELECT ROW(COUNT(*), SUM(%(therapist_col)s::bigint * 1000003 + %(clinic_col)s)) FROM %(rel)s)::text,
+                (SELECT ROW(COUNT(*), MAX(revision)) FROM clinic_schedule_change WHERE target_date = %(date)s)::text
+            """,
+            therapist_col=SQL.identifier(branch_field.column1),
+            clinic_col=SQL.identifier(branch_field.column2),
+            rel=SQL.identifier(branch_field.relation),
+            date=target_date or None,
+        ))
+        return self.env.cr.fetchone()
+
+    @api.model
+    @tools.ormcache('self.env.uid', 'target_date', 'signature')
+    def _get_cached_roster_data(self, target_date, signature, day=None):
+        """Builds the roster on a therapist -> branches inverted index (one search_read and
+        one relation table query) instead of checking every therapist for every clinic."""
         clinics = self.env['clinic.clinic'].sudo().search_read([], ['id', 'name'])
-        therapist_records = self.env['clinic.therapist'].sudo().search([('active', '=', True)])
-        clinic_active_floaters = {}
+        Therapist = self.env['clinic.therapist'].sudo()
+        therapists = Therapist.search_read([('active', '=', True), ('is_buffer', '=', False)],
+                                           ['id', 'name', 'vendor_id', 'designation'])
+
+        branch_field = Therapist._fields['allowed_branch_ids']
+        self.env.cr.execute(SQL(
+            "SELECT %s, %s FROM %s WHERE %s = ANY(%s)",
+            SQL.identifier(branch_field.column1), SQL.identifier(branch_field.column2),
+            SQL.identifier(branch_field.relation), SQL.identifier(branch_field.column1),
+            [t['id'] for t in therapists],
+        ))
+        branch_index = defaultdict(list)
+        for therapist_id, clinic_id in self.env.cr.fetchall():
+            branch_index[therapist_id].append(clinic_id)
+
+        # Floaters without branches show up where they have sessions that day (everywhere without a date)
+        active_clinics = defaultdict(set)
         if target_date:
-            start_day = datetime.combine(fields.Date.from_string(target_date), time.min)
-            end_day = datetime.combine(fields.Date.from_string(target_date), time.max)
-            appointments = self.search(
-                [('start_datetime', '>=', start_day), ('end_datetime', '<=', end_day), ('therapist_id', '!=', False)])
-            for app in appointments:
-                if app.clinic_id.id not in clinic_active_floaters: clinic_active_floaters[app.clinic_id.id] = set()
-                clinic_active_floaters[app.clinic_id.id].add(app.therapist_id.id)
-        roster_map = []
-        for clinic in clinics:
-            fixed_staff, floater_staff = [], []
-            for t in therapist_records:
-                if t.is_buffer: continue
-                allowed_branches = t.allowed_branch_ids.ids
-                if t.designation == 'fixed':
-                    if clinic['id'] in allowed_branches:
-                        fixed_staff.append({
-                            'id': t.id,
-                            'name': f"{t.name} (Vendor: {t.vendor_id or 'N/A'})",
-                            'type': 'Fixed Therapist'
-                        })
-                else:
-                    if allowed_branches:
-                        if clinic['id'] in allowed_branches:
-                            floater_staff.append({
-                                'id': t.id,
-                                'name': f"{t.name} (Vendor: {t.vendor_id or 'N/A'})",
-                                'type': 'Clinic Floater' if t.designation == 'floater' else 'HV Floater'
-                            })
-                    else:
-                        has_app = t.id in clinic_active_floaters.get(clinic['id'], set()) if target_date else True
-                        if has_app:
-                            floater_staff.append({
-                                'id': t.id,
-                                'name': f"{t.name} (Vendor: {t.vendor_id or 'N/A'})",
-                                'type': 'Clinic Floater' if t.designation == 'floater' else 'HV Floater'
-                            })
-            roster_map.append({'clinic_id': clinic['id'], 'clinic_name': clinic['name'], 'fixed_staff': fixed_staff,
-                               'floater_staff': floater_staff})
-        return roster_map
+            if day:
+                for app in day['apps'].filtered(lambda a: a.therapist_id):
+                    active_clinics[app.therapist_id.id].add(app.clinic_id.id)
+            else:
+                target_date_obj = fields.Date.from_string(target_date)
+                for clinic, therapist in self._read_group([
+                    ('start_datetime', '>=', datetime.combine(target_date_obj, time.min)),
+                    ('end_datetime', '<=', datetime.combine(target_date_obj, time.max)),
+                    ('therapist_id', '!=', False),
+                ], ['clinic_id', 'therapist_id']):
+                    active_clinics[therapist.id].add(clinic.id)
+        all_clinic_ids = [c['id'] for c in clinics]
+
+        fixed_staff, floater_staff = defaultdict(list), defaultdict(list)
+        for t in therapists:
+            name = f"{t['name']} (Vendor: {t['vendor_id'] or 'N/A'})"
+            branches = branch_index.get(t['id'], [])
+            if t['designation'] == 'fixed':
+                entry = {'id': t['id'], 'name': name, 'type': 'Fixed Therapist'}
+                for clinic_id in branches:
+                    fixed_staff[clinic_id].append(entry)
+            else:
+                entry = {'id': t['id'], 'name': name,
+                         'type': 'Clinic Floater' if t['designation'] == 'floater' else 'HV Floater'}
+                if not branches:
+                    branches = active_clinics.get(t['id'], ()) if target_date else all_clinic_ids
+                for clinic_id in branches:
+                    floater_staff[clinic_id].append(entry)
+
+        return [{
+            'clinic_id': clinic['id'], 'clinic_name': clinic['name'],
+            'fixed_staff': fixed_staff.get(clinic['id'], []),
+            'floater_staff': floater_staff.get(clinic['id'], []),
+        } for clinic in clinics]
 
     @api.model
     def get_attendance_ledger(self, target_date):
+        return self._build_attendance_ledger(target_date)
+
+    @api.model
+    def _build_attendance_ledger(self, target_date, day=None):
         if not target_date: return []
-        start_day = datetime.combine(fields.Date.from_string(target_date), time.min)
-        end_day = datetime.combine(fields.Date.from_string(target_date), time.max)
-        appointments = self.search([
-            ('start_datetime', '>=', start_day), ('end_datetime', '<=', end_day),
-            ('slot_type', 'not in', ['wo', 'leave', 'blocked'])
-        ], order='start_datetime asc')
+        day = day or self._get_board_day(target_date)
+        appointments = day['apps'].filtered(lambda a: a.slot_type not in ['wo', 'leave', 'blocked'])
+
+        # Day counters come pre-aggregated from the therapist ledger, the appointments only feed the timeline.
+        # The ledger is read in sudo: only the clinics whose appointments the user sees are summed,
+        # so the counters match the listed slots.
+        visible_clinic_ids = day['apps'].clinic_id.ids
+        ledger = {
+            therapist.id: (total_slots, completed, work_minutes)
+            for therapist, total_slots, completed, work_minutes in self.env['clinic.therapist.ledger'].sudo()._read_group(
+                [('ledger_date', '=', day['date']), ('clinic_id', 'in', visible_clinic_ids)], ['therapist_id'],
+                ['total_slots:sum', 'completed_count:sum', 'work_minutes:sum'])
+        } if visible_clinic_ids else {}
         therapists_data = {}
         for app in appointments:
             if not app.therapist_id or app.therapist_id.is_buffer: continue
             t_id = app.therapist_id.id
             if t_id not in therapists_data:
+                total_slots, completed, work_minutes = ledger.get(t_id, (0, 0, 0))
                 therapists_data[t_id] = {
                     'id': t_id, 'name': app.therapist_id.name,
                     'designation': dict(self.env['clinic.therapist']._fields['designation'].selection).get(
                         app.therapist_id.designation, ''),
-                    'total_slots': 0, 'completed_slots': 0, 'work_hours': 0.0, 'timeline': []
+                    'total_slots': total_slots, 'completed_slots': completed, 'work_hours': work_minutes / 60.0,
+                    'timeline': []
                 }
-            therapists_data[t_id]['total_slots'] += 1
-            duration = (
-                               app.end_datetime - app.start_datetime).total_seconds() / 3600.0 if app.end_datetime and app.start_datetime else 0
-            if app.slot_type == 'patient' and app.attendance_state == 'completed':
-                therapists_data[t_id]['completed_slots'] += 1
-                therapists_data[t_id]['work_hours'] += duration
-            elif app.slot_type in ['lunch', 'training']:
-                therapists_data[t_id]['work_hours'] += duration
             s_time = fields.Datetime.context_timestamp(self, app.start_datetime).strftime(
                 '%I:%M %p') if app.start_datetime else ''
             therapists_data[t_id]['timeline'].append({
@@ -1619,30 +2235,17 @@ class ClinicScheduleAppointment(models.Model):
             ('end_datetime', '<=', end_day),
             ('slot_type', '=', 'patient'),
             ('therapist_id', '!=', False),
-            ('notification_status', 'in', ['pending', 'failed'])
-        ])
+        ]).filtered(lambda a: a.notification_status in ('pending', 'failed'))
         if not appointments:
             return {'status': 'success', 'message': '0 new notifications to send.'}
 
-        appointments.write({'notification_status': 'queued'})
-        return {'status': 'success', 'message': f'Added {len(appointments)} notifications to dispatch queue.'}
+        queued = self.env['clinic.notification.outbox'].sudo()._enqueue(appointments)
+        return {'status': 'success', 'message': f'Added {len(queued)} notifications to dispatch queue.'}
 
     @api.model
     def _cron_consume_notification_queue(self):
-        queued_appointments = self.search([('notification_status', '=', 'queued')], limit=100)
-        if not queued_appointments:
-            return True
-
-        session = requests.Session()
-        for app in queued_appointments:
-            try:
-                app._send_slot_notification(trigger_type='booking_confirmation', session=session)
-            except Exception as e:
-                _logger.error("Fatal transaction handling failure for app ID %s: %s", app.id, str(e))
-                app.write({'notification_status': 'failed'})
-
-            self.env.cr.commit()
-        return True
+        """Entry point of the notification cron, kept for the existing scheduled action."""
+        return self.env['clinic.notification.outbox'].sudo()._cron_dispatch()
 
 
 class ClinicTherapistImportLog(models.Model):
@@ -1654,33 +2257,149 @@ class ClinicTherapistImportLog(models.Model):
     execution_date = fields.Datetime(default=fields.Datetime.now, readonly=True)
     state = fields.Selection([('draft', 'Draft'), ('done', 'Imported')], default='draft')
     records_processed = fields.Integer(readonly=True)
+    records_created = fields.Integer(readonly=True)
+    records_updated = fields.Integer(readonly=True)
+    records_failed = fields.Integer(readonly=True)
+    duration = fields.Float(string='Duration (s)', readonly=True, digits=(16, 2))
+    rows_per_second = fields.Float(string='Throughput (rows/s)', readonly=True, digits=(16, 1))
+    error_log = fields.Text(readonly=True)
 
     def action_process_csv(self):
+        """Upserts the active rows of the roster CSV, IMPORT_CHUNK_SIZE rows at a time.
+
+        Existing therapists are loaded once into vendor_id and name dictionaries. Rows are matched
+        on vendor_id, then on name, against existing therapists and the creations pending in the
+        chunk; each therapist then gets the net changes of its rows, i.e. applied in file order.
+        A chunk is one batched create plus one write per distinct set of net changes. Rows that
+        fail are logged in error_log and the rest of the file is still imported."""
         if not self.csv_file: return
+        started = _time.perf_counter()
         try:
             decoded_file = base64.b64decode(self.csv_file).decode('utf-8-sig')
         except UnicodeDecodeError:
             decoded_file = base64.b64decode(self.csv_file).decode('latin1')
         reader = csv.DictReader(io.StringIO(decoded_file))
-        Therapist = self.env['clinic.therapist']
-        counter = 0
-        for row in reader:
-            if (row.get('Status') or '').strip().lower() != 'active': continue
-            vendor_name = (row.get('Vendor Name') or '').strip()
-            vendor_id = (row.get('Vendor ID') or '').strip()
-            if not vendor_name or not vendor_id: continue
-
-            vertical = (row.get('Vertical') or '').strip().lower()
-            designation = 'hv' if 'hv' in vertical else ('floater' if 'floater' in vertical else 'fixed')
-
-            existing = Therapist.search(['|', ('vendor_id', '=', vendor_id), ('name', '=', vendor_name)], limit=1)
-            payload = {'name': vendor_name, 'vendor_id': vendor_id, 'designation': designation}
-            if existing:
-                existing.write(payload)
-            else:
-                Therapist.create(payload)
-            counter += 1
-        self.write({'state': 'done', 'records_processed': counter})
+
+        Therapist = self.env['clinic.therapist'].with_context(mail_create_nolog=True)
+        existing = {t['id']: t for t in Therapist.search_read([], ['name', 'vendor_id', 'designation'])}
+        by_vendor, by_name = {}, {}
+        for t in existing.values():
+            by_vendor.setdefault(t['vendor_id'], t['id'])
+            by_name.setdefault(t['name'], t['id'])
+
+        def index(t_id, values):
+            # Only called once values are written: re-keys the therapist on its new vendor_id/name
+            current = existing.setdefault(t_id, {'id': t_id})
+            for key, lookup in (('vendor_id', by_vendor), ('name', by_name)):
+                if key in values and lookup.get(current.get(key)) == t_id:
+                    del lookup[current[key]]
+            current.update(values)
+            by_vendor[current['vendor_id']] = by_name[current['name']] = t_id
+
+        stats = {'processed': 0, 'created': 0, 'updated': 0, 'failed': 0}
+        errors = []
+        rows = enumerate(reader, start=2)  # line 1 is the header
+        while True:
+            chunk = list(itertools.islice(rows, IMPORT_CHUNK_SIZE))
+            if not chunk:
+                break
+            to_create, touched = {}, {}
+            # Changes and pending creations of the chunk seen by its later rows, indexed only once written
+            staged, staged_vendor, staged_name = defaultdict(dict), {}, {}
+            for line, row in chunk:
+                if (row.get('Status') or '').strip().lower() != 'active': continue
+                vendor_name = (row.get('Vendor Name') or '').strip()
+                vendor_id = (row.get('Vendor ID') or '').strip()
+                if not vendor_name or not vendor_id: continue
+
+                vertical = (row.get('Vertical') or '').strip().lower()
+                designation = 'hv' if 'hv' in vertical else ('floater' if 'floater' in vertical else 'fixed')
+                payload = {'name': vendor_name, 'vendor_id': vendor_id, 'designation': designation}
+                stats['processed'] += 1
+
+                t_id = (staged_vendor.get(vendor_id) or by_vendor.get(vendor_id)
+                        or staged_name.get(vendor_name) or by_name.get(vendor_name))
+                if not t_id or t_id in to_create:
+                    # Later rows with the same vendor_id or name update the pending creation
+                    t_id = t_id or 'new_%s' % line
+                    to_create[t_id] = (line, payload)
+                    staged_vendor[vendor_id] = staged_name[vendor_name] = t_id
+                    continue
+                current = dict(existing[t_id], **staged[t_id])
+                changes = {k: v for k, v in payload.items() if current[k] != v}
+                if changes:
+                    staged[t_id].update(changes)
+                    staged_vendor[vendor_id] = staged_name[vendor_name] = t_id
+                    touched[t_id] = line
+
+            to_write = defaultdict(list)
+            for t_id, line in touched.items():
+                to_write[tuple(sorted(staged[t_id].items()))].append((line, t_id))
+
+            for changes, targets in to_write.items():
+                written = self._import_batch(
+                    lambda targets=targets, changes=changes: Therapist.browse([t for _l, t in targets]).write(dict(changes)),
+                    [(line, lambda t_id=t_id, changes=changes: Therapist.browse(t_id).write(dict(changes)))
+                     for line, t_id in targets],
+                    errors)
+                for line, t_id in targets:
+                    if line in written:
+                        index(t_id, dict(changes))
+                stats['updated'] += len(written)
+                stats['failed'] += len(targets) - len(written)
+
+            if to_create:
+                pending = list(to_create.values())
+                created = Therapist.browse()
+
+                def create_all():
+                    nonlocal created
+                    created = Therapist.create([payload for _l, payload in pending])
+
+                def create_one(payload):
+                    nonlocal created
+                    created |= Therapist.create(payload)
+
+                written = self._import_batch(create_all, [(line, lambda payload=payload: create_one(payload))
+                                                         for line, payload in pending], errors)
+                for t in created:
+                    index(t.id, {'name': t.name, 'vendor_id': t.vendor_id, 'designation': t.designation})
+                stats['created'] += len(written)
+                stats['failed'] += len(pending) - len(written)
+
+        duration = _time.perf_counter() - started
+        _logger.info("Roster import %s: %s rows in %.2fs (%s created, %s updated, %s failed)",
+                     self.file_name or self.id, stats['processed'], duration,
+                     stats['created'], stats['updated'], stats['failed'])
+        self.write({
+            'state': 'done',
+            'records_processed': stats['processed'],
+            'records_created': stats['created'],
+            'records_updated': stats['updated'],
+            'records_failed': stats['failed'],
+            'duration': duration,
+            'rows_per_second': stats['processed'] / duration if duration else 0.0,
+            'error_log': '\n'.join(errors) or False,
+        })
+
+    def _import_batch(self, batch_op, row_ops, errors):
+        """Runs batch_op in a savepoint; if it fails, replays the rows one by one (row_ops is a
+        list of (line, op)) so only the faulty rows are rejected. Returns the lines imported."""
+        try:
+            with self.env.cr.savepoint():
+                batch_op()
+            return {line for line, _op in row_ops}
+        except (ValidationError, psycopg2.Error):
+            pass
+        done = set()
+        for line, op in row_ops:
+            try:
+                with self.env.cr.savepoint():
+                    op()
+                done.add(line)
+            except (ValidationError, psycopg2.Error) as err:
+                errors.append(_("Line %s: %s") % (line, err.args[0] if err.args else err))
+        return done
 
 
 # def action_submit_request(self):
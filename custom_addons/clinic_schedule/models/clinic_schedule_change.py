@@ -0,0 +1,114 @@
+import logging
+from datetime import timedelta
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Days of board history kept in the change feed before the nightly prune
+BOARD_CHANGE_RETENTION_DAYS = 7
+
+
+class ClinicScheduleChange(models.Model):
+    _name = 'clinic.schedule.change'
+    _description = 'Schedule Board Change Feed'
+    _order = 'revision'
+    _log_access = False
+
+    clinic_id = fields.Many2one('clinic.clinic', string='Clinic', required=True, ondelete='cascade')
+    target_date = fields.Date(string='Board Date', required=True)
+    revision = fields.Integer(string='Revision', required=True)
+    res_model = fields.Selection([
+        ('appointment', 'Appointment'),
+        ('daily_state', 'Therapist Daily State')
+    ], string='Changed Record Type', required=True)
+    res_id = fields.Integer(string='Changed Record ID', required=True)
+    therapist_id = fields.Many2one('clinic.therapist', string='Therapist', ondelete='set null')
+
+    def init(self):
+        # Revisions are drawn from one sequence so they never restart, even after a prune
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS clinic_schedule_revision_seq")
+        # Id of the writing transaction, the position readers page the feed by
+        self.env.cr.execute("ALTER TABLE clinic_schedule_change ADD COLUMN IF NOT EXISTS xact_id bigint")
+        self.env.cr.execute("DROP INDEX IF EXISTS clinic_schedule_change_board_idx")
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS
+                clinic_schedule_change_board_xact_idx
+            ON clinic_schedule_change (clinic_id, target_date, xact_id)
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS
+                clinic_schedule_change_date_idx
+            ON clinic_schedule_change (target_date)
+        """)
+
+    @api.model
+    def _record_changes(self, entries):
+        """Appends (clinic_id, target_date, res_model, res_id, therapist_id) entries to the feed.
+
+        Each call gets one revision from the sequence and every row is stamped with the id
+        of the writing transaction. Nothing shared is updated, so concurrent writers of the
+        same board never wait on each other (see _get_position() for the reading side)."""
+        rows = sorted({
+            (clinic_id, target_date, res_model, res_id, therapist_id or 0)
+            for clinic_id, target_date, res_model, res_id, therapist_id in entries
+            if clinic_id and target_date
+        })
+        if not rows:
+            return
+        self.env.cr.execute("""
+            INSERT INTO clinic_schedule_change
+                (clinic_id, target_date, revision, xact_id, res_model, res_id, therapist_id)
+            SELECT r.clinic_id, r.target_date, rev.revision, txid_current(), r.res_model, r.res_id,
+                   NULLIF(r.therapist_id, 0)
+            FROM (SELECT nextval('clinic_schedule_revision_seq') AS revision) rev,
+                 UNNEST(%(clinic_ids)s::int[], %(dates)s::date[], %(res_models)s::varchar[],
+                        %(res_ids)s::int[], %(therapist_ids)s::int[])
+                     AS r(clinic_id, target_date, res_model, res_id, therapist_id)
+        """, {
+            'clinic_ids': [r[0] for r in rows],
+            'dates': [r[1] for r in rows],
+            'res_models': [r[2] for r in rows],
+            'res_ids': [r[3] for r in rows],
+            'therapist_ids': [r[4] for r in rows],
+        })
+
+    @api.model
+    def _get_position(self):
+        """Current position of the feed: the oldest transaction id still running. Every
+        transaction below it is over, so no change stamped below it can show up later.
+        Any long transaction (a cron run, for instance) holds the position back, which is
+        why _get_changes() also returns the committed changes at or above it."""
+        self.env.cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_changes(self, clinic_id, target_date, since_position):
+        """Returns the committed feed rows of a clinic board written by the transactions from
+        since_position on, as (revision, res_model, res_id, therapist_id) tuples in revision
+        order. Rows at or above the current position are delivered right away, then again
+        on the next read, until the position moves past them: replaying a change only
+        re-renders its cells, so a board is never left waiting on unrelated transactions."""
+        self.env.cr.execute("""
+            SELECT revision, res_model, res_id, therapist_id
+            FROM clinic_schedule_change
+            WHERE clinic_id = %s AND target_date = %s AND xact_id >= %s
+            ORDER BY revision
+        """, (int(clinic_id), target_date, int(since_position)))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _get_day_signature(self, date_from, date_to):
+        """Changes if any change of the boards of [date_from, date_to] was committed."""
+        self.env.cr.execute("""
+            SELECT ROW(COUNT(*), MAX(revision))::text
+            FROM clinic_schedule_change WHERE target_date >= %s AND target_date <= %s
+        """, (date_from, date_to))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _cron_prune_board_changes(self):
+        """Runs nightly. Drops the feed of boards older than BOARD_CHANGE_RETENTION_DAYS."""
+        limit_date = fields.Date.context_today(self) - timedelta(days=BOARD_CHANGE_RETENTION_DAYS)
+        self.env.cr.execute("DELETE FROM clinic_schedule_change WHERE target_date < %s", (limit_date,))
+        pruned = self.env.cr.rowcount
+        _logger.info("Schedule change feed: pruned %s changes of boards before %s", pruned, limit_date)
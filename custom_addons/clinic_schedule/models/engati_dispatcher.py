@@ -0,0 +1,73 @@
+import threading
+import time as _time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class RateLimiter:
+    """Thread-safe token bucket per endpoint (scheme + host + path): at most ``rate`` calls
+    per second to each endpoint, with bursts of up to ``rate`` calls."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def acquire(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc, parts.path)
+        while True:
+            with self._lock:
+                now = _time.monotonic()
+                tokens, stamp = self._buckets.get(key, (self.rate, now))
+                tokens = min(self.rate, tokens + (now - stamp) * self.rate)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    return
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            _time.sleep(wait)
+
+
+class EngatiDispatcher:
+    """Sends prepared Engati requests with bounded concurrency over one pooled session.
+
+    Only HTTP happens in the worker threads: requests are prepared and results persisted by
+    the caller, in its own (single) database cursor."""
+
+    def __init__(self, max_workers=16, rate=50, timeout=5):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def dispatch(self, jobs):
+        """Sends {key: (url, payload, headers)} and returns {key: (ok, retryable, error)}."""
+        if not jobs:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as executor:
+            futures = {key: executor.submit(self._send, *job) for key, job in jobs.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    def _send(self, url, payload, headers):
+        self.limiter.acquire(url)
+        try:
+            response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return True, False, ''
+        except requests.exceptions.RequestException as err:
+            response = err.response
+            if response is None:
+                # Timeouts and connection errors are worth another attempt
+                return False, True, str(err)
+            retryable = response.status_code == 429 or response.status_code >= 500
+            return False, retryable, response.text or str(err)
+
+    def close(self):
+        self.session.close()
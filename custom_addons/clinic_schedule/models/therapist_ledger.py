@@ -0,0 +1,126 @@
+from odoo import models, fields, api
+from odoo.tools.sql import table_exists
+
+# Appointment fields a ledger row is derived from
+LEDGER_FIELDS = {'therapist_id', 'clinic_id', 'start_datetime', 'end_datetime', 'slot_type', 'attendance_state'}
+
+# Ledger aggregates over the appointments of a therapist, clinic and day (slot types that
+# are not worked time, i.e. wo/leave/blocked, are left out like on the attendance ledger)
+LEDGER_SELECT = """
+    SELECT a.therapist_id, a.clinic_id, a.start_datetime::date,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE a.slot_type = 'patient' AND a.attendance_state = 'scheduled'),
+           COUNT(*) FILTER (WHERE a.slot_type = 'patient' AND a.attendance_state = 'in_progress'),
+           COUNT(*) FILTER (WHERE a.slot_type = 'patient' AND a.attendance_state = 'completed'),
+           COUNT(*) FILTER (WHERE a.slot_type = 'patient' AND a.attendance_state = 'no_show'),
+           COALESCE(SUM(EXTRACT(EPOCH FROM a.end_datetime - a.start_datetime) / 60)
+                    FILTER (WHERE a.slot_type = 'patient' AND a.attendance_state = 'completed'), 0)::int,
+           COALESCE(SUM(EXTRACT(EPOCH FROM a.end_datetime - a.start_datetime) / 60)
+                    FILTER (WHERE (a.slot_type = 'patient' AND a.attendance_state = 'completed')
+                               OR a.slot_type IN ('lunch', 'training')), 0)::int
+    FROM clinic_schedule_appointment a
+"""
+LEDGER_COLUMNS = """
+    therapist_id, clinic_id, ledger_date, total_slots, scheduled_count, in_progress_count,
+    completed_count, no_show_count, patient_minutes, work_minutes
+"""
+
+
+class ClinicTherapistLedger(models.Model):
+    _name = 'clinic.therapist.ledger'
+    _description = 'Therapist Daily Ledger'
+    _order = 'ledger_date desc, therapist_id'
+    _log_access = False
+
+    therapist_id = fields.Many2one('clinic.therapist', string='Therapist', required=True, readonly=True,
+                                   index=True, ondelete='cascade')
+    clinic_id = fields.Many2one('clinic.clinic', string='Clinic', required=True, readonly=True, ondelete='cascade')
+    ledger_date = fields.Date(string='Date', required=True, readonly=True, index=True)
+    total_slots = fields.Integer(string='Total Slots', readonly=True)
+    scheduled_count = fields.Integer(string='Scheduled', readonly=True)
+    in_progress_count = fields.Integer(string='In Progress', readonly=True)
+    completed_count = fields.Integer(string='Completed', readonly=True)
+    no_show_count = fields.Integer(string='No-Shows', readonly=True)
+    patient_minutes = fields.Integer(string='Therapy Minutes', readonly=True)
+    work_minutes = fields.Integer(string='Worked Minutes', readonly=True,
+                                  help="Completed therapies plus lunch and training slots.")
+
+    _sql_constraints = [
+        ('unique_therapist_clinic_date', 'unique(therapist_id, clinic_id, ledger_date)',
+         'Only one ledger row per therapist, clinic and day!')
+    ]
+
+    def init(self):
+        # First install on a live database: build the ledger of the existing appointments in one pass
+        if not table_exists(self.env.cr, 'clinic_schedule_appointment'):
+            return
+        self.env.cr.execute("SELECT 1 FROM clinic_therapist_ledger LIMIT 1")
+        if not self.env.cr.fetchone():
+            self.env.cr.execute(f"""
+                INSERT INTO clinic_therapist_ledger ({LEDGER_COLUMNS})
+                {LEDGER_SELECT}
+                WHERE a.therapist_id IS NOT NULL AND a.start_datetime IS NOT NULL AND a.end_datetime IS NOT NULL
+                  AND a.slot_type NOT IN ('wo', 'leave', 'blocked')
+                GROUP BY 1, 2, 3
+            """)
+
+    @api.model
+    def _refresh(self, keys):
+        """Recomputes the ledger rows of the given (therapist_id, date) pairs from their
+        appointments: one upsert for the rows that still have sessions, one delete for the rest."""
+        keys = {(therapist_id, day) for therapist_id, day in keys if therapist_id and day}
+        if not keys:
+            return
+        self.env['clinic.schedule.appointment'].flush_model(list(LEDGER_FIELDS))
+        therapist_ids, days = zip(*sorted(keys))
+        params = (list(therapist_ids), list(days))
+        self.env.cr.execute(f"""
+            WITH keys AS (
+                SELECT * FROM UNNEST(%s::int[], %s::date[]) AS k(therapist_id, ledger_date)
+            )
+            INSERT INTO clinic_therapist_ledger ({LEDGER_COLUMNS})
+            {LEDGER_SELECT}
+            JOIN keys k ON k.therapist_id = a.therapist_id
+                       AND a.start_datetime >= k.ledger_date AND a.start_datetime < k.ledger_date + 1
+            WHERE a.end_datetime IS NOT NULL AND a.slot_type NOT IN ('wo', 'leave', 'blocked')
+            GROUP BY 1, 2, 3
+            ON CONFLICT (therapist_id, clinic_id, ledger_date) DO UPDATE
+                SET total_slots = EXCLUDED.total_slots,
+                    scheduled_count = EXCLUDED.scheduled_count,
+                    in_progress_count = EXCLUDED.in_progress_count,
+                    completed_count = EXCLUDED.completed_count,
+                    no_show_count = EXCLUDED.no_show_count,
+                    patient_minutes = EXCLUDED.patient_minutes,
+                    work_minutes = EXCLUDED.work_minutes
+            RETURNING id
+        """, params)
+        kept_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.execute("""
+            DELETE FROM clinic_therapist_ledger l
+            USING UNNEST(%s::int[], %s::date[]) AS k(therapist_id, ledger_date)
+            WHERE l.therapist_id = k.therapist_id AND l.ledger_date = k.ledger_date
+              AND l.id != ALL(%s)
+        """, params + (kept_ids,))
+        self.invalidate_model()
+
+    @api.model
+    def _get_payout_basis(self, date_from, date_to, therapist_ids=None):
+        """Payroll totals of a date range, as {therapist_id: {...}}: worked days and the
+        summed counters and minutes of the ledger."""
+        domain = [('ledger_date', '>=', date_from), ('ledger_date', '<=', date_to)]
+        if therapist_ids:
+            domain.append(('therapist_id', 'in', list(therapist_ids)))
+        aggregates = ['total_slots:sum', 'completed_count:sum', 'no_show_count:sum', 'patient_minutes:sum',
+                      'work_minutes:sum', 'ledger_date:count_distinct']
+        basis = {}
+        for therapist, *values in self.sudo()._read_group(domain, ['therapist_id'], aggregates):
+            total_slots, completed, no_shows, patient_minutes, work_minutes, days = values
+            basis[therapist.id] = {
+                'days': days,
+                'total_slots': total_slots,
+                'completed_count': completed,
+                'no_show_count': no_shows,
+                'patient_minutes': patient_minutes,
+                'work_minutes': work_minutes,
+            }
+        return basis
@@ -0,0 +1,78 @@
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+
+# Minimum gap a therapist needs between sessions at two different clinics
+TRANSIT_BUFFER = timedelta(hours=1)
+
+
+class TherapistOccupancy:
+    """Busy intervals of therapists, kept sorted by start per therapist.
+
+    Each interval is a (start, end, clinic_id, appointment_id) tuple. Overlap and transit
+    lookups bisect on the start times and only walk back as far as the longest interval of
+    the therapist, so a day of bookings is checked in O(n log n) without any query."""
+
+    def __init__(self):
+        self._starts = defaultdict(list)
+        self._slots = defaultdict(list)
+        self._max_span = defaultdict(timedelta)
+
+    def add(self, therapist_id, start, end, clinic_id=False, app_id=False):
+        idx = bisect.bisect_right(self._starts[therapist_id], start)
+        self._starts[therapist_id].insert(idx, start)
+        self._slots[therapist_id].insert(idx, (start, end, clinic_id, app_id))
+        self._max_span[therapist_id] = max(self._max_span[therapist_id], end - start)
+
+    def find_overlap(self, therapist_id, start, end, exclude_id=False):
+        """Returns an interval of the therapist overlapping [start, end), or None."""
+        slots = self._slots.get(therapist_id)
+        if not slots:
+            return None
+        max_span = self._max_span[therapist_id]
+        # Only intervals starting before `end` can overlap: walk them back from the latest one
+        for i in range(bisect.bisect_left(self._starts[therapist_id], end) - 1, -1, -1):
+            slot = slots[i]
+            if slot[0] + max_span <= start:
+                break
+            if slot[1] > start and not (exclude_id and slot[3] == exclude_id):
+                return slot
+        return None
+
+    def find_neighbours(self, therapist_id, start, end, exclude_id=False):
+        """Returns the (previous, next) intervals of the therapist around [start, end): the one
+        ending last at or before start and the one starting first at or after end."""
+        slots = self._slots.get(therapist_id)
+        if not slots:
+            return None, None
+        starts = self._starts[therapist_id]
+        max_span = self._max_span[therapist_id]
+
+        prev_slot = None
+        for i in range(bisect.bisect_right(starts, start) - 1, -1, -1):
+            slot = slots[i]
+            if prev_slot and slot[0] + max_span <= prev_slot[1]:
+                break
+            if exclude_id and slot[3] == exclude_id:
+                continue
+            if slot[1] <= start and (not prev_slot or slot[1] > prev_slot[1]):
+                prev_slot = slot
+
+        next_slot = None
+        for slot in slots[bisect.bisect_left(starts, end):]:
+            if not (exclude_id and slot[3] == exclude_id):
+                next_slot = slot
+                break
+        return prev_slot, next_slot
+
+    def find_transit_conflict(self, therapist_id, start, end, clinic_id, exclude_id=False):
+        """Returns (interval, gap, is_before) when the closest session before or after [start, end)
+        is at another clinic less than TRANSIT_BUFFER away, else None."""
+        if not clinic_id:
+            return None
+        prev_slot, next_slot = self.find_neighbours(therapist_id, start, end, exclude_id)
+        if prev_slot and prev_slot[2] != clinic_id and start - prev_slot[1] < TRANSIT_BUFFER:
+            return prev_slot, start - prev_slot[1], True
+        if next_slot and next_slot[2] != clinic_id and next_slot[0] - end < TRANSIT_BUFFER:
+            return next_slot, next_slot[0] - end, False
+        return None
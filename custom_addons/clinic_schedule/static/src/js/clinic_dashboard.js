@@ -30,6 +30,8 @@ export class ClinicMatrixDashboard extends Component {
             selectedDate: tomorrowISO,
             lastFetchedDate: tomorrowISO,
             lastFetchedClinic: 0,
+            boardVersion: false,
+            boardRevision: 0,
             pulledTherapistIds: [],
             massReassignTarget: 0,
             timeSlots: generatedSlots,
@@ -76,7 +78,6 @@ export class ClinicMatrixDashboard extends Component {
         onWillStart(async () => {
             await this.loadUserDefaults();
             await this.refreshGrid();
-            await this.loadRosterMetadata();
         });
     }
 
@@ -102,7 +103,6 @@ export class ClinicMatrixDashboard extends Component {
         } catch (e) { console.error(e); }
         this.closeTherapistActionModal();
         await this.refreshGrid();
-        await this.loadRosterMetadata();
     }
 
     get unassignedAppointments() {
@@ -119,7 +119,7 @@ export class ClinicMatrixDashboard extends Component {
                 this.state.selectedDate
             ]);
             this.notificationService.add(res.message, { type: res.status === 'success' ? 'success' : 'info' });
-            await this.refreshGrid();
+            await this.syncBoard();
         } catch (error) {
             console.error(error);
         }
@@ -158,45 +158,44 @@ export class ClinicMatrixDashboard extends Component {
 
     async switchTab(tabName) {
         this.state.activeTab = tabName;
-        if (tabName === "roster") {
-            await this.loadRosterMetadata();
-        } else if (tabName === "attendance") {
-            await this.loadAttendanceLedger();
-        } else {
-            await this.refreshGrid();
-        }
+        await this.refreshGrid();
     }
 
     async onRegionChange() {
         const availableClinics = this.filteredClinics;
-        const currentRegion = parseInt(this.state.selectedRegion) || 0;
-        if (availableClinics.length > 0) {
-            this.state.selectedClinic = availableClinics[0].id;
-            await this.orm.call("clinic.schedule.appointment", "save_last_operated_clinic", [availableClinics[0].id, currentRegion]);
-        } else {
-            this.state.selectedClinic = 0;
-            await this.orm.call("clinic.schedule.appointment", "save_last_operated_clinic", [0, currentRegion]);
-        }
-        await this.refreshGrid();
+        this.state.selectedClinic = availableClinics.length > 0 ? availableClinics[0].id : 0;
+        await this.refreshGrid({remember: true});
     }
 
     async onClinicChange() {
         const currentClinic = parseInt(this.state.selectedClinic) || 0;
         const currentRegion = parseInt(this.state.selectedRegion) || 0;
-        if (currentClinic > 0 || currentRegion > 0) {
-            await this.orm.call("clinic.schedule.appointment", "save_last_operated_clinic", [currentClinic, currentRegion]);
-        }
-        await this.refreshGrid();
+        await this.refreshGrid({remember: currentClinic > 0 || currentRegion > 0});
     }
 
-    async refreshGrid() {
+    async refreshGrid({remember = false} = {}) {
         const currentClinic = parseInt(this.state.selectedClinic) || 0;
         if (this.state.lastFetchedDate !== this.state.selectedDate || parseInt(this.state.lastFetchedClinic) !== currentClinic) {
             this.state.pulledTherapistIds = [];
             this.state.lastFetchedDate = this.state.selectedDate;
             this.state.lastFetchedClinic = currentClinic;
         }
-        const data = await this.orm.call("clinic.schedule.appointment", "get_matrix_data", [currentClinic, this.state.selectedDate, this.state.pulledTherapistIds]);
+        // One RPC for the matrix and the panel of the active tab, skipped server-side when nothing changed
+        const panels = ["matrix"];
+        if (this.state.activeTab === "roster") panels.push("roster");
+        if (this.state.activeTab === "attendance") panels.push("ledger");
+        const res = await this.orm.call("clinic.schedule.appointment", "get_board_state",
+            [currentClinic, this.state.selectedDate, this.state.pulledTherapistIds], {
+                panels: panels,
+                region_id: parseInt(this.state.selectedRegion) || 0,
+                remember: remember,
+                version: this.state.boardVersion,
+            });
+        this.state.boardVersion = res.version;
+        this.state.boardRevision = res.revision || 0;
+        if (res.unchanged) return;
+
+        const data = res.matrix;
         this.state.clinics = data.clinics || [];
         this.state.regions = data.regions || [];
         this.state.therapists = data.therapists || [];
@@ -206,11 +205,46 @@ export class ClinicMatrixDashboard extends Component {
 
         if (data.selected_clinic_id && !this.state.selectedClinic) {
             this.state.selectedClinic = data.selected_clinic_id;
-            const currentRegion = parseInt(this.state.selectedRegion) || 0;
-            await this.orm.call("clinic.schedule.appointment", "save_last_operated_clinic", [data.selected_clinic_id, currentRegion]);
         }
-        if (this.state.activeTab === "roster") await this.loadRosterMetadata();
-        if (this.state.activeTab === "attendance") await this.loadAttendanceLedger();
+        if (res.roster) this.state.rosterData = res.roster;
+        if (res.ledger) {
+            this.state.attendanceLedger = res.ledger;
+            this.state.expandedRows = [];
+        }
+    }
+
+    async syncBoard() {
+        // Patches only the cells changed since the last load; other tabs and unknown revisions reload
+        const currentClinic = parseInt(this.state.selectedClinic) || 0;
+        if (this.state.activeTab !== "matrix" || !currentClinic || !this.state.boardRevision
+            || this.state.lastFetchedDate !== this.state.selectedDate
+            || parseInt(this.state.lastFetchedClinic) !== currentClinic) {
+            return this.refreshGrid();
+        }
+        const res = await this.orm.call("clinic.schedule.appointment", "get_board_changes",
+            [currentClinic, this.state.selectedDate, this.state.boardRevision],
+            {therapist_ids: this.state.therapists.map(t => t.id)});
+        if (res.full_reload) {
+            this.state.boardVersion = false;
+            return this.refreshGrid();
+        }
+        this.applyBoardChanges(res);
+    }
+
+    applyBoardChanges(res) {
+        this.state.boardRevision = res.revision;
+        if (!res.appointments.length && !res.removed_ids.length && !res.therapists.length) return;
+        // The ETag no longer describes the patched board
+        this.state.boardVersion = false;
+
+        const replaced = new Set([...res.removed_ids, ...res.appointments.map(a => a.id)]);
+        this.state.appointments = this.state.appointments.filter(a => !replaced.has(a.id)).concat(res.appointments);
+
+        const rows = new Map(res.therapists.map(t => [t.id, t]));
+        this.state.therapists = this.state.therapists
+            .map(t => rows.get(t.id) || t)
+            .sort((a, b) => (a._sort_score - b._sort_score) || a.name.localeCompare(b.name));
+        Object.assign(this.state.kpis, res.kpis);
     }
 
     async toggleTodayTomorrow() {
@@ -224,21 +258,14 @@ export class ClinicMatrixDashboard extends Component {
         await this.refreshGrid();
     }
 
-    async loadRosterMetadata() {
-        this.state.rosterData = await this.orm.call("clinic.schedule.appointment", "get_roster_data", [this.state.selectedDate]);
-    }
-
-    async loadAttendanceLedger() {
-        this.state.attendanceLedger = await this.orm.call("clinic.schedule.appointment", "get_attendance_ledger", [this.state.selectedDate]) || [];
-        this.state.expandedRows = [];
-    }
-
     async openSmartView() {
         const clinicId = parseInt(this.state.selectedClinic);
         if (!clinicId) return;
         const clinicObj = this.state.clinics.find(c => c.id === clinicId);
         this.state.smartViewClinicName = clinicObj ? clinicObj.name : "Selected Branch";
-        this.state.smartViewData = await this.orm.call("clinic.schedule.appointment", "get_clinic_smart_view", [clinicId, this.state.selectedDate]);
+        const res = await this.orm.call("clinic.schedule.appointment", "get_board_state",
+            [clinicId, this.state.selectedDate, this.state.pulledTherapistIds], {panels: ["smart_view"]});
+        this.state.smartViewData = res.smart_view;
         this.state.isSmartViewOpen = true;
     }
 
@@ -314,7 +341,6 @@ export class ClinicMatrixDashboard extends Component {
         }, {
             onClose: async () => {
                 await this.refreshGrid();
-                await this.loadRosterMetadata();
             }
         });
     }
@@ -356,7 +382,6 @@ export class ClinicMatrixDashboard extends Component {
         if (!this.state.pulledTherapistIds.includes(tId)) this.state.pulledTherapistIds.push(tId);
         this.closeAllotModal();
         await this.refreshGrid();
-        await this.loadRosterMetadata();
     }
 
     async requestFloater() {
@@ -369,7 +394,6 @@ export class ClinicMatrixDashboard extends Component {
             this.actionService.doAction(action, {
                 onClose: async () => {
                     await this.refreshGrid();
-                    await this.loadRosterMetadata();
                 }
             });
         }
@@ -408,7 +432,6 @@ export class ClinicMatrixDashboard extends Component {
         this.notificationService.add("Floater substituted successfully. Patients have been moved.", { type: "success" });
         this.closeSubstituteModal();
         await this.refreshGrid();
-        await this.loadRosterMetadata();
     }
 
     openTherapistActionModal(therapistId, therapistName) {
@@ -427,7 +450,6 @@ export class ClinicMatrixDashboard extends Component {
         await this.orm.call("clinic.therapist", "action_toggle_buffer", [[therapistId]]);
         this.closeTherapistActionModal();
         await this.refreshGrid();
-        await this.loadRosterMetadata();
     }
 
     async applyTherapistAction(actionName) {
@@ -448,8 +470,7 @@ export class ClinicMatrixDashboard extends Component {
             console.error(error);
         }
         this.closeTherapistActionModal();
-        await this.refreshGrid();
-        await this.loadRosterMetadata();
+        await this.syncBoard();
     }
 
     closeLateModal() {
@@ -471,8 +492,7 @@ export class ClinicMatrixDashboard extends Component {
             console.error(error);
         }
         this.closeLateModal();
-        await this.refreshGrid();
-        await this.loadRosterMetadata();
+        await this.syncBoard();
     }
 
     closeActionModal() {
@@ -488,7 +508,7 @@ export class ClinicMatrixDashboard extends Component {
         }
         await this.orm.call("clinic.schedule.appointment", actionName, [[this.state.selectedAppointment.id]]);
         this.closeActionModal();
-        await this.refreshGrid();
+        await this.syncBoard();
     }
 
     async quickRemoveSlot(ev, appId, currentTherapistId) {
@@ -497,7 +517,7 @@ export class ClinicMatrixDashboard extends Component {
         try {
             await this.orm.unlink("clinic.schedule.appointment", [appId]);
             this.notificationService.add("Slot successfully deleted from the board.", {type: "success"});
-            await this.refreshGrid();
+            await this.syncBoard();
         } catch (error) {
             console.error(error);
         }
@@ -508,7 +528,7 @@ export class ClinicMatrixDashboard extends Component {
         await this.orm.unlink("clinic.schedule.appointment", [this.state.selectedAppointment.id]);
         this.closeActionModal();
         this.notificationService.add("Slot successfully deleted from the board.", {type: "success"});
-        await this.refreshGrid();
+        await this.syncBoard();
     }
 
     async reassignSlot(newTherapistIdRaw) {
@@ -517,7 +537,7 @@ export class ClinicMatrixDashboard extends Component {
         if (isNaN(newTherapistId)) return;
         await this.orm.write("clinic.schedule.appointment", [this.state.selectedAppointment.id], {therapist_id: newTherapistId === 0 ? false : newTherapistId});
         this.closeActionModal();
-        await this.refreshGrid();
+        await this.syncBoard();
     }
 
     openFullForm() {
@@ -530,7 +550,7 @@ export class ClinicMatrixDashboard extends Component {
             res_id: appId,
             views: [[false, "form"]],
             target: "new"
-        }, {onClose: () => this.refreshGrid()});
+        }, {onClose: () => this.syncBoard()});
     }
 
     async onAddTimeClick(slotKey) {
@@ -541,7 +561,7 @@ export class ClinicMatrixDashboard extends Component {
             views: [[false, "form"]],
             target: "new",
             context: {default_clinic_id: parseInt(this.state.selectedClinic), default_start_datetime: startDt}
-        }, {onClose: () => this.refreshGrid()});
+        }, {onClose: () => this.syncBoard()});
     }
 
     async onSlotClick(therapistId, slotKey) {
@@ -576,7 +596,7 @@ export class ClinicMatrixDashboard extends Component {
                     default_therapist_id: therapistId === 0 ? false : therapistId,
                     default_start_datetime: startDt
                 }
-            }, {onClose: () => this.refreshGrid()});
+            }, {onClose: () => this.syncBoard()});
         }
     }
 
@@ -656,7 +676,7 @@ export class ClinicMatrixDashboard extends Component {
         ]);
         this.notificationService.add(res.message, { type: res.status });
         this.closeTherapistActionModal();
-        await this.refreshGrid();
+        await this.syncBoard();
     }
 
     async loadUserDefaults() {
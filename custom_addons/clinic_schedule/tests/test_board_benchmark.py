@@ -0,0 +1,236 @@
+"""Schedule board benchmark.
+
+Generates a synthetic clinic network (regions, clinics, therapists, patients with paid
+enrollments and a month of completed sessions) and measures the board RPCs on it: query
+count, wall time and peak Python memory. Not part of the standard test run:
+
+    odoo-bin -d <db> -i clinic_schedule --test-tags clinic_benchmark --stop-after-init
+
+Scale is read from the CLINIC_BENCH_<KEY> environment variables (REGIONS, CLINICS,
+THERAPISTS_PER_CLINIC, SLOTS_PER_DAY, DAYS). At the baseline scale, a query count above the
+stored baseline plus its tolerance, or an RPC missing from a recorded baseline, fails the
+test; CLINIC_BENCH_WRITE_BASELINE=1 records the measured counts as the new baseline instead.
+While no count has been recorded at all, the query check is skipped.
+"""
+import json
+import logging
+import os
+import time as _time
+import tracemalloc
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from ..models.clinic_schedule import AVAILABILITY_CACHE
+
+_logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+DEFAULT_SCALE = {
+    'regions': 2,
+    'clinics': 4,
+    'therapists_per_clinic': 6,
+    'slots_per_day': 6,
+    'days': 30,
+}
+FIRST_SLOT_HOUR = 9
+
+
+def _get_scale():
+    return {key: int(os.environ.get(f'CLINIC_BENCH_{key.upper()}', value)) for key, value in DEFAULT_SCALE.items()}
+
+
+@tagged('post_install', '-at_install', '-standard', 'clinic_benchmark')
+class TestBoardBenchmark(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env = cls.env(context=dict(cls.env.context, tracking_disable=True, mail_create_nolog=True,
+                                       mail_notrack=True))
+        cls.env.user.tz = 'Asia/Kolkata'
+        cls.local_tz = pytz.timezone('Asia/Kolkata')
+        cls.scale = _get_scale()
+        cls.today = datetime.now(cls.local_tz).date()
+        cls.busy_date = cls.today - timedelta(days=1)
+
+        started = _time.perf_counter()
+        cls._generate_network()
+        cls.env.flush_all()
+        _logger.info("Benchmark data generated in %.1fs: %s", _time.perf_counter() - started, cls.scale)
+        cls.results = {}
+
+    # -------------------------------
+    # Synthetic clinic generator
+    # -------------------------------
+    @classmethod
+    def _generate_network(cls):
+        scale = cls.scale
+        regions = cls.env['clinic.region'].create([
+            {'name': f'Bench Region {r}'} for r in range(scale['regions'])
+        ])
+        cls.clinics = cls.env['clinic.clinic'].create([{
+            'name': f'Bench Clinic {c}',
+            'code': f'Z{c:03d}',
+            'address': f'{c} Bench Street',
+            'phone': f'90000{c:05d}',
+            'region_id': regions[c % len(regions)].id,
+        } for c in range(scale['clinics'])])
+
+        therapy = cls.env['product.product'].create({
+            'name': 'Complementary Therapy',
+            'detailed_type': 'service',
+        })
+
+        therapist_vals, patient_vals = [], []
+        for c, clinic in enumerate(cls.clinics):
+            # The last therapist of each clinic is a spare without sessions, the mass reassign target
+            for t in range(scale['therapists_per_clinic'] + 1):
+                therapist_vals.append({
+                    'name': f'Bench Therapist {c}-{t}',
+                    'vendor_id': f'BENCH-{c}-{t}',
+                    'contact_number': f'8{c:04d}{t:05d}',
+                    'gender': 'f' if t % 2 else 'm',
+                    'designation': 'fixed',
+                    'allowed_branch_ids': [(6, 0, [clinic.id])],
+                })
+                if t == scale['therapists_per_clinic']:
+                    continue
+                for s in range(scale['slots_per_day']):
+                    patient_vals.append({
+                        'name': f'Bench Patient {c}-{t}-{s}',
+                        'age': 40,
+                        'gender': 'female' if t % 2 else 'male',
+                        'phone': f'7{c:03d}{t:03d}{s:03d}',
+                        'address': 'Bench Street',
+                        'clinic_id': clinic.id,
+                    })
+        therapists = cls.env['clinic.therapist'].create(therapist_vals)
+        patients = cls.env['clinic.patient'].create(patient_vals)
+        cls.env['patient.enrollment'].create([{
+            'patient_id': patient.id,
+            'enrollment_type': 'clinic',
+            'payment_state': 'paid',
+            'line_ids': [(0, 0, {'service_product_id': therapy.id, 'pos_qty': scale['days'] + 30})],
+        } for patient in patients])
+
+        # Every working therapist sees the same patients at the same hours, every day of the month
+        per_clinic = scale['therapists_per_clinic'] + 1
+        cls.working_therapists = cls.env['clinic.therapist']
+        cls.spare_therapists = cls.env['clinic.therapist']
+        patient_iter = iter(patients)
+        slots = []
+        for c, clinic in enumerate(cls.clinics):
+            clinic_therapists = therapists[c * per_clinic:(c + 1) * per_clinic]
+            cls.spare_therapists |= clinic_therapists[-1]
+            for therapist in clinic_therapists[:-1]:
+                cls.working_therapists |= therapist
+                for s in range(scale['slots_per_day']):
+                    slots.append((clinic.id, therapist.id, next(patient_iter).id, FIRST_SLOT_HOUR + s))
+
+        Appointment = cls.env['clinic.schedule.appointment']
+        for day_offset in range(scale['days'], 0, -1):
+            day = cls.today - timedelta(days=day_offset)
+            Appointment.create([{
+                'clinic_id': clinic_id,
+                'therapist_id': therapist_id,
+                'patient_id': patient_id,
+                'slot_type': 'patient',
+                'visit_type': 'clinic',
+                'attendance_state': 'completed',
+                'start_datetime': cls._to_utc(day, hour),
+            } for clinic_id, therapist_id, patient_id, hour in slots])
+
+    @classmethod
+    def _to_utc(cls, day, hour):
+        return cls.local_tz.localize(datetime.combine(day, time(hour))).astimezone(pytz.utc).replace(tzinfo=None)
+
+    # -------------------------------
+    # Measurement
+    # -------------------------------
+    def _measure(self, name, func):
+        """Runs func on cold caches and records its query count, wall time and peak memory."""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        self.env.registry.clear_cache()
+        AVAILABILITY_CACHE.clear()
+
+        queries_before = self.env.cr.sql_log_count
+        tracemalloc.start()
+        started = _time.perf_counter()
+        try:
+            result = func()
+            self.env.flush_all()
+        finally:
+            elapsed = _time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.results[name] = {
+            'queries': self.env.cr.sql_log_count - queries_before,
+            'seconds': round(elapsed, 3),
+            'peak_kib': peak // 1024,
+        }
+        return result
+
+    def test_board_rpcs(self):
+        Appointment = self.env['clinic.schedule.appointment']
+        clinic = self.clinics[0]
+        busy_date = fields.Date.to_string(self.busy_date)
+        today = fields.Date.to_string(self.today)
+
+        self._measure('get_board_state', lambda: Appointment.get_board_state(clinic.id, busy_date))
+        self._measure('get_matrix_data', lambda: Appointment.get_matrix_data(clinic.id, busy_date))
+        self._measure('get_roster_data', lambda: Appointment.get_roster_data(busy_date))
+        self._measure('get_attendance_ledger', lambda: Appointment.get_attendance_ledger(busy_date))
+        self._measure('get_allotable_therapists', lambda: Appointment.get_allotable_therapists(clinic.id, busy_date))
+        carried = self._measure('action_carry_forward_schedule',
+                                lambda: Appointment.action_carry_forward_schedule(clinic.id, today))
+        self.assertEqual(carried['status'], 'success', carried['message'])
+
+        source = self.working_therapists.filtered(lambda t: clinic in t.allowed_branch_ids)[0]
+        target = self.spare_therapists.filtered(lambda t: clinic in t.allowed_branch_ids)
+        self._measure('action_mass_reassign_sessions',
+                      lambda: Appointment.action_mass_reassign_sessions(source.id, target.id, clinic.id, today))
+
+        self._report()
+        self._check_baseline()
+
+    def _report(self):
+        lines = [f"{'RPC':<32}{'queries':>9}{'seconds':>10}{'peak KiB':>11}"]
+        for name, result in self.results.items():
+            lines.append(f"{name:<32}{result['queries']:>9}{result['seconds']:>10}{result['peak_kib']:>11}")
+        _logger.info("Schedule board benchmark at %s:\n%s", self.scale, '\n'.join(lines))
+
+    def _check_baseline(self):
+        with open(BASELINE_PATH) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['scale'] != self.scale:
+            _logger.info("Benchmark scale differs from the baseline scale, query counts not checked.")
+            return
+
+        measured = {name: result['queries'] for name, result in self.results.items()}
+        if os.environ.get('CLINIC_BENCH_WRITE_BASELINE'):
+            baseline['queries'] = measured
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(baseline, baseline_file, indent=4)
+                baseline_file.write('\n')
+            _logger.info("Benchmark baseline written to %s", BASELINE_PATH)
+            return
+
+        if not baseline['queries']:
+            self.skipTest(f"No query counts recorded in {os.path.basename(BASELINE_PATH)} yet, "
+                          f"run with CLINIC_BENCH_WRITE_BASELINE=1 at the baseline scale and commit it")
+
+        # Once recorded, an RPC without a count fails too, so new RPCs cannot slip in unmeasured
+        regressions = []
+        for name, queries in measured.items():
+            allowed = baseline['queries'].get(name)
+            if allowed is None:
+                regressions.append(f"{name}: {queries} queries (no baseline, record it with "
+                                   f"CLINIC_BENCH_WRITE_BASELINE=1 and commit {os.path.basename(BASELINE_PATH)})")
+            elif queries > allowed * (1 + baseline['tolerance']):
+                regressions.append(f"{name}: {queries} queries (baseline {allowed})")
+        self.assertFalse(regressions, "Query count regressions:\n" + '\n'.join(regressions))
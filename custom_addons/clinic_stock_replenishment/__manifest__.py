@@ -1,7 +1,7 @@
 {
     'name': 'Clinic Stock Replenishment',
     'version': '1.0',
-    'depends': ['stock', 'product', 'mail','mrp',],
+    'depends': ['stock', 'product', 'mail','mrp', 'patient_management'],
     'data': [
         'security/access_views.xml',
         'security/ir.model.access.csv',
@@ -101,43 +101,17 @@ class ClinicStockReplenishment(models.Model):
         }
 
         # ----------------------------------------------------------------
-        # STEP 2 — Bulk SQL aggregation for patient sessions (1 raw query)
-        # Old: search_count × products × warehouses × 3 days + gender splits
-        # New: one JOIN query grouped by warehouse/date/gender → Python dict
+        # STEP 2 — Session counts from the daily clinic activity rollup
+        # Old: JOIN over patient_session × clinic_patient for every run
+        # New: pre-aggregated clinic/day rows → Python dict
         # ----------------------------------------------------------------
         day_dates = [today - timedelta(days=i) for i in range(1, 4)]
 
-        self.env.cr.execute("""
-                    SELECT
-                        sw.id                   AS warehouse_id,
-                        ps.session_date         AS session_date,
-                        pt.gender               AS gender,
-                        COUNT(ps.id)            AS session_count
-                    FROM patient_session ps
-                    JOIN clinic_clinic cc
-                        ON cc.id = ps.therapy_clinic_id
-                    JOIN stock_warehouse sw
-                        ON sw.id = cc.warehouse_id
-                    JOIN clinic_patient pt
-                        ON pt.id = ps.patient_id
-                    WHERE
-                        sw.id           = ANY(%s)
-                        AND ps.session_date = ANY(%s)
-                        AND ps.active       = TRUE
-                    GROUP BY
-                        sw.id, ps.session_date, pt.gender
-                """, (dest_wh_ids, day_dates))
         # Build: session_map[(wh_id, date)] = {'male': X, 'female': Y, 'total': Z}
         session_map = defaultdict(lambda: {'male': 0, 'female': 0, 'total': 0})
-        for row in self.env.cr.dictfetchall():
-            key = (row['warehouse_id'], row['session_date'])
-            gender = row['gender'] or 'unknown'
-            cnt = row['session_count']
-            session_map[key]['total'] += cnt
-            if gender == 'male':
-                session_map[key]['male'] += cnt
-            elif gender == 'female':
-                session_map[key]['female'] += cnt
+        session_map.update(
+            self.env['clinic.daily.activity'].sudo()._get_warehouse_session_counts(dest_wh_ids, day_dates)
+        )
 
         # Pre-compute per-warehouse therapy data fully in Python memory
         # therapy_summary[(wh_id)] = (daily_counts[3], max_index, male_on_max, female_on_max)
@@ -204,9 +178,9 @@ class ClinicStockReplenishment(models.Model):
                         phantom_bom_map[p.id] = lines
 
         # ----------------------------------------------------------------
-        # STEP 4 — Batch fetch all stock.quant records (1 ORM query)
+        # STEP 4 — Batch fetch quant totals per product and location (1 query)
         # Old: search stock.quant inside get_kit_stock per product per wh
-        # New: single search on all dest locations → quant_map in RAM
+        # New: single grouped read on all dest locations → quant_map in RAM
         # ----------------------------------------------------------------
         dest_location_ids = self.destination_warehouse_ids.mapped('lot_stock_id').ids
 
@@ -219,35 +193,42 @@ class ClinicStockReplenishment(models.Model):
         all_product_ids_needed = list(set(product_ids) | kit_component_ids)
 
 
-        all_quants = self.env['stock.quant'].search([
-            ('product_id', 'in', all_product_ids_needed),
-            ('location_id', 'child_of', dest_location_ids),
-        ])
+        quant_groups = self.env['stock.quant']._read_group(
+            [
+                ('product_id', 'in', all_product_ids_needed),
+                ('location_id', 'child_of', dest_location_ids),
+            ],
+            ['product_id', 'location_id'],
+            ['quantity:sum', 'reserved_quantity:sum'],
+        )
+
+        # Resolve each quant location to its warehouse in one lookup instead of
+        # walking up the parent chain per quant: the precomputed stock audit
+        # location map when that module is installed, else the stored
+        # stock.location.warehouse_id
+        location_ids = list({location.id for _, location, _, _ in quant_groups})
+        if 'stock.audit.location.map' in self.env:
+            loc_to_wh = {
+                row['location_id']: row['warehouse_id']
+                for row in self.env['stock.audit.location.map'].sudo().search_read(
+                    [('location_id', 'in', location_ids)],
+                    ['location_id', 'warehouse_id'],
+                    load=None,
+                )
+            }
+        else:
+            loc_to_wh = {
+                location.id: location.warehouse_id.id
+                for location in self.env['stock.location'].browse(location_ids)
+            }
 
-        # quant_map[(product_id, location_root_id)] = available_qty
-        # We need per-warehouse totals; map location_id → warehouse
-        loc_to_wh = {
-            wh.lot_stock_id.id: wh.id
-            for wh in self.destination_warehouse_ids
-        }
-        # For child locations we resolve via the quant's location hierarchy.
         # Build: quant_map[(product_id, warehouse_id)] = total available qty
+        dest_wh_ids = set(self.destination_warehouse_ids.ids)
         quant_map = defaultdict(float)
-        for q in all_quants:
-            # Walk up to find the root lot_stock_id warehouse match
-            loc = q.location_id
-            wh_id = None
-            # Check direct or climb via parent chain (max 5 levels deep)
-            check_loc = loc
-            for _ in range(6):
-                if check_loc.id in loc_to_wh:
-                    wh_id = loc_to_wh[check_loc.id]
-                    break
-                if not check_loc.location_id:
-                    break
-                check_loc = check_loc.location_id
-            if wh_id:
-                quant_map[(q.product_id.id, wh_id)] += (q.quantity - q.reserved_quantity)
+        for product, location, quantity, reserved in quant_groups:
+            wh_id = loc_to_wh.get(location.id)
+            if wh_id in dest_wh_ids:
+                quant_map[(product.id, wh_id)] += (quantity - reserved)
         # ----------------------------------------------------------------
         # STEP 5 — Build final stock map with kit fallback (pure Python)
         # Old: get_kit_stock() ran DB queries per product; New: RAM lookup only
@@ -59,33 +59,21 @@ class StockCountFormula(models.Model):
         self.ensure_one()
 
         today = date.today()
-        daily_counts = []
-        for i in range(1, 4):
-            count = self.env['patient.session'].search_count([
-                ('session_date', '=', today - timedelta(days=i)),
-                ('therapy_clinic_id.warehouse_id', '=', self.clinic_id.id),
-            ])
-            daily_counts.append(count)
+        day_dates = [today - timedelta(days=i) for i in range(1, 4)]
+        session_map = self.env['clinic.daily.activity'].sudo()._get_warehouse_session_counts(
+            [self.clinic_id.id], day_dates)
+        empty = {'total': 0, 'male': 0, 'female': 0}
+        day_counts = [session_map.get((self.clinic_id.id, d), empty) for d in day_dates]
 
+        daily_counts = [c['total'] for c in day_counts]
         max_index = daily_counts.index(max(daily_counts))
-        max_day_date = today - timedelta(days=(max_index + 1))
-
-        total_on_max = daily_counts[max_index]
 
         if self.gender_filter == 'male':
-            formula_count = self.env['patient.session'].search_count([
-                ('session_date', '=', max_day_date),
-                ('therapy_clinic_id.warehouse_id', '=', self.clinic_id.id),
-                ('patient_id.gender', '=', 'male'),
-            ])
+            formula_count = day_counts[max_index]['male']
         elif self.gender_filter == 'female':
-            formula_count = self.env['patient.session'].search_count([
-                ('session_date', '=', max_day_date),
-                ('therapy_clinic_id.warehouse_id', '=', self.clinic_id.id),
-                ('patient_id.gender', '=', 'female'),
-            ])
+            formula_count = day_counts[max_index]['female']
         else:
-            formula_count = total_on_max
+            formula_count = daily_counts[max_index]
 
         return daily_counts, max_index, formula_count
 
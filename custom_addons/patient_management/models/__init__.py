@@ -1 +1 @@
-from . import patient, clinic_extension, blood_report, case_taking, daily_followup, diet_chart, followup, enrollment, session, xray, prescription, pos_order_inherit, res_partner_inherit, attachment, clinic_therapist, gradation, rs_followup, consent_form, enrollment_bill_popup, patient_billing_queue, exempt_product
\ No newline at end of file
+from . import patient, clinic_extension, blood_report, case_taking, daily_followup, diet_chart, followup, enrollment, session, xray, prescription, pos_order_inherit, res_partner_inherit, attachment, clinic_therapist, gradation, rs_followup, consent_form, enrollment_bill_popup, patient_billing_queue, exempt_product, clinic_daily_activity, patient_purchase_history
@@ -2,9 +2,12 @@ from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
+import logging
 import re
 import uuid
 
+_logger = logging.getLogger(__name__)
+
 
 class Patient(models.Model):
     _name = "clinic.patient"
@@ -416,6 +419,15 @@ class Patient(models.Model):
             ])
             patient.active_enrollment_id = all_enrollments[:1] if all_enrollments else False
 
+    def init(self):
+        """Partial index backing the clinic-scoped "yet to allot" anti-join on the schedule board."""
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS
+                clinic_patient_allotable_clinic_idx
+            ON clinic_patient (clinic_id)
+            WHERE remaining_sessions > 0 AND active
+        """)
+
     @api.constrains('phone')
     def _check_phone_number(self):
         for rec in self:
@@ -497,10 +509,15 @@ class Patient(models.Model):
     def copy(self, default=None):
         raise UserError(_("⚠️ Duplication of this record is not allowed."))
 
-    def _cron_check_inactive_patients(self):
+    def _cron_check_inactive_patients(self, dry_run=False):
+        """Batched status engine for on-therapy / on-medicine patients.
+
+        One aggregate query fetches the last session date and the last paid medicine
+        enrollment per patient, classification happens in memory and the transitions
+        are applied with one write per target status. With ``dry_run`` nothing is
+        written; the method only reports how many patients would transition.
+        """
         today = fields.Date.today()
-        # Fetch patients who are either on therapy or on medicine
-        patients = self.search([('patient_status', 'in', ['active', 'on_medicine'])])
 
         medicine_products = [
             'Diabetes Treatment',
@@ -509,70 +526,87 @@ class Patient(models.Model):
             'Regeneration Treatment',
             'Weight Management Treatment'
         ]
-
-        for patient in patients:
+        medicine_product_ids = self.env['product.product'].with_context(active_test=False).search([
+            ('name', 'in', medicine_products)
+        ]).ids
+
+        self.flush_model(['patient_status', 'enroll_date', 'remaining_sessions', 'active_enrollment_id', 'active'])
+        self.env['patient.session'].flush_model(['patient_id', 'session_date', 'active'])
+        self.env['patient.enrollment'].flush_model(['patient_id', 'enrollment_date', 'payment_state', 'active'])
+        self.env['patient.enrollment.line'].flush_model(['enrollment_id', 'service_product_id'])
+
+        # Fetch patients who are either on therapy or on medicine, with their activity dates
+        self.env.cr.execute("""
+            WITH target AS (
+                SELECT id, patient_status, enroll_date, remaining_sessions, active_enrollment_id
+                FROM clinic_patient
+                WHERE active AND patient_status IN ('active', 'on_medicine')
+            ),
+            last_session AS (
+                SELECT s.patient_id, MAX(s.session_date) AS last_date
+                FROM patient_session s
+                JOIN target t ON t.id = s.patient_id
+                WHERE s.active
+                GROUP BY s.patient_id
+            ),
+            last_medicine AS (
+                SELECT e.patient_id, MAX(e.enrollment_date) AS last_date
+                FROM patient_enrollment e
+                JOIN target t ON t.id = e.patient_id
+                WHERE e.active
+                  AND e.payment_state = 'paid'
+                  AND EXISTS (
+                      SELECT 1 FROM patient_enrollment_line l
+                      WHERE l.enrollment_id = e.id
+                        AND l.service_product_id = ANY(%s)
+                  )
+                GROUP BY e.patient_id
+            )
+            SELECT t.id, t.patient_status, t.enroll_date, t.remaining_sessions,
+                   ae.enrollment_date, ls.last_date, lm.last_date
+            FROM target t
+            LEFT JOIN patient_enrollment ae ON ae.id = t.active_enrollment_id
+            LEFT JOIN last_session ls ON ls.patient_id = t.id
+            LEFT JOIN last_medicine lm ON lm.patient_id = t.id
+        """, (medicine_product_ids,))
+
+        transitions = {'on_medicine': [], 'inactive': []}
+        for (patient_id, status, enroll_date, remaining, active_enrollment_date,
+             last_session_date, last_medicine_date) in self.env.cr.fetchall():
 
             # ==========================================
             # 1. LOGIC FOR ACTIVE/ON THERAPY (7 DAYS)
             # ==========================================
-            if patient.patient_status == 'active':
-
-                # Check for the most recent session
-                last_session = self.env['patient.session'].search([
-                    ('patient_id', '=', patient.id),
-                    ('active', '=', True)
-                ], order='session_date desc', limit=1)
-
-                # Determine the exact date to compare against
-                last_date = False
-                if last_session and last_session.session_date:
-                    last_date = last_session.session_date
-                elif patient.active_enrollment_id:
-                    # Fallback: They paid but haven't taken a session yet
-                    last_date = patient.active_enrollment_id.enrollment_date
-                else:
-                    # Absolute fallback if no enrollment is found
-                    last_date = patient.enroll_date
+            if status == 'active':
+                # Last session, else the active enrollment (paid, no session yet), else the visit date
+                last_date = last_session_date or active_enrollment_date or enroll_date
 
                 # Check if 7 days have passed OR if they ran out of remaining sessions
-                if patient.remaining_sessions <= 0 or (last_date and (today - last_date).days >= 7):
-
+                if (remaining or 0) <= 0 or (last_date and (today - last_date).days >= 7):
                     # BEFORE making them inactive, check if they are still within a 30-day medicine window
-                    last_medicine = self.env['patient.enrollment'].search([
-                        ('patient_id', '=', patient.id),
-                        ('payment_state', '=', 'paid'),
-                        ('line_ids.service_product_id.name', 'in', medicine_products)
-                    ], order='enrollment_date desc', limit=1)
-
-                    if last_medicine and last_medicine.enrollment_date:
-                        med_diff_days = (today - last_medicine.enrollment_date).days
-                        if med_diff_days < 30:
-                            # Safely downgrade to medicine
-                            patient.with_context(from_cron=True).sudo().write({'patient_status': 'on_medicine'})
-                            continue
-
-                    # If no valid medicine is found, then they are truly inactive
-                    patient.with_context(from_cron=True).sudo().write({'patient_status': 'inactive'})
+                    if last_medicine_date and (today - last_medicine_date).days < 30:
+                        transitions['on_medicine'].append(patient_id)
+                    else:
+                        transitions['inactive'].append(patient_id)
 
             # ==========================================
             # 2. LOGIC FOR ON MEDICINE (30 DAYS)
             # ==========================================
-            elif patient.patient_status == 'on_medicine':
-                # Find the latest paid enrollment that contains ANY medicine treatment
-                last_medicine_enrollment = self.env['patient.enrollment'].search([
-                    ('patient_id', '=', patient.id),
-                    ('payment_state', '=', 'paid'),
-                    ('line_ids.service_product_id.name', 'in', medicine_products)
-                ], order='enrollment_date desc', limit=1)
-
-                # Use the medicine enrollment date, fallback to general enroll date
-                last_date = last_medicine_enrollment.enrollment_date if last_medicine_enrollment else patient.enroll_date
-
-                # Calculate difference and update status (30 Days Inactivity)
-                if last_date:
-                    diff_days = (today - last_date).days
-                    if diff_days >= 30:
-                        patient.with_context(from_cron=True).sudo().write({'patient_status': 'inactive'})
+            elif status == 'on_medicine':
+                last_date = last_medicine_date or enroll_date
+                if last_date and (today - last_date).days >= 30:
+                    transitions['inactive'].append(patient_id)
+
+        summary = {status: len(ids) for status, ids in transitions.items()}
+        if dry_run:
+            _logger.info("Inactive patient check (dry run): %s", summary)
+            return summary
+
+        for status, ids in transitions.items():
+            if ids:
+                self.browse(ids).with_context(from_cron=True).sudo().write({'patient_status': status})
+        _logger.info("Inactive patient check: %s", summary)
+        return summary
 
     @api.constrains('enroll_date')
     def _check_visit_date(self):
@@ -0,0 +1,138 @@
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Only paid orders are projected: drafts and cancelled orders never dispatched any stock,
+# unlike the raw pos_order_line scan this projection replaced, which listed every state.
+PAID_ORDER_STATES = ('paid', 'done', 'invoiced')
+
+
+class PatientPurchaseHistory(models.Model):
+    _name = "patient.purchase.history"
+    _description = "Patient Purchase History"
+    _order = "order_date desc, order_id desc, id"
+    _rec_name = "order_name"
+
+    partner_id = fields.Many2one("res.partner", string="Customer", required=True, readonly=True, index=True,
+                                 ondelete="cascade")
+    order_id = fields.Many2one("pos.order", string="POS Order", required=True, readonly=True, index=True,
+                               ondelete="cascade")
+    order_line_id = fields.Many2one("pos.order.line", string="Order Line", required=True, readonly=True,
+                                    ondelete="cascade")
+    order_name = fields.Char(string="Order Ref", readonly=True)
+    order_date = fields.Date(string="Order Date", required=True, readonly=True)
+    product_id = fields.Many2one("product.product", string="Medicine", readonly=True)
+    qty = fields.Float(string="Quantity", readonly=True)
+    cashier_id = fields.Many2one("res.users", string="Created By", readonly=True)
+
+    _sql_constraints = [
+        ('order_line_unique', 'unique(order_line_id)', 'An order line can only be projected once!'),
+    ]
+
+    def init(self):
+        """Index for the per-patient, newest-first purchase lookups, then projects any
+        paid order not yet in the table (first install / orders paid before the hook)."""
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS
+                patient_purchase_history_partner_date_idx
+            ON patient_purchase_history (partner_id, order_date DESC, order_id DESC)
+        """)
+        self._project_orders()
+
+    # -------------------------------
+    # Maintenance
+    # -------------------------------
+    @api.model
+    def _project_orders(self, order_ids=None):
+        """(Re)builds the projection rows of the given paid POS orders in one statement.
+        Without order_ids, only the paid orders missing from the projection are added.
+        Orders are dated in the timezone of their cashier, else of their company, else of the
+        current user."""
+        params = {
+            'order_ids': list(order_ids) if order_ids else None,
+            'states': list(PAID_ORDER_STATES),
+            'tz': self.env.user.tz or 'UTC',
+        }
+        if order_ids:
+            self.env['pos.order'].flush_model(['partner_id', 'state', 'date_order', 'name'])
+            self.env['pos.order.line'].flush_model(['order_id', 'product_id', 'qty'])
+            self.env.cr.execute(
+                "DELETE FROM patient_purchase_history WHERE order_id = ANY(%(order_ids)s)", params
+            )
+
+        self.env.cr.execute("""
+            INSERT INTO patient_purchase_history (
+                partner_id, order_id, order_line_id, order_name, order_date, product_id, qty, cashier_id,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT po.partner_id, po.id, pol.id, po.name,
+                   (po.date_order AT TIME ZONE 'UTC' AT TIME ZONE COALESCE(up.tz, cp.tz, %(tz)s))::date,
+                   pol.product_id, pol.qty, po.create_uid,
+                   po.create_uid, NOW() AT TIME ZONE 'UTC', po.create_uid, NOW() AT TIME ZONE 'UTC'
+            FROM pos_order po
+            JOIN pos_order_line pol ON pol.order_id = po.id
+            LEFT JOIN res_users u ON u.id = po.user_id
+            LEFT JOIN res_partner up ON up.id = u.partner_id
+            LEFT JOIN res_company c ON c.id = po.company_id
+            LEFT JOIN res_partner cp ON cp.id = c.partner_id
+            WHERE po.partner_id IS NOT NULL
+              AND po.state = ANY(%(states)s)
+              AND (
+                  po.id = ANY(%(order_ids)s::int[])
+                  OR (%(order_ids)s::int[] IS NULL AND NOT EXISTS (
+                      SELECT 1 FROM patient_purchase_history h WHERE h.order_id = po.id
+                  ))
+              )
+        """, params)
+        if not order_ids and self.env.cr.rowcount:
+            _logger.info("Patient purchase history: %s order lines projected", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    # -------------------------------
+    # Read API
+    # -------------------------------
+    @api.model
+    def get_partner_history(self, partner_id, limit=None, offset=0, date_from=None, date_to=None):
+        """Purchased lines of a partner, newest order first, as a list of dicts:
+        order_date, order_name, cashier, product, qty."""
+        if not partner_id:
+            return []
+        self.env.cr.execute("""
+            SELECT order_date, order_id, order_name, cashier_id, product_id, qty
+            FROM patient_purchase_history
+            WHERE partner_id = %(partner_id)s
+              AND (%(date_from)s::date IS NULL OR order_date >= %(date_from)s::date)
+              AND (%(date_to)s::date IS NULL OR order_date <= %(date_to)s::date)
+            ORDER BY order_date DESC, order_id DESC, id
+            LIMIT %(limit)s OFFSET %(offset)s
+        """, {'partner_id': partner_id, 'date_from': date_from, 'date_to': date_to,
+              'limit': limit, 'offset': offset or 0})
+        rows = self.env.cr.dictfetchall()
+
+        products = self.env['product.product'].browse(list({row['product_id'] for row in rows if row['product_id']}))
+        product_names = dict(zip(products.ids, products.mapped('display_name')))
+        users = self.env['res.users'].browse(list({row['cashier_id'] for row in rows if row['cashier_id']}))
+        user_names = {user.id: user.name for user in users}
+
+        return [{
+            'order_date': row['order_date'],
+            'order_id': row['order_id'],
+            'order_name': row['order_name'],
+            'cashier': user_names.get(row['cashier_id'], ''),
+            'product': product_names.get(row['product_id']),
+            'qty': row['qty'],
+        } for row in rows]
+
+    @api.model
+    def get_partner_order_counts(self, partner_id, date_from, date_to):
+        """Returns {order_date: number of orders} of a partner over the window."""
+        if not partner_id:
+            return {}
+        self.env.cr.execute("""
+            SELECT order_date, COUNT(DISTINCT order_id)
+            FROM patient_purchase_history
+            WHERE partner_id = %s AND order_date >= %s AND order_date <= %s
+            GROUP BY order_date
+        """, (partner_id, date_from, date_to))
+        return dict(self.env.cr.fetchall())
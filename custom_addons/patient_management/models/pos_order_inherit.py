@@ -60,4 +60,13 @@ class PosOrder(models.Model):
 
                 order.enrollment_id.write(vals)
 
+        self.env["patient.purchase.history"].sudo()._project_orders(self.ids)
+
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Keep the purchase history projection in line when a paid order changes customer.
+        if "partner_id" in vals:
+            self.env["patient.purchase.history"].sudo()._project_orders(self.ids)
         return res
\ No newline at end of file
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import tempfile
+
+from werkzeug.wsgi import wrap_file
+
+from odoo import http, api
+from odoo.http import request, content_disposition
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class StockAuditExportController(http.Controller):
+
+    @http.route('/stock_audit/export/<int:wizard_id>/<string:file_format>', type='http', auth='user')
+    def export_audit(self, wizard_id, file_format, **kwargs):
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return request.not_found()
+        wizard = request.env['stock.audit.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            return request.not_found()
+        # Validates the wizard (and raises) before any byte is sent
+        our_company_ids, warehouse_ids = wizard._prepare_audit()
+
+        if file_format == 'xlsx':
+            # A zip cannot be sent before it is complete: the workbook is built in a
+            # temporary file, then that file is streamed
+            fileobj = tempfile.TemporaryFile()
+            wizard._export_xlsx(our_company_ids, warehouse_ids, fileobj)
+            fileobj.seek(0)
+            body = wrap_file(request.httprequest.environ, fileobj)
+        else:
+            body = self._stream_csv(
+                request.env.registry, request.env.uid, dict(request.env.context),
+                wizard_id, our_company_ids, warehouse_ids,
+            )
+
+        return request.make_response(body, headers=[
+            ('Content-Type', EXPORT_CONTENT_TYPES[file_format]),
+            ('Content-Disposition', content_disposition(wizard._get_export_filename(file_format))),
+        ])
+
+    @staticmethod
+    def _stream_csv(registry, uid, context, wizard_id, our_company_ids, warehouse_ids):
+        """CSV chunks produced while the response is being sent, after the request
+        cursor is closed: they are read on a cursor of their own."""
+        with registry.cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            wizard = env['stock.audit.wizard'].browse(wizard_id)
+            yield from wizard._export_csv_chunks(our_company_ids, warehouse_ids)
\ No newline at end of file
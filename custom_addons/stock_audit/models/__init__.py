@@ -3,3 +3,6 @@ from . import stock_audit_snapshot
 from . import stock_audit_region
 from . import stock_audit_wizard
 from . import stock_audit_cron
+from . import stock_audit_location_map
+from . import stock_location
+from . import stock_audit_result_cache
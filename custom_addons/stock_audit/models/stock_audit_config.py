@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 import logging
 from odoo import models, fields, api
-from odoo.exceptions import ValidationError
+from odoo.exceptions import UserError, ValidationError
 
 _logger = logging.getLogger(__name__)
 
@@ -48,6 +48,41 @@ class StockAuditConfig(models.Model):
         compute='_compute_resolved_company_ids',
         store=False,
     )
+    backfill_workers = fields.Integer(
+        string='Backfill Workers',
+        default=1,
+        help="Number of snapshot dates built concurrently, each on its own database "
+             "connection, when the snapshot cron catches up on missing dates.\n"
+             "1 (default) builds them one after another. Each extra worker holds one "
+             "more connection of the server's pool while the backfill runs."
+    )
+    line_storage = fields.Selection(
+        selection=[
+            ('standard', 'Single Table'),
+            ('partitioned', 'Partitioned by Month'),
+        ],
+        string='Snapshot Line Storage',
+        default='standard',
+        required=True,
+        help="Partitioned: snapshot lines are stored in one partition per month of "
+             "snapshot date, so reports and retention only touch the months they need.\n"
+             "Changing this does not rebuild the snapshot line table by itself: the "
+             "storage conversion job does, at night or when Apply Storage Change is used."
+    )
+    line_storage_applied = fields.Selection(
+        selection=[
+            ('standard', 'Single Table'),
+            ('partitioned', 'Partitioned by Month'),
+        ],
+        string='Current Line Storage',
+        compute='_compute_line_storage_applied',
+    )
+    daily_retention_days = fields.Integer(
+        string='Keep All Snapshots For (Days)',
+        default=90,
+        help="Snapshots older than this are compacted to the last snapshot of each "
+             "month. Set to 0 to keep every snapshot."
+    )
     note = fields.Text(
         string='Notes',
         default=(
@@ -67,6 +102,11 @@ class StockAuditConfig(models.Model):
         for rec in self:
             rec.display_name = "Stock Audit Configuration"
 
+    def _compute_line_storage_applied(self):
+        partitioned = self.env['stock.audit.snapshot.line'].sudo()._is_partitioned()
+        for rec in self:
+            rec.line_storage_applied = 'partitioned' if partitioned else 'standard'
+
     @api.depends('root_company_ids')
     def _compute_resolved_company_ids(self):
         """Show admin the full resolved list (roots + all descendants)
@@ -103,6 +143,35 @@ class StockAuditConfig(models.Model):
             return []
         return self._resolve_descendants(config.root_company_ids.ids)
 
+    def action_apply_line_storage(self):
+        """Queue the snapshot line table conversion to the selected storage.
+        The rebuild locks the table, so it runs in the cron worker, never in
+        the request."""
+        self.ensure_one()
+        if not self.env.user.has_group('base.group_system'):
+            raise UserError("Only Settings Administrators can change the snapshot storage.")
+        if self.line_storage == self.line_storage_applied:
+            raise UserError("The snapshot lines already use this storage.")
+        self.env.ref('stock_audit.ir_cron_stock_audit_line_storage')._trigger()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Storage Change Queued',
+                'message': 'The snapshot line table will be rebuilt in the background '
+                           'within a few minutes.',
+                'type': 'info',
+                'sticky': False,
+            }
+        }
+
+    @api.model
+    def _cron_apply_line_storage(self):
+        """Bring the snapshot line table to the configured storage (no-op when
+        it already matches)."""
+        config = self.get_config()
+        self.env['stock.audit.snapshot.line'].sudo()._set_storage_mode(config.line_storage)
+
     # ------------------------------------------------------------------
     # INTERNAL
     # ------------------------------------------------------------------
@@ -146,6 +215,18 @@ class StockAuditConfig(models.Model):
                     % names
                 )
 
+    @api.constrains('backfill_workers')
+    def _check_backfill_workers(self):
+        for rec in self:
+            if rec.backfill_workers < 1:
+                raise ValidationError("Backfill Workers must be at least 1.")
+
+    @api.constrains('daily_retention_days')
+    def _check_daily_retention_days(self):
+        for rec in self:
+            if rec.daily_retention_days < 0:
+                raise ValidationError("Snapshot retention cannot be negative.")
+
     # ------------------------------------------------------------------
     # SINGLETON ENFORCEMENT
     # ------------------------------------------------------------------
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import logging
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Fields of stock.location that decide whether (and to which warehouse) it is mapped
+LOCATION_MAP_FIELDS = {'location_id', 'usage', 'company_id'}
+
+
+class StockAuditLocationMap(models.Model):
+    """Precomputed internal location -> owning warehouse mapping.
+
+    A location belongs to a warehouse if it sits under the warehouse's
+    view_location_id. Resolving that with a parent_path prefix join on every
+    audit query is a nested loop over all locations x all warehouses, so the
+    mapping is materialised here once and kept up to date by the
+    stock.location / stock.warehouse write hooks (see stock_location.py).
+    Only internal locations are mapped; everything else is irrelevant to the
+    audit balances.
+    """
+    _name = 'stock.audit.location.map'
+    _description = 'Stock Audit Location to Warehouse Map'
+    _order = 'warehouse_id, location_id'
+    _log_access = False
+
+    location_id = fields.Many2one(
+        comodel_name='stock.location',
+        string='Location',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+    warehouse_id = fields.Many2one(
+        comodel_name='stock.warehouse',
+        string='Warehouse',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+    company_id = fields.Many2one(
+        comodel_name='res.company',
+        string='Company',
+        readonly=True,
+        index=True,
+        ondelete='cascade',
+    )
+
+    _sql_constraints = [
+        (
+            'location_unique',
+            'UNIQUE(location_id)',
+            'A location can only be mapped to one warehouse.'
+        ),
+    ]
+
+    def init(self):
+        # First install on a live database: map every existing location in one pass
+        self.env.cr.execute("SELECT 1 FROM stock_audit_location_map LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._refresh()
+
+    @api.model
+    def _refresh(self, location_ids=None):
+        """Rebuild the mapping of the given locations and their whole subtree
+        (a moved parent drags its children along), or of every location when
+        called without ids.
+
+        The owning warehouse is the one whose view location is the deepest
+        ancestor found in the location's parent_path, so nested warehouses
+        resolve to the inner one.
+        """
+        if location_ids is not None and not location_ids:
+            return
+        self.env['stock.location'].flush_model(['parent_path', 'usage', 'company_id'])
+        self.env['stock.warehouse'].flush_model(['view_location_id'])
+
+        if location_ids is None:
+            scope = "TRUE"
+            params = {}
+        else:
+            scope = """l.parent_path LIKE ANY(
+                    SELECT r.parent_path || '%%'
+                    FROM stock_location r
+                    WHERE r.id = ANY(%(location_ids)s)
+                )"""
+            params = {'location_ids': list(location_ids)}
+
+        self.env.cr.execute(f"""
+            WITH scope AS (
+                SELECT l.id, l.company_id, l.usage,
+                       string_to_array(rtrim(l.parent_path, '/'), '/')::int[] AS path
+                FROM stock_location l
+                WHERE {scope}
+            ),
+            resolved AS (
+                SELECT DISTINCT ON (s.id)
+                       s.id AS location_id, w.id AS warehouse_id, s.company_id
+                FROM scope s
+                JOIN stock_warehouse w
+                  ON w.view_location_id = ANY(s.path)
+                WHERE s.usage = 'internal'
+                ORDER BY s.id, array_position(s.path, w.view_location_id) DESC
+            ),
+            purged AS (
+                DELETE FROM stock_audit_location_map m
+                USING scope s
+                WHERE m.location_id = s.id
+                  AND NOT EXISTS (SELECT 1 FROM resolved r WHERE r.location_id = s.id)
+            )
+            INSERT INTO stock_audit_location_map (location_id, warehouse_id, company_id)
+            SELECT location_id, warehouse_id, company_id FROM resolved
+            ON CONFLICT (location_id) DO UPDATE
+                SET warehouse_id = EXCLUDED.warehouse_id,
+                    company_id   = EXCLUDED.company_id
+            WHERE (stock_audit_location_map.warehouse_id, stock_audit_location_map.company_id)
+                  IS DISTINCT FROM (EXCLUDED.warehouse_id, EXCLUDED.company_id)
+        """, params)
+        _logger.debug(
+            "Stock Audit: location map refreshed for %s (%s row(s) upserted).",
+            'all locations' if location_ids is None else '%s root(s)' % len(location_ids),
+            self.env.cr.rowcount,
+        )
+        self.invalidate_model()
\ No newline at end of file
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import logging
+import time
+from datetime import timedelta
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Columns of an audit result row, in the order the audit query returns them
+RESULT_COLUMNS = (
+    'product_id', 'warehouse_id', 'opening_qty', 'issue_qty',
+    'receipt_qty', 'sale_qty', 'closing_qty',
+)
+
+# Entries kept: the most recently used ones, and none unused for longer than this
+RESULT_CACHE_MAX_ENTRIES = 200
+RESULT_CACHE_MAX_AGE_DAYS = 30
+
+
+class StockAuditResultCache(models.Model):
+    """Stored results of audit runs over closed periods.
+
+    A period is closed when it ends on or before the latest done snapshot:
+    its balances only change when snapshots are rebuilt, verified or
+    compacted, which all bump the snapshot revision that is part of the key.
+    Whenever a new entry is stored, entries of an older revision, entries
+    unused for RESULT_CACHE_MAX_AGE_DAYS and the least recently used ones
+    beyond RESULT_CACHE_MAX_ENTRIES are purged.
+    """
+    _name = 'stock.audit.result.cache'
+    _description = 'Stock Audit Result Cache'
+    _order = 'last_used desc'
+
+    date_from = fields.Date(required=True, readonly=True)
+    date_to = fields.Date(required=True, readonly=True)
+    warehouse_key = fields.Char(
+        required=True,
+        readonly=True,
+        help="Sorted warehouse IDs of the run.",
+    )
+    company_key = fields.Char(
+        required=True,
+        readonly=True,
+        help="Sorted company IDs considered 'ours' at the time of the run.",
+    )
+    revision = fields.Char(
+        required=True,
+        readonly=True,
+        index=True,
+        help="Snapshot revision the result was computed against.",
+    )
+    row_count = fields.Integer(readonly=True)
+    duration_seconds = fields.Float(string='Compute Duration (sec)', readonly=True)
+    hit_count = fields.Integer(readonly=True)
+    last_used = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        (
+            'key_unique',
+            'UNIQUE(date_from, date_to, warehouse_key, company_key, revision)',
+            'An audit result is cached only once per period, warehouses and revision.'
+        ),
+    ]
+
+    # ------------------------------------------------------------------
+    # PUBLIC API
+    # ------------------------------------------------------------------
+    @api.model
+    def _get_revision(self):
+        """Revision of the done snapshots: changes whenever one is built,
+        rebuilt, verified or removed. Returns (revision, latest snapshot date)."""
+        self.env.cr.execute("""
+            SELECT COUNT(*), MAX(write_date), MAX(snapshot_date)
+            FROM stock_audit_snapshot
+            WHERE state = 'done'
+        """)
+        count, last_write, last_date = self.env.cr.fetchone()
+        return '%s:%s' % (count, last_write), last_date
+
+    @api.model
+    def _get_or_compute(self, wizard, our_company_ids, warehouse_ids):
+        """Return the cache entry of the wizard's audit, computing and storing
+        it first if needed, or an empty recordset when the period is not closed
+        yet (its result must then be computed on every run)."""
+        revision, last_snapshot_date = self._get_revision()
+        if not last_snapshot_date or wizard.date_to > last_snapshot_date:
+            return self.browse()
+
+        key = {
+            'date_from': wizard.date_from,
+            'date_to': wizard.date_to,
+            'warehouse_key': ','.join(str(i) for i in sorted(warehouse_ids)),
+            'company_key': ','.join(str(i) for i in sorted(our_company_ids)),
+            'revision': revision,
+        }
+        cache = self.sudo().search([(name, '=', value) for name, value in key.items()], limit=1)
+        if cache:
+            cache.write({'hit_count': cache.hit_count + 1, 'last_used': fields.Datetime.now()})
+            return cache
+
+        self._purge(revision)
+
+        # A concurrent run of the same audit may be storing it: the INSERT then
+        # waits for it, and the entry it committed is read instead (or the
+        # request is retried on a serialization failure, then hits the cache)
+        now = fields.Datetime.now()
+        self.env.cr.execute("""
+            INSERT INTO stock_audit_result_cache (
+                date_from, date_to, warehouse_key, company_key, revision,
+                row_count, hit_count, last_used,
+                create_uid, create_date, write_uid, write_date
+            )
+            VALUES (
+                %(date_from)s, %(date_to)s, %(warehouse_key)s, %(company_key)s, %(revision)s,
+                0, 0, %(now)s, %(uid)s, %(now)s, %(uid)s, %(now)s
+            )
+            ON CONFLICT (date_from, date_to, warehouse_key, company_key, revision) DO NOTHING
+            RETURNING id
+        """, dict(key, now=now, uid=self.env.uid))
+        row = self.env.cr.fetchone()
+        if not row:
+            return self.sudo().search([(name, '=', value) for name, value in key.items()], limit=1)
+        cache = self.sudo().browse(row[0])
+
+        started = time.time()
+        query, params = wizard._get_audit_query(our_company_ids, warehouse_ids)
+        columns = ', '.join(RESULT_COLUMNS)
+        self.env.cr.execute("""
+            INSERT INTO stock_audit_result_cache_line (cache_id, %s)
+            SELECT %%(cache_id)s, %s FROM (%s) r
+        """ % (columns, columns, query), dict(params, cache_id=cache.id))
+        cache.write({
+            'row_count': self.env.cr.rowcount,
+            'duration_seconds': round(time.time() - started, 2),
+        })
+        _logger.info(
+            "[Stock Audit] Cached audit %s..%s for %d warehouse(s): %d rows in %.2fs",
+            wizard.date_from, wizard.date_to, len(warehouse_ids),
+            cache.row_count, cache.duration_seconds,
+        )
+        return cache
+
+    @api.model
+    def _purge(self, revision):
+        """Drop the entries that are stale (older revision), unused for
+        RESULT_CACHE_MAX_AGE_DAYS, or beyond the RESULT_CACHE_MAX_ENTRIES most
+        recently used. Their lines go with them (ON DELETE CASCADE)."""
+        self.flush_model()
+        self.env.cr.execute("""
+            DELETE FROM stock_audit_result_cache
+            WHERE id IN (
+                SELECT id FROM stock_audit_result_cache
+                WHERE revision != %(revision)s OR last_used < %(max_age)s
+                UNION
+                SELECT id FROM stock_audit_result_cache
+                ORDER BY last_used DESC NULLS LAST, id DESC
+                OFFSET %(max_entries)s
+            )
+        """, {
+            'revision': revision,
+            'max_age': fields.Datetime.now() - timedelta(days=RESULT_CACHE_MAX_AGE_DAYS),
+            # Leave room for the entry about to be stored
+            'max_entries': RESULT_CACHE_MAX_ENTRIES - 1,
+        })
+        if self.env.cr.rowcount:
+            self.invalidate_model()
+            self.env['stock.audit.result.cache.line'].invalidate_model()
+
+    def _get_rows_query(self):
+        """(query, params) selecting the cached rows, in report order."""
+        self.ensure_one()
+        return """
+            SELECT %s
+            FROM stock_audit_result_cache_line
+            WHERE cache_id = %%(cache_id)s
+            ORDER BY warehouse_id, product_id
+        """ % ', '.join(RESULT_COLUMNS), {'cache_id': self.id}
+
+
+class StockAuditResultCacheLine(models.Model):
+    _name = 'stock.audit.result.cache.line'
+    _description = 'Stock Audit Result Cache Line'
+    _log_access = False
+
+    cache_id = fields.Many2one(
+        comodel_name='stock.audit.result.cache',
+        required=True,
+        ondelete='cascade',
+        index=True,
+    )
+    product_id = fields.Many2one('product.product', required=True, ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', required=True, ondelete='cascade')
+    opening_qty = fields.Float(digits='Product Unit of Measure')
+    issue_qty = fields.Float(digits='Product Unit of Measure')
+    receipt_qty = fields.Float(digits='Product Unit of Measure')
+    sale_qty = fields.Float(digits='Product Unit of Measure')
+    closing_qty = fields.Float(digits='Product Unit of Measure')
+
+    def init(self):
+        # Exports page through an entry in report order
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_audit_result_cache_line_report_idx
+            ON stock_audit_result_cache_line (cache_id, warehouse_id, product_id)
+        """)
\ No newline at end of file
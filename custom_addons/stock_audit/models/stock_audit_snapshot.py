@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import logging
 import time
+from datetime import date
+from dateutil.relativedelta import relativedelta
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools.sql import table_exists
 
 _logger = logging.getLogger(__name__)
 
@@ -22,6 +25,7 @@ class StockAuditSnapshot(models.Model):
     )
     state = fields.Selection(
         selection=[
+            ('queued', 'Queued'),
             ('in_progress', 'In Progress'),
             ('done', 'Done'),
             ('failed', 'Failed'),
@@ -38,13 +42,14 @@ class StockAuditSnapshot(models.Model):
     )
     line_count = fields.Integer(
         string='Records',
-        compute='_compute_line_count',
-        store=True,
+        readonly=True,
+        help="Number of snapshot lines, stored by the snapshot builder."
     )
     created_by = fields.Selection(
         selection=[
             ('cron', 'Cron (Automatic)'),
             ('manual', 'Manual (Rebuild)'),
+            ('backfill', 'Backfill'),
         ],
         string='Created By',
         default='cron',
@@ -59,6 +64,38 @@ class StockAuditSnapshot(models.Model):
         string='Notes',
         help="Failure reason or manual comment."
     )
+    build_mode = fields.Selection(
+        selection=[
+            ('full', 'Full Recompute'),
+            ('incremental', 'Incremental'),
+        ],
+        string='Build Mode',
+        default='full',
+        readonly=True,
+        help="Incremental snapshots are the base snapshot plus the net moves since its date."
+    )
+    base_snapshot_id = fields.Many2one(
+        comodel_name='stock.audit.snapshot',
+        string='Base Snapshot',
+        readonly=True,
+        ondelete='set null',
+    )
+    verify_state = fields.Selection(
+        selection=[
+            ('pending', 'Not Verified'),
+            ('ok', 'Verified'),
+            ('drift', 'Drift Detected'),
+        ],
+        string='Verification',
+        readonly=True,
+        help="Outcome of the last full-recompute check of an incremental snapshot."
+    )
+    verified_at = fields.Datetime(string='Verified On', readonly=True)
+    drift_count = fields.Integer(
+        string='Drifting Balances',
+        readonly=True,
+        help="Product/warehouse balances that differed from a full recompute."
+    )
 
     _sql_constraints = [
         (
@@ -68,20 +105,26 @@ class StockAuditSnapshot(models.Model):
         ),
     ]
 
-    # ------------------------------------------------------------------
-    # COMPUTES
-    # ------------------------------------------------------------------
-    @api.depends('line_ids')
-    def _compute_line_count(self):
-        """Efficient count using read_group; avoids loading all lines into memory."""
-        data = self.env['stock.audit.snapshot.line'].read_group(
-            domain=[('snapshot_id', 'in', self.ids)],
-            fields=['snapshot_id'],
-            groupby=['snapshot_id'],
-        )
-        counts = {d['snapshot_id'][0]: d['snapshot_id_count'] for d in data}
-        for rec in self:
-            rec.line_count = counts.get(rec.id, 0)
+    def init(self):
+        """line_count used to be a compute that the raw SQL inserts never
+        triggered: count the lines of done snapshots once."""
+        if not table_exists(self.env.cr, 'stock_audit_snapshot_line'):
+            return
+        self.env.cr.execute("""
+            UPDATE stock_audit_snapshot s
+               SET line_count = c.n
+              FROM (
+                  SELECT sl.snapshot_id, COUNT(*) AS n
+                  FROM stock_audit_snapshot_line sl
+                  JOIN stock_audit_snapshot h
+                    ON h.id = sl.snapshot_id
+                   AND h.snapshot_date = sl.snapshot_date
+                  WHERE h.state = 'done'
+                    AND COALESCE(h.line_count, 0) = 0
+                  GROUP BY sl.snapshot_id
+              ) c
+             WHERE s.id = c.snapshot_id
+        """)
 
     # ------------------------------------------------------------------
     # ACTIONS
@@ -105,11 +148,17 @@ class StockAuditSnapshot(models.Model):
             )
 
         # Delete existing lines and reset state
-        self.line_ids.unlink()
+        self.env['stock.audit.snapshot.line']._delete_snapshot_lines(self)
         self.write({
             'state': 'in_progress',
             'note': False,
+            'line_count': 0,
             'duration_seconds': 0.0,
+            'build_mode': 'full',
+            'base_snapshot_id': False,
+            'verify_state': False,
+            'verified_at': False,
+            'drift_count': 0,
         })
 
         Cron = self.env['stock.audit.snapshot.cron'].sudo()
@@ -122,6 +171,7 @@ class StockAuditSnapshot(models.Model):
             )
             self.write({
                 'state': 'done',
+                'line_count': inserted,
                 'duration_seconds': round(time.time() - started, 2),
                 'created_by': 'manual',
             })
@@ -153,10 +203,52 @@ class StockAuditSnapshot(models.Model):
         }
 
 
+    def action_verify(self):
+        """Manual drift check: compares the stored lines with a full recompute."""
+        self.ensure_one()
+        if not self.env.user.has_group('base.group_system'):
+            raise UserError(
+                "Only Settings Administrators can verify snapshots."
+            )
+        if self.state != 'done':
+            raise UserError("Only done snapshots can be verified.")
+
+        our_company_ids = self.env['stock.audit.config'].sudo().get_our_company_ids()
+        if not our_company_ids:
+            raise UserError(
+                "No root companies configured.\n"
+                "Please set them in Inventory > Configuration > Stock Audit Configuration."
+            )
+
+        drift_count = self.env['stock.audit.snapshot.cron'].sudo()._verify_snapshot(self, our_company_ids)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Snapshot Verified',
+                'message': (
+                    'Snapshot for %s: %d balance(s) differ from a full recompute. Rebuild it.'
+                    % (self.snapshot_date, drift_count)
+                ) if drift_count else 'Snapshot for %s matches a full recompute.' % self.snapshot_date,
+                'type': 'warning' if drift_count else 'success',
+                'sticky': bool(drift_count),
+            }
+        }
+
+
 class StockAuditSnapshotLine(models.Model):
+    """One stock balance per (product, warehouse) of a snapshot.
+
+    Lines are only ever written by raw SQL (snapshot builder), so no audit
+    columns are kept. The table is either a plain table or, with the
+    'partitioned' storage mode of the configuration, range-partitioned by
+    month of snapshot_date (see _set_storage_mode). Queries on lines should
+    always filter on snapshot_date so that partitions get pruned.
+    """
     _name = 'stock.audit.snapshot.line'
     _description = 'Stock Audit Snapshot Line'
     _rec_name = 'product_id'
+    _log_access = False
 
     snapshot_id = fields.Many2one(
         comodel_name='stock.audit.snapshot',
@@ -168,6 +260,7 @@ class StockAuditSnapshotLine(models.Model):
     snapshot_date = fields.Date(
         related='snapshot_id.snapshot_date',
         store=True,
+        required=True,
         index=True,
         readonly=True,
     )
@@ -200,7 +293,9 @@ class StockAuditSnapshotLine(models.Model):
     _sql_constraints = [
         (
             'snapshot_product_warehouse_unique',
-            'UNIQUE(snapshot_id, product_id, warehouse_id)',
+            # snapshot_date is implied by snapshot_id; it is part of the key
+            # because unique constraints of a partitioned table must include it
+            'UNIQUE(snapshot_id, snapshot_date, product_id, warehouse_id)',
             'Duplicate snapshot line for same product+warehouse in one snapshot.'
         ),
     ]
@@ -212,4 +307,128 @@ class StockAuditSnapshotLine(models.Model):
                 stock_audit_snapshot_line_lookup_idx 
             ON stock_audit_snapshot_line 
                 (snapshot_date, warehouse_id, product_id)
-        """)
\ No newline at end of file
+        """)
+
+    # ------------------------------------------------------------------
+    # STORAGE
+    # ------------------------------------------------------------------
+    @api.model
+    def _is_partitioned(self):
+        self.env.cr.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE relname = %s AND relnamespace = current_schema()::regnamespace",
+            (self._table,),
+        )
+        row = self.env.cr.fetchone()
+        return bool(row and row[0])
+
+    @api.model
+    def _partition_name(self, month):
+        return '%s_y%04dm%02d' % (self._table, month.year, month.month)
+
+    @api.model
+    def _ensure_partitions(self, dates, table=None):
+        """Create the monthly partitions holding the given snapshot dates, if
+        the table is partitioned and they do not exist yet. Must run before
+        lines of a new month are inserted: otherwise they land in the default
+        partition, which then blocks creating the month's partition."""
+        table = table or self._table
+        if table == self._table and not self._is_partitioned():
+            return
+        months = {date(d.year, d.month, 1) for d in dates if d}
+        self.env.cr.execute("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s
+        """, (table,))
+        existing = {row[0] for row in self.env.cr.fetchall()}
+        for month in sorted(months):
+            name = self._partition_name(month)
+            if name in existing:
+                continue
+            self.env.cr.execute(
+                'CREATE TABLE IF NOT EXISTS "%s" PARTITION OF "%s" FOR VALUES FROM (%%s) TO (%%s)'
+                % (name, table),
+                (month, month + relativedelta(months=1)),
+            )
+
+    @api.model
+    def _delete_snapshot_lines(self, snapshots):
+        """Delete the lines of the given snapshots in one statement, pruned to
+        the partitions of their dates."""
+        if not snapshots:
+            return
+        self.env.cr.execute("""
+            DELETE FROM stock_audit_snapshot_line
+            WHERE snapshot_date = ANY(%s)
+              AND snapshot_id = ANY(%s)
+        """, (list(set(snapshots.mapped('snapshot_date'))), snapshots.ids))
+        self.invalidate_model()
+
+    @api.model
+    def _set_storage_mode(self, mode):
+        """Rebuild the line table as a plain table ('standard') or as a table
+        range-partitioned by month of snapshot_date ('partitioned').
+
+        The lines are copied into a new table, which then replaces the old one
+        together with its keys, foreign keys and indexes. Leftover audit
+        columns are dropped on the way. Takes an exclusive lock on the table
+        for the duration of the copy.
+        """
+        partitioned = mode == 'partitioned'
+        if self._is_partitioned() == partitioned:
+            return
+        cr = self.env.cr
+        table = self._table
+        new_table = '%s_new' % table
+        self.flush_model()
+
+        _logger.info("[Stock Audit] Rebuilding %s as a %s table...", table, mode)
+        started = time.time()
+        cr.execute('LOCK TABLE "%s" IN ACCESS EXCLUSIVE MODE' % table)
+        cr.execute('CREATE TABLE "%s" (LIKE "%s" INCLUDING DEFAULTS)%s' % (
+            new_table, table, ' PARTITION BY RANGE (snapshot_date)' if partitioned else '',
+        ))
+        cr.execute('ALTER TABLE "%s" %s' % (new_table, ', '.join(
+            'DROP COLUMN IF EXISTS %s' % column
+            for column in ('create_uid', 'create_date', 'write_uid', 'write_date')
+        )))
+        if partitioned:
+            cr.execute('SELECT DISTINCT snapshot_date FROM "%s"' % table)
+            self._ensure_partitions([row[0] for row in cr.fetchall()], table=new_table)
+            cr.execute('CREATE TABLE "%s_default" PARTITION OF "%s" DEFAULT' % (table, new_table))
+
+        columns = 'id, snapshot_id, snapshot_date, product_id, warehouse_id, company_id, qty'
+        cr.execute('INSERT INTO "%s" (%s) SELECT %s FROM "%s"' % (new_table, columns, columns, table))
+        moved = cr.rowcount
+
+        cr.execute('ALTER SEQUENCE "%s_id_seq" OWNED BY NONE' % table)
+        cr.execute('DROP TABLE "%s"' % table)
+        cr.execute('ALTER TABLE "%s" RENAME TO "%s"' % (new_table, table))
+        cr.execute('ALTER SEQUENCE "%s_id_seq" OWNED BY "%s".id' % (table, table))
+
+        cr.execute('ALTER TABLE "%s" ADD CONSTRAINT "%s_pkey" PRIMARY KEY (%s)' % (
+            table, table, 'id, snapshot_date' if partitioned else 'id',
+        ))
+        for name, definition, _message in self._sql_constraints:
+            cr.execute('ALTER TABLE "%s" ADD CONSTRAINT "%s_%s" %s' % (table, table, name, definition))
+        for column, comodel, ondelete in (
+            ('snapshot_id', 'stock_audit_snapshot', 'CASCADE'),
+            ('product_id', 'product_product', 'RESTRICT'),
+            ('warehouse_id', 'stock_warehouse', 'RESTRICT'),
+            ('company_id', 'res_company', 'RESTRICT'),
+        ):
+            cr.execute(
+                'ALTER TABLE "%s" ADD CONSTRAINT "%s_%s_fkey" FOREIGN KEY (%s) REFERENCES "%s" (id) ON DELETE %s'
+                % (table, table, column, column, comodel, ondelete)
+            )
+            cr.execute('CREATE INDEX "%s__%s_index" ON "%s" (%s)' % (table, column, table, column))
+        cr.execute('CREATE INDEX "%s__snapshot_date_index" ON "%s" (snapshot_date)' % (table, table))
+        self.init()
+        cr.execute('ANALYZE "%s"' % table)
+        self.invalidate_model()
+        _logger.info(
+            "[Stock Audit] %s rebuilt as a %s table: %d lines in %.2fs",
+            table, mode, moved, time.time() - started,
+        )
\ No newline at end of file
@@ -1,11 +1,29 @@
 # -*- coding: utf-8 -*-
+import csv
+import io
 import logging
 from datetime import timedelta
+
+import xlsxwriter
+
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 
+from .stock_audit_result_cache import RESULT_COLUMNS
+
 _logger = logging.getLogger(__name__)
 
+# Rows fetched per page by the export
+EXPORT_FETCH_SIZE = 5000
+
+# Rows per XLSX sheet (Excel's limit, minus the header row)
+XLSX_MAX_ROWS = 1048575
+
+EXPORT_HEADERS = [
+    'Warehouse', 'Internal Reference', 'Product',
+    'Opening Qty', 'Issue Qty', 'Receipt Qty', 'Sale Qty', 'Closing Qty',
+]
+
 
 class StockAuditWizard(models.TransientModel):
     _name = 'stock.audit.wizard'
@@ -37,27 +55,19 @@ class StockAuditWizard(models.TransientModel):
     # ------------------------------------------------------------------
     def action_generate(self):
         self.ensure_one()
-
-        if self.date_from > self.date_to:
-            raise UserError("Date From must be earlier than or equal to Date To.")
-
-        if not self.env.user.has_group('stock.group_stock_manager'):
-            raise UserError("Only Inventory Administrators can run the audit.")
-
-        our_company_ids = self.env['stock.audit.config'].sudo().get_our_company_ids()
-        if not our_company_ids:
-            raise UserError(
-                "No root companies configured.\n"
-                "Please set them in Inventory > Configuration > Stock Audit Configuration."
-            )
-
-        warehouse_ids = self._resolve_warehouse_ids(our_company_ids)
-        if not warehouse_ids:
-            raise UserError("No warehouses match the selected filter.")
+        our_company_ids, warehouse_ids = self._prepare_audit()
 
         # Clear previous results for this wizard
         self.result_line_ids.unlink()
 
+        # Closed periods are served from the result cache
+        cache = self.env['stock.audit.result.cache']._get_or_compute(self, our_company_ids, warehouse_ids)
+        if cache:
+            if not cache.row_count:
+                raise UserError("No stock activity found for the selected range/warehouses.")
+            self._load_cached_result(cache)
+            return self._action_open_result()
+
         rows = self._run_audit_sql(our_company_ids, warehouse_ids)
         if not rows:
             raise UserError("No stock activity found for the selected range/warehouses.")
@@ -74,6 +84,26 @@ class StockAuditWizard(models.TransientModel):
             'closing_qty': r['closing_qty'],
         } for r in rows])
 
+        return self._action_open_result()
+
+    def action_export_xlsx(self):
+        return self._action_export('xlsx')
+
+    def action_export_csv(self):
+        return self._action_export('csv')
+
+    def _action_export(self, file_format):
+        """Download the audit straight from the database, without building
+        result lines (see controllers/main.py)."""
+        self.ensure_one()
+        self._prepare_audit()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/stock_audit/export/%d/%s' % (self.id, file_format),
+            'target': 'self',
+        }
+
+    def _action_open_result(self):
         return {
             'type': 'ir.actions.act_window',
             'name': 'Stock Audit Report',
@@ -87,6 +117,44 @@ class StockAuditWizard(models.TransientModel):
     # ------------------------------------------------------------------
     # HELPERS
     # ------------------------------------------------------------------
+    def _prepare_audit(self):
+        """Check the wizard can be run and return (our_company_ids, warehouse_ids)."""
+        self.ensure_one()
+
+        if self.date_from > self.date_to:
+            raise UserError("Date From must be earlier than or equal to Date To.")
+
+        if not self.env.user.has_group('stock.group_stock_manager'):
+            raise UserError("Only Inventory Administrators can run the audit.")
+
+        our_company_ids = self.env['stock.audit.config'].sudo().get_our_company_ids()
+        if not our_company_ids:
+            raise UserError(
+                "No root companies configured.\n"
+                "Please set them in Inventory > Configuration > Stock Audit Configuration."
+            )
+
+        warehouse_ids = self._resolve_warehouse_ids(our_company_ids)
+        if not warehouse_ids:
+            raise UserError("No warehouses match the selected filter.")
+
+        return our_company_ids, warehouse_ids
+
+    def _load_cached_result(self, cache):
+        """Copy the cached rows into result lines with a single INSERT."""
+        query, params = cache._get_rows_query()
+        self.env.cr.execute("""
+            INSERT INTO stock_audit_report_line
+                (wizard_id, product_id, warehouse_id, opening_qty, issue_qty, receipt_qty,
+                 sale_qty, closing_qty, create_uid, create_date, write_uid, write_date)
+            SELECT %%(wizard_id)s, r.product_id, r.warehouse_id, r.opening_qty, r.issue_qty,
+                   r.receipt_qty, r.sale_qty, r.closing_qty,
+                   %%(uid)s, NOW() AT TIME ZONE 'UTC', %%(uid)s, NOW() AT TIME ZONE 'UTC'
+            FROM (%s) r
+        """ % query, dict(params, wizard_id=self.id, uid=self.env.uid))
+        self.env['stock.audit.report.line'].invalidate_model()
+        self.invalidate_recordset(['result_line_ids'])
+
     def _resolve_warehouse_ids(self, our_company_ids):
         """Return the list of warehouse IDs based on filter_type."""
         Warehouse = self.env['stock.warehouse'].sudo()
@@ -117,7 +185,13 @@ class StockAuditWizard(models.TransientModel):
     # CORE SQL — single query, all buckets
     # ------------------------------------------------------------------
     def _run_audit_sql(self, our_company_ids, warehouse_ids):
-        """Run the audit SQL and return list of dicts.
+        """Run the audit SQL and return list of dicts."""
+        query, params = self._get_audit_query(our_company_ids, warehouse_ids)
+        self.env.cr.execute(query, params)
+        return self.env.cr.dictfetchall()
+
+    def _get_audit_query(self, our_company_ids, warehouse_ids):
+        """Build the audit SQL, returned as (query, params).
 
         Approach:
           1. Opening = latest snapshot <= date_from + delta of moves from snapshot to date_from.
@@ -134,6 +208,17 @@ class StockAuditWizard(models.TransientModel):
         cutoff_to   = fields.Datetime.to_datetime(date_to)   + timedelta(days=1) - timedelta(seconds=1)
         range_start = fields.Datetime.to_datetime(date_from)
 
+        # Opening snapshot: latest done snapshot before date_from, resolved from
+        # the headers so that the line queries below filter on a literal date
+        # and only touch that date's partition
+        self.env.cr.execute("""
+            SELECT MAX(snapshot_date)
+            FROM stock_audit_snapshot
+            WHERE state = 'done'
+              AND snapshot_date < %s
+        """, (date_from,))
+        snap_date = self.env.cr.fetchone()[0]
+
         # Partner IDs of "our companies" (used to detect branch transfers)
         our_partner_ids = self.env['res.company'].sudo().browse(our_company_ids).mapped('partner_id').ids or [0]
 
@@ -144,37 +229,25 @@ class StockAuditWizard(models.TransientModel):
             'cutoff_from':   cutoff_from,
             'range_start':   range_start,
             'cutoff_to':     cutoff_to,
-            'date_from':     date_from,
+            'snap_date':     snap_date,
         }
 
         query = """
         WITH internal_locs AS (
-            SELECT l.id AS location_id, w.id AS warehouse_id
-            FROM stock_location l
-            JOIN stock_location wvl ON TRUE
-            JOIN stock_warehouse w
-              ON w.view_location_id = wvl.id
-             AND l.parent_path LIKE (wvl.parent_path || '%%')
-            WHERE l.usage = 'internal'
-              AND l.company_id = ANY(%(company_ids)s)
-              AND w.id = ANY(%(warehouse_ids)s)
+            SELECT m.location_id, m.warehouse_id
+            FROM stock_audit_location_map m
+            WHERE m.company_id = ANY(%(company_ids)s)
+              AND m.warehouse_id = ANY(%(warehouse_ids)s)
         ),
 
         -- ---------- OPENING ----------
         latest_snapshot AS (
-            SELECT MAX(sl.snapshot_date) AS snap_date
-            FROM stock_audit_snapshot_line sl
-            JOIN stock_audit_snapshot s ON s.id = sl.snapshot_id
-            WHERE s.state = 'done'
-            AND sl.snapshot_date < %(date_from)s
-            AND sl.warehouse_id = ANY(%(warehouse_ids)s)
+            SELECT %(snap_date)s::date AS snap_date
         ),
         opening_from_snap AS (
             SELECT sl.product_id, sl.warehouse_id, sl.qty
             FROM stock_audit_snapshot_line sl
-            JOIN stock_audit_snapshot s ON s.id = sl.snapshot_id
-            WHERE s.state = 'done'
-              AND sl.snapshot_date = (SELECT snap_date FROM latest_snapshot)
+            WHERE sl.snapshot_date = %(snap_date)s
               AND sl.warehouse_id = ANY(%(warehouse_ids)s)
         ),
         delta_in AS (
@@ -286,9 +359,101 @@ class StockAuditWizard(models.TransientModel):
         )
         ORDER BY k.warehouse_id, k.product_id
         """
+        return query, params
 
-        self.env.cr.execute(query, params)
-        return self.env.cr.dictfetchall()
+    # ------------------------------------------------------------------
+    # EXPORT
+    # ------------------------------------------------------------------
+    def _iter_export_rows(self, our_company_ids, warehouse_ids):
+        """Yield the audit rows with warehouse and product names, EXPORT_FETCH_SIZE
+        rows at a time (keyset pages on warehouse and product) so that memory
+        stays flat however large the audit is. Closed periods are read from
+        the result cache; other periods are computed once into a temporary
+        table first, so the audit query never runs per page."""
+        cr = self.env.cr
+        cache = self.env['stock.audit.result.cache']._get_or_compute(self, our_company_ids, warehouse_ids)
+        self.env.flush_all()
+        if cache:
+            source = """
+                SELECT %s FROM stock_audit_result_cache_line WHERE cache_id = %%(cache_id)s
+            """ % ', '.join(RESULT_COLUMNS)
+            params = {'cache_id': cache.id}
+        else:
+            query, params = self._get_audit_query(our_company_ids, warehouse_ids)
+            table = 'stock_audit_export_%d' % self.id
+            cr.execute('DROP TABLE IF EXISTS "%s"' % table)
+            cr.execute('CREATE TEMPORARY TABLE "%s" ON COMMIT DROP AS %s' % (table, query), params)
+            cr.execute('CREATE INDEX ON "%s" (warehouse_id, product_id)' % table)
+            cr.execute('ANALYZE "%s"' % table)
+            source, params = 'SELECT * FROM "%s"' % table, {}
+
+        page_query = """
+            SELECT r.warehouse_id,
+                   r.product_id,
+                   w.name,
+                   pp.default_code,
+                   COALESCE(pt.name->>%%(lang)s, pt.name->>'en_US'),
+                   r.opening_qty, r.issue_qty, r.receipt_qty, r.sale_qty, r.closing_qty
+            FROM (%s) r
+            JOIN stock_warehouse w    ON w.id = r.warehouse_id
+            JOIN product_product pp   ON pp.id = r.product_id
+            JOIN product_template pt  ON pt.id = pp.product_tmpl_id
+            WHERE (r.warehouse_id, r.product_id) > (%%(last_warehouse_id)s, %%(last_product_id)s)
+            ORDER BY r.warehouse_id, r.product_id
+            LIMIT %%(limit)s
+        """ % source
+        params = dict(params, lang=self.env.lang or 'en_US', limit=EXPORT_FETCH_SIZE)
+        last_warehouse_id = last_product_id = 0
+        while True:
+            cr.execute(page_query, dict(
+                params, last_warehouse_id=last_warehouse_id, last_product_id=last_product_id,
+            ))
+            rows = cr.fetchall()
+            for row in rows:
+                yield row[2:]
+            if len(rows) < EXPORT_FETCH_SIZE:
+                break
+            last_warehouse_id, last_product_id = rows[-1][:2]
+
+    def _export_csv_chunks(self, our_company_ids, warehouse_ids):
+        """Yield the CSV export as encoded chunks of EXPORT_FETCH_SIZE rows."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADERS)
+        for count, row in enumerate(self._iter_export_rows(our_company_ids, warehouse_ids), 1):
+            writer.writerow(row)
+            if count % EXPORT_FETCH_SIZE == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+
+    def _export_xlsx(self, our_company_ids, warehouse_ids, fileobj):
+        """Write the XLSX export into fileobj. constant_memory mode flushes
+        every finished row to a temporary file, so rows are not kept in
+        memory either."""
+        workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+        bold = workbook.add_format({'bold': True})
+        qty_format = workbook.add_format({'num_format': '#,##0.00'})
+        sheet = None
+        row_index = XLSX_MAX_ROWS
+        for row in self._iter_export_rows(our_company_ids, warehouse_ids):
+            if row_index >= XLSX_MAX_ROWS:
+                sheet = workbook.add_worksheet('Stock Audit' if sheet is None else None)
+                sheet.write_row(0, 0, EXPORT_HEADERS, bold)
+                sheet.set_column(0, 0, 24)
+                sheet.set_column(1, 1, 18)
+                sheet.set_column(2, 2, 40)
+                sheet.set_column(3, 7, 14, qty_format)
+                row_index = 0
+            row_index += 1
+            sheet.write_row(row_index, 0, row)
+        if sheet is None:
+            workbook.add_worksheet('Stock Audit').write_row(0, 0, EXPORT_HEADERS, bold)
+        workbook.close()
+
+    def _get_export_filename(self, file_format):
+        return 'stock_audit_%s_%s.%s' % (self.date_from, self.date_to, file_format)
 
 
 class StockAuditReportLine(models.TransientModel):
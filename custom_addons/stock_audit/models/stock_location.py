@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from .stock_audit_location_map import LOCATION_MAP_FIELDS
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        locations = super().create(vals_list)
+        self.env['stock.audit.location.map']._refresh(locations.ids)
+        return locations
+
+    def write(self, vals):
+        res = super().write(vals)
+        if LOCATION_MAP_FIELDS.intersection(vals):
+            # Runs after the parent_path update, so a moved location's subtree
+            # is resolved against its new ancestors
+            self.env['stock.audit.location.map']._refresh(self.ids)
+        return res
+
+
+class StockWarehouse(models.Model):
+    _inherit = 'stock.warehouse'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        warehouses = super().create(vals_list)
+        self.env['stock.audit.location.map']._refresh(warehouses.view_location_id.ids)
+        return warehouses
+
+    def write(self, vals):
+        old_views = self.view_location_id if 'view_location_id' in vals else self.env['stock.location']
+        res = super().write(vals)
+        if old_views:
+            self.env['stock.audit.location.map']._refresh((old_views | self.view_location_id).ids)
+        return res
+
+    def unlink(self):
+        views = self.view_location_id
+        res = super().unlink()
+        # Rows of the removed warehouses cascade away; remap their locations in
+        # case an enclosing warehouse now owns them
+        self.env['stock.audit.location.map']._refresh(views.exists().ids)
+        return res
\ No newline at end of file
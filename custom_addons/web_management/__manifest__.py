@@ -4,7 +4,7 @@
     "author": "Researchayu",
     "summary": "Module to show case paper",
     "category": "Healthcare",
-    "depends": ["base", "web",],
+    "depends": ["base", "web", "patient_management"],
     "data": [
         "views/case_paper_template.xml",
         "views/x_ray_template.xml",
@@ -0,0 +1 @@
+from . import patient_timeline
@@ -0,0 +1,322 @@
+from odoo import models, api
+from collections import defaultdict
+
+# Visit dates per page of the patient timeline (first paint and each scroll fetch).
+TIMELINE_PAGE_SIZE = 20
+
+# Case paper sections: model, date field, and the keys rendered by the template.
+# "names" maps an output key to a many2one whose display name is shown,
+# "fields" are read as-is (many2one values come back as [id, name]) and "details"
+# names the method reading the section's lines in bulk.
+TIMELINE_SECTIONS = {
+    "assessment": {
+        "model": "patient.assessment",
+        "date_field": "assessment_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid",
+                  "case_under_discussion": "case_under_discussion"},
+        "fields": ["weight", "diagnosis", "k_c_o", "investigation_status", "day_of_therapy", "type_of_therapy"],
+        "details": "_get_assessment_details",
+    },
+    "prescriptions": {
+        "model": "patient.prescription",
+        "date_field": "prescription_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["state", "notes"],
+        "details": "_get_prescription_details",
+    },
+    "case_taking": {
+        "model": "patient.case_taking",
+        "date_field": "case_taking_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["c_o", "k_c_o", "p_h_o", "s_h", "f_h", "medications", "allergies", "habits", "mal", "mutra",
+                   "nakta", "kshudha", "nidra", "jivha", "crepts_rt", "crepts_lt", "shin_tenderness_rt",
+                   "shin_tenderness_lt", "swelling_rt", "swelling_lt", "rom_rt", "rom_lt", "slr_rt", "slr_lt",
+                   "pedal_oedema_rt", "pedal_oedema_lt", "pain_rt", "pain_lt", "deformity_rt", "deformity_lt",
+                   "diet", "diagnosis", "adv_investigation", "adv_treatment", "adv_rx", "treatment", "notes"],
+    },
+    "session": {
+        "model": "patient.session",
+        "date_field": "session_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["type_of_therapy", "session_day", "session_type", "jivha", "swelling", "digestion", "motion",
+                   "detox_therapy", "regeneration_therapy", "left_knee", "right_knee",
+                   "before_and_after_therapy_comment", "therapist_name", "therapist_id", "state",
+                   "morning_with_time", "lunch_with_time", "evening_with_time", "dinner_with_time", "comments",
+                   "body_parts"],
+    },
+    "enrollment": {
+        "model": "patient.enrollment",
+        "date_field": "enrollment_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["enrollment_date", "enrollment_type", "daily_sheet_ref", "total_amount", "therapy_amount",
+                   "first_cons_charges", "therapy_medicine", "total_sessions", "remaining_sessions",
+                   "used_sessions", "notes", "state", "enrolled_for"],
+    },
+    "daily_followup": {
+        "model": "patient.daily_followup",
+        "date_field": "followup_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["c_o", "mal", "mutra", "nakta", "kshudha", "nidra", "jivha", "crepts_rt", "crepts_lt",
+                   "shin_tenderness_rt", "shin_tenderness_lt", "swelling_rt", "swelling_lt", "rom_rt", "rom_lt",
+                   "slr_rt", "slr_lt", "pedal_oedema_rt", "pedal_oedema_lt", "pain_rt", "pain_lt",
+                   "deformity_rt", "deformity_lt", "happiness", "recovery", "notes"],
+    },
+    "diet_chart": {
+        "model": "patient.diet_chart",
+        "date_field": "diet_taken_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["diet_taken_date", "therapy_day", "morning_with_time", "lunch_with_time", "evening_with_time",
+                   "dinner_with_time", "comments"],
+    },
+    "followup": {
+        "model": "patient.followup",
+        "date_field": "weekly_followup_date",
+        "names": {"doctor": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["weekly_followup_date", "weight", "diagnosis", "k_c_o", "investigation_status", "day_of_therapy",
+                   "type_of_therapy", "case_under_discussion_with",
+                   "morning_stiffness_with_duration_lt", "b_l_shin_tenderness_with_gradation_lt",
+                   "b_l_knee_tenderness_with_gradation_and_position_lt", "b_l_shin_oedema_with_gradation_lt",
+                   "pitting_oedema_lt", "non_pitting_oedema_lt", "b_l_shin_discoloration_rashes_itching_bruises_lt",
+                   "local_knee_temperature_lt", "heavy_free_lt", "complete_restricted_with_degree_lt",
+                   "incomplete_extension_in_fingers_lt", "varus_valgus_deformity_lt",
+                   "b_l_knee_crept_with_gradation_lt", "pain_while_walking_reduced_by_lt", "b_l_slr_with_degree_lt",
+                   "varicose_veins_gradation_lt", "burning_sensation_in_b_l_knee_shin_lt",
+                   "morning_stiffness_with_duration_rt", "b_l_shin_tenderness_with_gradation_rt",
+                   "b_l_knee_tenderness_with_gradation_and_position_rt", "b_l_shin_oedema_with_gradation_rt",
+                   "pitting_oedema_rt", "non_pitting_oedema_rt", "b_l_shin_discoloration_rashes_itching_bruises_rt",
+                   "local_knee_temperature_rt", "heavy_free_rt", "complete_restricted_with_degree_rt",
+                   "incomplete_extension_in_fingers_rt", "varus_valgus_deformity_rt",
+                   "b_l_knee_crept_with_gradation_rt", "pain_while_walking_reduced_by_rt", "b_l_slr_with_degree_rt",
+                   "varicose_veins_gradation_rt", "burning_sensation_in_b_l_knee_shin_rt",
+                   "others_s", "jivha", "jwaranubhuti", "kshudha", "kantha", "tiktamlodgar",
+                   "mala_aadhman_malabaddhata_sticky_drava", "mutra_naktamutrata_mutradaha",
+                   "rasa_dhatu_dushti_lakshane", "nidra", "sweda", "others_k", "wake_up_time", "breakfast", "lunch",
+                   "dinner", "sleep_time", "divastap"],
+    },
+    "attachment": {
+        "model": "patient.attachment",
+        "date_field": "attachment_date",
+        "names": {"admin": "admin", "modified_by": "write_uid"},
+        "fields": ["file_type", "s3_url", "other_description"],
+    },
+    "xray": {
+        "model": "patient.xray",
+        "date_field": "date_taken",
+        "names": {"doctor_id": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["x_ray_actual_date", "x_ray_day", "grade"],
+    },
+    "blood_report": {
+        "model": "patient.blood_report",
+        "date_field": "blood_report_date",
+        "names": {"doctor_id": "doctor_id", "modified_by": "write_uid"},
+        "fields": ["blood_report_day", "blood_report_actual_date", "lab_name", "haemoglobin", "esr",
+                   "platelet_count", "bsl_fasting", "bsl_post_prandial", "hba1c", "sr_uric_acid",
+                   "ra_factor_titre", "crp", "ana", "t_cholesterol", "t_triglyceride", "sr_creatinine", "tsh",
+                   "urine_sugar", "urine_pus_cells_bacteria", "urine_protein", "urine_blood_crystal", "cbc", "lft",
+                   "rft", "lipid_profile", "t3", "t4", "uric_acid", "ra", "anti_ccp", "homa_ir", "c_peptide",
+                   "la_ma_test", "urine_routine", "urine_microscopic", "notes"],
+    },
+}
+
+ALL_SECTIONS = tuple(TIMELINE_SECTIONS) + ("pos_orders",)
+
+# Sections only loaded when expanded on the windowed patient page (previews, order lines).
+LAZY_SECTIONS = ("attachment", "xray", "pos_orders")
+
+GRADATION_FIELDS = ["tenderness", "stiffness", "pain_grade", "swelling", "edema", "rom", "discoloration",
+                    "crepitus", "slr", "burning", "rashes", "pain_relief"]
+
+
+class PatientTimeline(models.AbstractModel):
+    _name = "patient.timeline"
+    _description = "Patient Case Paper Timeline"
+
+    @api.model
+    def get_timeline(self, patient, before=None, limit=None, lazy=False):
+        """Builds the case paper timeline of a patient, newest visit date first.
+
+        Visit dates are paged with a date cursor: a page holds the latest ``limit``
+        dates strictly older than ``before``, and ``next_cursor`` is the date to pass
+        as ``before`` for the following page (False on the last one). Each section
+        is fetched with a single search_read restricted to the dates of the page.
+
+        With ``lazy``, the heavy sections (LAZY_SECTIONS) are not read: each case
+        paper only carries their entry counts under "lazy", see get_section()."""
+        visit_dates = self._get_visit_dates(patient, before=before, limit=limit + 1 if limit else None)
+        page_dates = visit_dates[:limit] if limit else visit_dates
+        has_more = len(visit_dates) > len(page_dates)
+
+        case_papers = []
+        if page_dates:
+            date_from, date_to = min(page_dates), max(page_dates)
+            sections = [s for s in ALL_SECTIONS if not (lazy and s in LAZY_SECTIONS)]
+            grouped_data = self._get_sections(patient, date_from, date_to, sections)
+            lazy_counts = self._get_lazy_counts(patient, date_from, date_to) if lazy else {}
+            for date in page_dates:
+                details = grouped_data.get(date, {})
+                case_paper = {
+                    "date": date.strftime("%d-%m-%Y"),
+                    "date_iso": date.isoformat(),
+                    "lazy": lazy_counts.get(date, {}),
+                }
+                for section in ALL_SECTIONS:
+                    case_paper[section] = details.get(section, [])
+                case_papers.append(case_paper)
+
+        return {
+            "case_papers": case_papers,
+            "next_cursor": page_dates[-1].isoformat() if has_more else False,
+        }
+
+    @api.model
+    def get_section(self, patient, section, date):
+        """Entries of one (lazily loaded) section for a single visit date."""
+        if section not in ALL_SECTIONS:
+            return []
+        return self._get_sections(patient, date, date, [section]).get(date, {}).get(section, [])
+
+    @api.model
+    def _get_visit_dates(self, patient, before=None, limit=None):
+        """Distinct dates (desc) on which the patient has at least one case paper entry."""
+        selects = []
+        for spec in TIMELINE_SECTIONS.values():
+            model = self.env[spec["model"]]
+            model.flush_model([spec["date_field"], "patient_id"])
+            active_clause = " AND active" if "active" in model._fields else ""
+            selects.append(
+                f"SELECT {spec['date_field']} AS visit_date FROM {model._table} "
+                f"WHERE patient_id = %(patient_id)s AND {spec['date_field']} IS NOT NULL{active_clause}"
+            )
+        selects.append(
+            "SELECT order_date FROM patient_purchase_history WHERE partner_id = %(partner_id)s"
+        )
+        self.env.cr.execute(
+            """
+            SELECT DISTINCT visit_date FROM (%s) AS visits
+            WHERE %%(before)s::date IS NULL OR visit_date < %%(before)s::date
+            ORDER BY visit_date DESC
+            LIMIT %%(limit)s
+            """ % " UNION ALL ".join(selects),
+            {"patient_id": patient.id, "partner_id": patient.partner_id.id or 0,
+             "before": before, "limit": limit},
+        )
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _get_lazy_counts(self, patient, date_from, date_to):
+        """Returns {date: {section: count}} for the lazily loaded sections of the window."""
+        counts = defaultdict(dict)
+        for section in LAZY_SECTIONS:
+            if section == "pos_orders":
+                continue
+            spec = TIMELINE_SECTIONS[section]
+            date_field = spec["date_field"]
+            for day, count in self.env[spec["model"]]._read_group(
+                    [("patient_id", "=", patient.id),
+                     (date_field, ">=", date_from),
+                     (date_field, "<=", date_to)],
+                    [f"{date_field}:day"], ["__count"]):
+                counts[day][section] = count
+
+        order_counts = self.env["patient.purchase.history"].get_partner_order_counts(
+            patient.partner_id.id, date_from, date_to
+        )
+        for day, count in order_counts.items():
+            counts[day]["pos_orders"] = count
+        return counts
+
+    @api.model
+    def _get_sections(self, patient, date_from, date_to, sections=ALL_SECTIONS):
+        """Returns {date: {section: [entries]}} of the given sections for the date window."""
+        grouped_data = defaultdict(lambda: defaultdict(list))
+
+        for section in sections:
+            spec = TIMELINE_SECTIONS.get(section)
+            if not spec:
+                continue
+            date_field = spec["date_field"]
+            rows = self.env[spec["model"]].search_read(
+                [("patient_id", "=", patient.id),
+                 (date_field, ">=", date_from),
+                 (date_field, "<=", date_to)],
+                list(spec["names"].values()) + spec["fields"] + [date_field],
+                order=f"{date_field} desc",
+            )
+            extras = getattr(self, spec["details"])(rows) if spec.get("details") else {}
+            for row in rows:
+                entry = {key: row[field][1] if row[field] else False for key, field in spec["names"].items()}
+                for field in spec["fields"]:
+                    value = row[field]
+                    entry[field] = list(value) if isinstance(value, tuple) else value
+                entry.update(extras.get(row["id"], {}))
+                grouped_data[row[date_field]][section].append(entry)
+
+        if "pos_orders" in sections:
+            for date_key, order in self._get_pos_orders(patient, date_from, date_to):
+                grouped_data[date_key]["pos_orders"].append(order)
+
+        return grouped_data
+
+    @api.model
+    def _get_assessment_details(self, rows):
+        """Symptoms and gradation lines of the given assessments, read in bulk."""
+        assessment_ids = [row["id"] for row in rows]
+        details = {assessment_id: {"symptoms": [], "gradation": []} for assessment_id in assessment_ids}
+        if not assessment_ids:
+            return details
+
+        for line in self.env["patient.assessment.line"].search_read(
+                [("followup_id", "in", assessment_ids)], ["followup_id", "key", "value"]):
+            details[line["followup_id"][0]]["symptoms"].append({
+                "symptom": line["key"],
+                "value": line["value"],
+            })
+
+        for line in self.env["gradation.followup.line"].search_read(
+                [("followup_id", "in", assessment_ids)],
+                ["followup_id", "organ_id", "organ_category", "summary_display"] + GRADATION_FIELDS):
+            gradation = {
+                "organ": line["organ_id"][1] if line["organ_id"] else False,
+                "category": line["organ_category"],
+                "summary": line["summary_display"],
+            }
+            gradation.update({field: line[field] for field in GRADATION_FIELDS})
+            details[line["followup_id"][0]]["gradation"].append(gradation)
+        return details
+
+    @api.model
+    def _get_prescription_details(self, rows):
+        """Medicine lines of the given prescriptions, read in bulk."""
+        prescription_ids = [row["id"] for row in rows]
+        details = {prescription_id: {"meds": []} for prescription_id in prescription_ids}
+        if not prescription_ids:
+            return details
+
+        for line in self.env["patient.prescription.line"].search_read(
+                [("prescription_id", "in", prescription_ids)],
+                ["prescription_id", "product_id", "qty", "instructions", "dosage"]):
+            details[line["prescription_id"][0]]["meds"].append({
+                "medicine": line["product_id"][1] if line["product_id"] else False,
+                "qty": line["qty"],
+                "instructions": line["instructions"] or "",
+                "dosage": line["dosage"] or "",
+            })
+        return details
+
+    @api.model
+    def _get_pos_orders(self, patient, date_from, date_to):
+        """POS purchases of the patient's partner, grouped by (date, order), as [(date, order_data)].
+        Read from the purchase history projection kept up to date by the pos.order paid hook."""
+        lines = self.env["patient.purchase.history"].get_partner_history(
+            patient.partner_id.id, date_from=date_from, date_to=date_to
+        )
+
+        pos_order_group = defaultdict(lambda: {"admin": "", "ordered": []})
+        for line in lines:
+            key = (line["order_date"], line["order_name"])
+            pos_order_group[key]["admin"] = line["cashier"]
+            pos_order_group[key]["ordered"].append({
+                "med": line["product"],
+                "qty": line["qty"],
+            })
+        return [(date_key, data) for (date_key, _order_name), data in pos_order_group.items()]